@@ -0,0 +1,145 @@
+"""
+Build the precomputed curriculum content store
+
+Usage (from the backend directory):
+    python -m app.build_content curriculum.json [--languages hi,te] [--num-questions 10]
+
+The curriculum file is JSON, either a list of {"subject": ..., "topic": ...}
+pairs or {"subjects": [{"subject": "Science", "topics": ["Photosynthesis", ...]}]}.
+For every topic this generates English notes and a quiz, translates both into
+each language in LANG_CODE_MAP, and writes a new store version that the API
+serves for /generate-notes and /generate-quiz.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from .services.content_store import CONTENT_STORE_DIR, ContentStoreWriter
+from .services.ml.answer_generator import generate_notes, generate_quiz_structured
+from .services.ml.translator import LANG_CODE_MAP, TRANSLATE_SENTENCE_MAX_LENGTH, translate_batch, translate_document
+
+logger = logging.getLogger("build_content")
+
+
+def load_curriculum(path: str) -> List[Tuple[str, str]]:
+    """Read (subject, topic) pairs from a curriculum file."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    pairs: List[Tuple[str, str]] = []
+    if isinstance(data, dict):
+        for entry in data.get("subjects", []):
+            for topic in entry.get("topics", []):
+                pairs.append((entry["subject"], topic))
+    else:
+        for entry in data:
+            pairs.append((entry["subject"], entry["topic"]))
+    return pairs
+
+
+def notes_prompt(subject: str, topic: str) -> str:
+    return f"Subject: {subject}\nTopic: {topic}"
+
+
+def translate_questions(questions: List[Dict[str, Any]], language: str) -> List[Dict[str, Any]]:
+    """Translate questions, options and explanations in shared batches."""
+    texts = []
+    for question in questions:
+        texts.extend([question["question"], *question["options"], question["explanation"]])
+    translated = iter(translate_batch(texts, language, max_length=TRANSLATE_SENTENCE_MAX_LENGTH))
+    return [
+        {
+            "question": next(translated),
+            "options": [next(translated) for _ in question["options"]],
+            "correct_index": question["correct_index"],
+            "explanation": next(translated),
+        }
+        for question in questions
+    ]
+
+
+def build_topic(writer: ContentStoreWriter, subject: str, topic: str, languages: List[str], num_questions: int):
+    """
+    Generate and store one topic's notes and quiz in every language.
+
+    Everything is generated and translated before the first write, so a
+    topic is either stored in every language or not at all.
+
+    Raises:
+        ValueError: If notes generation failed; nothing is stored for the topic
+    """
+    text = notes_prompt(subject, topic)
+
+    notes = generate_notes(text, max_length=800, temperature=0.3)[0]
+    # Generation failures come back as a score-0 placeholder ("Error generating notes")
+    if notes["score"] <= 0:
+        raise ValueError(f"notes generation failed: {notes['text']}")
+    english_notes = notes["text"]
+    quiz = generate_quiz_structured(text, num_questions, max_length=1000, temperature=0.7)
+    quiz_ok = bool(quiz["questions"]) and all(answer["score"] > 0 for answer in quiz["answers"])
+    questions = quiz["questions"] if quiz_ok else []
+
+    payloads = []
+    for language in languages:
+        if language == "en":
+            local_notes, local_questions = english_notes, questions
+        else:
+            local_notes = translate_document(english_notes, language)
+            local_questions = translate_questions(questions, language)
+
+        payloads.append(("notes", language, {
+            "answers": [{"text": english_notes, "score": notes["score"], "local_text": local_notes}],
+        }))
+        if questions:
+            payloads.append(("quiz", language, {
+                "answers": quiz["answers"],
+                "questions": questions,
+                "local_questions": local_questions,
+            }))
+
+    if not questions:
+        logger.warning(f"No valid quiz questions for {subject} / {topic}")
+    for kind, language, payload in payloads:
+        writer.put(kind, subject, topic, language, payload)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate notes and quizzes for a curriculum")
+    parser.add_argument("curriculum", help="Curriculum JSON file")
+    parser.add_argument("--output-dir", default=CONTENT_STORE_DIR, help="Content store directory")
+    parser.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"), help="Store version label")
+    parser.add_argument("--languages", default=",".join(LANG_CODE_MAP), help="Comma-separated language codes")
+    parser.add_argument("--num-questions", type=int, default=10, help="Quiz questions per topic")
+    parser.add_argument("--no-activate", action="store_true", help="Build without pointing CURRENT at the new version")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    languages = [code.strip() for code in args.languages.split(",") if code.strip()]
+    unknown = [code for code in languages if code not in LANG_CODE_MAP]
+    if unknown:
+        parser.error(f"Unsupported languages: {', '.join(unknown)}")
+
+    pairs = load_curriculum(args.curriculum)
+    writer = ContentStoreWriter(args.output_dir, args.version, source=args.curriculum)
+    failed: List[str] = []
+    for index, (subject, topic) in enumerate(pairs, start=1):
+        logger.info(f"[{index}/{len(pairs)}] {subject} / {topic}")
+        try:
+            build_topic(writer, subject, topic, languages, args.num_questions)
+        except Exception as e:
+            failed.append(f"{subject} / {topic}")
+            logger.error(f"Failed to build {subject} / {topic}: {e}")
+
+    path = writer.commit(make_current=not args.no_activate)
+    logger.info(f"Wrote {path} ({len(pairs) - len(failed)}/{len(pairs)} topics)")
+    if failed:
+        logger.error(f"Topics not built (served by live generation): {'; '.join(failed)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Build the BM25 retrieval index over curriculum passages
+
+Usage (from the backend directory):
+    python -m app.build_index corpus/ [--passage-tokens 120]
+
+The corpus is either a directory with one sub-directory per subject holding
+.txt/.md files (the file name is the passage title), or a JSON/JSONL file of
+{"subject": ..., "title": ..., "text": ...} documents. Documents are split
+into passages and a new index version is written under RETRIEVAL_INDEX_DIR;
+the API uses it to ground answers and to answer definition questions directly.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterator, List, Tuple
+
+from .services.ml.retrieval import PASSAGE_TOKENS, RETRIEVAL_INDEX_DIR, IndexWriter
+
+logger = logging.getLogger("build_index")
+
+TEXT_EXTENSIONS = (".txt", ".md")
+
+
+def iter_documents(path: str) -> Iterator[Tuple[str, str, str]]:
+    """Yield (subject, title, text) from a corpus directory or JSON/JSONL file."""
+    if os.path.isdir(path):
+        for subject in sorted(os.listdir(path)):
+            subject_dir = os.path.join(path, subject)
+            if not os.path.isdir(subject_dir):
+                continue
+            for filename in sorted(os.listdir(subject_dir)):
+                if not filename.endswith(TEXT_EXTENSIONS):
+                    continue
+                with open(os.path.join(subject_dir, filename), encoding="utf-8") as f:
+                    title = os.path.splitext(filename)[0].replace("_", " ")
+                    yield subject.replace("_", " "), title, f.read()
+        return
+
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            documents = [json.loads(line) for line in f if line.strip()]
+        else:
+            documents = json.load(f)
+    for document in documents:
+        yield document["subject"], document.get("title", ""), document["text"]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the BM25 retrieval index for curriculum passages")
+    parser.add_argument("corpus", help="Corpus directory (subject/*.txt) or JSON/JSONL file")
+    parser.add_argument("--output-dir", default=RETRIEVAL_INDEX_DIR, help="Retrieval index directory")
+    parser.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"), help="Index version label")
+    parser.add_argument("--passage-tokens", type=int, default=PASSAGE_TOKENS, help="Approximate tokens per passage")
+    parser.add_argument("--no-activate", action="store_true", help="Build without pointing CURRENT at the new version")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    writer = IndexWriter(args.output_dir, args.version, source=args.corpus)
+    documents = passages = 0
+    for subject, title, text in iter_documents(args.corpus):
+        passages += writer.add(subject, title, text, args.passage_tokens)
+        documents += 1
+    if not passages:
+        logger.error(f"No passages found in {args.corpus}")
+        return 1
+
+    path = writer.commit(make_current=not args.no_activate)
+    logger.info(f"Wrote {path} ({documents} documents, {passages} passages)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+WebSocket chat endpoint
+
+One connection per student carries every question. Each question runs the
+tutoring pipeline (language detection, intent classification, streamed
+answer, translation) and pushes staged events as soon as each stage is
+done, so short stages no longer pay a request round trip each.
+
+Client messages:
+    {"type": "ask", "id": "m1", "question": "...", "language": "auto",
+     "subject": "Science", "session_id": "...", "max_length": 300,
+     "timeout": 30}                        optional deadline in seconds
+    {"type": "cancel", "id": "m1"}
+    {"type": "ping"}
+
+Server events (all carry the question "id"):
+    language    {"language": "hi", "confidence": 0.98}
+    intent      {"intent": "definition", "confidence": 0.71}
+    token       {"text": "..."}            streamed English answer
+    translation_delta {"index": 0, "text": "..."}
+                                           one translated sentence, in order,
+                                           while the answer is still streaming
+    answer      {"text": "..."}            full English answer
+    translation {"language": "hi", "text": "..."}
+    done | cancelled | error {"detail": "..."}
+Several questions may be in flight at once; events for different ids
+interleave.
+
+Each question goes through admission control like an HTTP generation
+request (rate limit, fair queue, load shedding); a rejected question gets
+an error event with "retry_after". A client may hold at most
+WS_MAX_CONNECTIONS_PER_CLIENT open connections.
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+
+from .services.ml.language_detector import detect_language
+from .services.ml.intent_classifier import classify_intent
+from .services.ml.answer_generator import stream_answer
+from .services.ml.generation_backends import iterate_in_thread
+from .services.ml.deadlines import ENDPOINT_DEADLINES, Deadline, RequestCancelled, parse_timeout, use_deadline
+from .services.ml.translator import translate_text, LANG_CODE_MAP
+from .services.ml.stream_translation import STREAM_TRANSLATION, IncrementalTranslator
+from .services.sessions import session_store
+from .services.admission import (
+    ADMISSION_ENABLED,
+    ENDPOINT_COSTS,
+    AdmissionRejected,
+    admission_controller,
+    client_identity,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Questions a single connection may have in flight
+WS_MAX_INFLIGHT = int(os.getenv("WS_MAX_INFLIGHT", "4"))
+# Open chat connections per client (API key, else address)
+WS_MAX_CONNECTIONS_PER_CLIENT = int(os.getenv("WS_MAX_CONNECTIONS_PER_CLIENT", "4"))
+
+# client id -> open connections
+_open_connections: Counter = Counter()
+
+
+class ChatConnection:
+    def __init__(self, websocket: WebSocket, client_id: str, weight: float):
+        self.websocket = websocket
+        # Admission identity; also owns the sessions used on this connection
+        self.owner = client_id
+        self.weight = weight
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.cancel_events: Dict[str, threading.Event] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, event_type: str, message_id: Any = None, **fields):
+        payload = {"type": event_type, **fields}
+        if message_id is not None:
+            payload["id"] = message_id
+        async with self._send_lock:
+            await self.websocket.send_json(payload)
+
+    async def run_pipeline(self, message: Dict[str, Any]):
+        message_id = message["id"]
+        cancel = self.cancel_events[message_id]
+        timeout = parse_timeout(str(message.get("timeout") or "")) or ENDPOINT_DEADLINES["/ws/chat"]
+        # The deadline shares the cancel event, so "cancel" messages and
+        # disconnects stop generation the same way an expired deadline does
+        deadline = Deadline(timeout, cancel=cancel)
+        if not await self._admit(message_id):
+            return
+        start = time.monotonic()
+        try:
+            with use_deadline(deadline):
+                await self._run_pipeline(message, deadline)
+        finally:
+            if ADMISSION_ENABLED:
+                admission_controller.release(time.monotonic() - start)
+
+    async def _admit(self, message_id: Any) -> bool:
+        """Wait for an admission slot for one question; False if it was rejected."""
+        if not ADMISSION_ENABLED:
+            return True
+        admission_controller.ensure_monitor()
+        try:
+            await admission_controller.acquire(self.owner, self.weight, ENDPOINT_COSTS["/ws/chat"])
+            return True
+        except AdmissionRejected as e:
+            event = {"detail": e.detail, "retry_after": max(1, math.ceil(e.retry_after))}
+            event_type = "error"
+        except asyncio.CancelledError:
+            # Cancelled while queued
+            event, event_type = {}, "cancelled"
+        self.tasks.pop(message_id, None)
+        self.cancel_events.pop(message_id, None)
+        try:
+            await self.send(event_type, message_id, **event)
+        except Exception:
+            pass
+        return False
+
+    async def _run_pipeline(self, message: Dict[str, Any], deadline: Deadline):
+        message_id = message["id"]
+        cancel = deadline.cancelled
+        question = str(message.get("question", "")).strip()
+        loop = asyncio.get_running_loop()
+        try:
+            if not question:
+                await self.send("error", message_id, detail="Empty question")
+                return
+
+            session_id = message.get("session_id")
+            context = (
+                await asyncio.to_thread(session_store.build_context, session_id, self.owner) if session_id else None
+            )
+            if session_id and context is None:
+                await self.send("error", message_id, detail="Session not found")
+                return
+
+            # Language detection and intent classification are independent
+            requested_language = message.get("language") or "auto"
+            detection_task = loop.run_in_executor(None, detect_language, question)
+            intent_task = loop.run_in_executor(None, classify_intent, question)
+
+            detected = await detection_task
+            language = detected["language"] if requested_language == "auto" else requested_language
+            await self.send("language", message_id, language=language, confidence=detected["confidence"])
+
+            try:
+                intent_result = await intent_task
+                intent = intent_result["intent"]
+                await self.send("intent", message_id, intent=intent, confidence=intent_result["confidence"])
+            except Exception as e:
+                logger.warning(f"Intent classification failed: {e}")
+                intent = None
+
+            translate = language != "en" and language in LANG_CODE_MAP
+            translator = None
+            if translate and STREAM_TRANSLATION:
+                async def send_sentence(index: int, text: str):
+                    await self.send("translation_delta", message_id, index=index, text=text)
+
+                translator = IncrementalTranslator(language, send_sentence)
+            try:
+                answer_parts = []
+                async for delta in iterate_in_thread(lambda: stream_answer(
+                    question,
+                    max_length=int(message.get("max_length", 300)),
+                    intent=intent,
+                    subject=message.get("subject"),
+                    context=context,
+                    cancel=deadline,
+                )):
+                    answer_parts.append(delta)
+                    await self.send("token", message_id, text=delta)
+                    if translator is not None:
+                        translator.feed(delta)
+                answer = "".join(answer_parts).strip()
+                if cancel.is_set():
+                    raise asyncio.CancelledError()
+                await self.send("answer", message_id, text=answer)
+
+                if session_id and answer:
+                    await asyncio.to_thread(session_store.add_turn, session_id, self.owner, question, answer)
+
+                if translator is not None:
+                    translated = await translator.finish()
+                    if translator.failed:
+                        await self.send("translation", message_id, language="en", text=answer)
+                    elif answer:
+                        await self.send("translation", message_id, language=language, text=translated)
+            finally:
+                if translator is not None:
+                    await translator.aclose()
+
+            if translator is None and translate and answer:
+                try:
+                    translated = await loop.run_in_executor(
+                        None, contextvars.copy_context().run, translate_text, answer, language, "en"
+                    )
+                    await self.send("translation", message_id, language=language, text=translated)
+                except RequestCancelled:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Translation failed: {e}")
+                    await self.send("translation", message_id, language="en", text=answer)
+
+            await self.send("done", message_id)
+        except (asyncio.CancelledError, RequestCancelled):
+            cancel.set()
+            try:
+                await self.send("cancelled", message_id)
+            except Exception:
+                pass
+        except WebSocketDisconnect:
+            cancel.set()
+        except Exception as e:
+            logger.error(f"Chat pipeline error: {e}")
+            try:
+                await self.send("error", message_id, detail=str(e))
+            except Exception:
+                pass
+        finally:
+            self.tasks.pop(message_id, None)
+            self.cancel_events.pop(message_id, None)
+
+    async def handle(self, message: Dict[str, Any]):
+        message_type = message.get("type")
+        message_id = message.get("id")
+
+        if message_type == "ping":
+            await self.send("pong", message_id)
+        elif message_type == "cancel":
+            if message_id in self.tasks:
+                self.cancel_events[message_id].set()
+                self.tasks[message_id].cancel()
+        elif message_type == "ask":
+            if message_id is None or message_id in self.tasks:
+                await self.send("error", message_id, detail="Each question needs a unique 'id'")
+            elif len(self.tasks) >= WS_MAX_INFLIGHT:
+                await self.send("error", message_id, detail=f"Too many questions in flight (max {WS_MAX_INFLIGHT})")
+            else:
+                self.cancel_events[message_id] = threading.Event()
+                self.tasks[message_id] = asyncio.create_task(self.run_pipeline(message))
+        else:
+            await self.send("error", message_id, detail=f"Unknown message type: {message_type}")
+
+    async def close(self):
+        """Stop all in-flight questions (client went away)."""
+        for message_id, task in list(self.tasks.items()):
+            self.cancel_events[message_id].set()
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+
+@router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    client = websocket.client
+    client_id, weight = client_identity(websocket.headers, client.host if client else None)
+    if _open_connections[client_id] >= WS_MAX_CONNECTIONS_PER_CLIENT:
+        # Before accept(): the handshake is refused with 403
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    _open_connections[client_id] += 1
+    connection = ChatConnection(websocket, client_id, weight)
+    try:
+        await websocket.accept()
+        while True:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict):
+                await connection.send("error", detail="Messages must be JSON objects")
+                continue
+            await connection.handle(message)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error: {e}")
+    finally:
+        await connection.close()
+        _open_connections[client_id] -= 1
+        if _open_connections[client_id] <= 0:
+            del _open_connections[client_id]
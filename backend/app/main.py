@@ -1,13 +1,15 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse
-from pydantic import BaseModel
-from typing import Dict, List, Optional, Union
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Union
 import logging
 import os
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import contextvars
+import hmac
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,25 +23,74 @@ else:
 
 # Import ML services
 from .services.ml.language_detector import detect_language
+from .services.ml.romanized import SCHEMES as TRANSLITERATION_SCHEMES, detect_romanized, is_latin_script, to_native_script
 from .services.ml.intent_classifier import classify_intent
-from .services.ml.answer_generator import generate_answer, generate_notes, generate_quiz
+from .services.ml.answer_generator import generate_answer, generate_notes, generate_quiz_structured, stream_answer
 from .services.ml.translator import translate_text, SUPPORTED_LANGUAGES, LANG_CODE_MAP
-from .services.ml.groq_service import is_groq_available
+from .services.ml.groq_service import QUIZ_MAX_QUESTIONS, is_groq_available
+from .services.ml.generation_backends import backend_chain, backends_info, iterate_in_thread
+from .services.ml.stream_translation import IncrementalTranslator
+from .services.jobs import job_queue
+from .services.content_store import content_store
+from .services.sessions import session_owner, session_store
+from .services.ml.quiz_parser import format_quiz_text
+from .services.ml.model_registry import registry
+from .services.ml.retrieval import retriever
+from .services.ml.generation_policy import policy_stats
+from .services.ml.groq_service import executor as groq_executor, scheduler as groq_scheduler
+from .services.ml.priority import local_scheduler
+from .responses import FastJSONResponse, ContentNegotiationMiddleware, json_dumps
+from .middleware import (
+    CompressionMiddleware,
+    AdmissionMiddleware,
+    PriorityMiddleware,
+    HTTPCacheMiddleware,
+    UsageMiddleware,
+    DeadlineMiddleware,
+    TrafficCaptureMiddleware,
+    RequestIdMiddleware,
+)
+from .services.ml.deadlines import GenerationAborted, DeadlineExceeded, current_deadline
+from .services.admission import admission_controller
+from .services.usage import usage_accountant
+from .services.traffic import traffic_recorder
+from .services.structured_logging import configure_logging, logging_stats, shutdown_logging
+from .services.diagnostics import DEBUG_ADMIN_TOKEN, allocation_tracker, malloc_trim, memory_report
+from .chat_socket import router as chat_socket_router
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Structured logging from a background thread (LOG_LEVEL, LOG_FORMAT, LOG_LEVELS, LOG_SAMPLING)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Chatbot Tutor API",
     description="API for the Chatbot Tutor application with ML models",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Thread pool for running sync functions
 executor = ThreadPoolExecutor(max_workers=4)
 
+# Priority class (interactive/standard/bulk) for the generation schedulers
+app.add_middleware(PriorityMiddleware)
+
+# Attribute token usage to endpoint and client (optional X-Usage response header)
+app.add_middleware(UsageMiddleware)
+
+# Per-client rate limits, fair queuing and load shedding. Added first so it
+# sits inside CORS and its 429/503 responses still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
+# Per-request deadline (X-Request-Timeout or endpoint default), cancelled
+# when the client disconnects. Outside admission so queueing counts too.
+app.add_middleware(DeadlineMiddleware)
+
+# Sample requests for traffic replay (TRAFFIC_CAPTURE_RATE, off by default).
+# Outside admission and deadlines so captured latencies include queueing.
+app.add_middleware(TrafficCaptureMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +100,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ETags, Cache-Control and 304s for cacheable GET endpoints. Added before
+# compression so the ETag hashes the uncompressed body.
+app.add_middleware(HTTPCacheMiddleware)
+
+# Compress large responses (brotli/gzip) and negotiate MessagePack via Accept
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ContentNegotiationMiddleware)
+
+# Request id for log records (X-Request-ID); outermost so every layer's logs carry it
+app.add_middleware(RequestIdMiddleware)
+
+# WebSocket chat (/ws/chat)
+app.include_router(chat_socket_router)
+
+
+# Generation stopped by the request deadline (504) or a client disconnect
+# (499, nginx's "client closed request"; the client rarely sees it)
+@app.exception_handler(GenerationAborted)
+async def generation_aborted_handler(request: Request, exc: GenerationAborted):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT if isinstance(exc, DeadlineExceeded) else 499
+    return FastJSONResponse({"detail": str(exc)}, status_code=status_code)
+
 
 # Fallback handler for CORS preflight requests. Some proxies or platforms
 # may not forward OPTIONS requests to the app correctly; this explicit
@@ -84,9 +157,23 @@ async def startup_event():
         logger.info("✅ Groq API is ENABLED - Using Groq for faster inference")
     else:
         logger.warning("⚠️  Groq API not configured - Using local models")
+    logger.info(f"Generation backends: {', '.join(b.name for b in backend_chain()) or 'none'}")
+    
+    # Resume queued bulk jobs and start the job workers
+    job_queue.start(recover=os.getenv("JOBS_RECOVER_ON_START", "1") == "1")
     
     logger.info("=" * 60)
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let running jobs finish (or requeue them) before exiting"""
+    await job_queue.stop()
+    session_store.close()
+    usage_accountant.close()
+    traffic_recorder.close()
+    shutdown_logging()
+
 # Request/Response Models
 class LanguageDetectionRequest(BaseModel):
     text: str
@@ -94,6 +181,8 @@ class LanguageDetectionRequest(BaseModel):
 class LanguageDetectionResponse(BaseModel):
     language: str
     confidence: float
+    # Indian language typed in Latin script
+    romanized: bool = False
 
 class IntentClassificationRequest(BaseModel):
     text: str
@@ -113,10 +202,29 @@ class TranslationResponse(BaseModel):
     source_lang: str
     target_lang: str
 
+class TransliterationRequest(BaseModel):
+    text: str
+    # Detected from the text when omitted
+    language: Optional[str] = None
+
+class TransliterationResponse(BaseModel):
+    text: str
+    language: str
+    romanized: bool
+
 class AnswerGenerationRequest(BaseModel):
     prompt: str
     max_length: int = 200
     temperature: float = 0.7
+    # Intent from /classify-intent. When set, `prompt` is the raw question and
+    # the generation policy picks the template, budget and temperature.
+    intent: Optional[str] = None
+    subject: Optional[str] = None
+    # Server-side chat session; earlier turns are added as bounded context
+    session_id: Optional[str] = None
+    # Indian language code: answers[0] then also carries local_text, generated
+    # in the same completion where the backend supports it
+    language: Optional[str] = None
 
 class AnswerGenerationResponse(BaseModel):
     answers: List[Dict[str, Union[str, float]]]
@@ -125,21 +233,55 @@ class NotesGenerationRequest(BaseModel):
     text: str
     max_length: int = 200
     temperature: float = 0.7
+    # "auto", "single" or "map_reduce" (chunked for long source documents)
+    mode: str = "auto"
+    # Syllabus coordinates; known topics are served from the precomputed store
+    subject: Optional[str] = None
+    topic: Optional[str] = None
+    language: str = "en"
 
 class QuizGenerationRequest(BaseModel):
     text: str
-    num_questions: int = 5
+    num_questions: int = Field(5, ge=1, le=QUIZ_MAX_QUESTIONS)
     max_length: int = 500
     temperature: float = 0.7
+    subject: Optional[str] = None
+    topic: Optional[str] = None
+    language: str = "en"
+
+class QuizQuestion(BaseModel):
+    question: str
+    options: List[str]
+    correct_index: int
+    explanation: str = ""
+
+class QuizGenerationResponse(BaseModel):
+    answers: List[Dict[str, Union[str, float]]]
+    questions: List[QuizQuestion] = []
+    # Questions in the requested language, when served from the precomputed store
+    local_questions: List[QuizQuestion] = []
+
+class JobTask(BaseModel):
+    kind: str  # "notes" or "quiz"
+    params: Dict[str, Any]
+    # Idempotency key; defaults to a hash of kind and params
+    key: Optional[str] = None
+
+class JobSubmissionRequest(BaseModel):
+    tasks: List[JobTask]
 
 # Health check endpoint
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "Chatbot Tutor API is running"}
 
+# Model endpoints are plain def so inference runs in the threadpool; on the
+# event loop it would stall every other request (and inflate the loop lag
+# that admission control sheds load on)
+
 # Language detection endpoint
 @app.post("/detect-language", response_model=LanguageDetectionResponse)
-async def detect_language_endpoint(request: LanguageDetectionRequest):
+def detect_language_endpoint(request: LanguageDetectionRequest):
     try:
         result = detect_language(request.text)
         return result
@@ -149,7 +291,7 @@ async def detect_language_endpoint(request: LanguageDetectionRequest):
 
 # Intent classification endpoint
 @app.post("/classify-intent", response_model=IntentClassificationResponse)
-async def classify_intent_endpoint(request: IntentClassificationRequest):
+def classify_intent_endpoint(request: IntentClassificationRequest):
     try:
         result = classify_intent(request.text)
         return result
@@ -159,7 +301,7 @@ async def classify_intent_endpoint(request: IntentClassificationRequest):
 
 # Translation endpoint
 @app.post("/translate", response_model=TranslationResponse)
-async def translate_endpoint(request: TranslationRequest):
+def translate_endpoint(request: TranslationRequest):
     try:
         translated_text = translate_text(
             text=request.text,
@@ -173,63 +315,351 @@ async def translate_endpoint(request: TranslationRequest):
         }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except GenerationAborted:
+        raise
     except Exception as e:
         logger.error(f"Error in translation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Romanized Indian-language text to native script, without the translation model
+@app.post("/transliterate", response_model=TransliterationResponse)
+async def transliterate_endpoint(request: TransliterationRequest):
+    language = request.language
+    if language is None:
+        detected = detect_romanized(request.text)
+        if detected is None:
+            return {"text": request.text, "language": "en", "romanized": False}
+        language = detected["language"]
+    elif language not in TRANSLITERATION_SCHEMES:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {language}")
+    return {
+        "text": to_native_script(request.text, language),
+        "language": language,
+        "romanized": is_latin_script(request.text),
+    }
+
+def _session_context(request: AnswerGenerationRequest, owner: str) -> Optional[str]:
+    if not request.session_id:
+        return None
+    context = session_store.build_context(request.session_id, owner)
+    if context is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return context
+
 # Answer generation endpoint
 @app.post("/generate-answer", response_model=AnswerGenerationResponse)
-def generate_answer_endpoint(request: AnswerGenerationRequest):
+def generate_answer_endpoint(request: AnswerGenerationRequest, http_request: Request):
     """Generate an answer for the given prompt."""
+    owner = session_owner(http_request)
+    context = _session_context(request, owner)
     try:
-        print(f"[ENDPOINT] /generate-answer called")
-        logger.info(f"[ENDPOINT] Generating answer for prompt...")
+        logger.debug("Generating answer")
         
         answers = generate_answer(
             prompt=request.prompt,
             max_length=request.max_length,
-            temperature=request.temperature
+            temperature=request.temperature,
+            intent=request.intent,
+            subject=request.subject,
+            context=context,
+            language=request.language
         )
+        if request.session_id and answers and answers[0]["score"] > 0:
+            session_store.add_turn(request.session_id, owner, request.prompt, answers[0]["text"])
         
-        print(f"[ENDPOINT] Answer generated successfully")
-        logger.info(f"[ENDPOINT] Successfully generated answers")
+        logger.debug("Generated answer")
         return {"answers": answers}
+    except GenerationAborted:
+        raise
     except Exception as e:
-        print(f"[ENDPOINT] Exception: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        logger.error(f"Error in answer generation: {str(e)}")
+        logger.exception(f"Error in answer generation: {type(e).__name__}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Answer streamed as newline-delimited JSON events: {"event": "token", "text": ...}
+# deltas and, when "language" is an Indian language, {"event": "translation_delta",
+# "index": 0, "text": ...} for each sentence as soon as it is translated; then
+# {"event": "result", "answers": [{"text": ..., "local_text": ...}]} or
+# {"event": "error", "detail": "..."}
+@app.post("/generate-answer/stream")
+async def generate_answer_stream_endpoint(request: AnswerGenerationRequest, http_request: Request):
+    owner = session_owner(http_request)
+    # Session lookups are SQLite queries; keep them off the event loop
+    context = await asyncio.to_thread(_session_context, request, owner)
+    language = request.language
+    translate = language is not None and language != "en" and language in LANG_CODE_MAP
+    events: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def send_sentence(index: int, text: str):
+        await events.put({"event": "translation_delta", "index": index, "text": text})
+
+    async def produce():
+        translator = IncrementalTranslator(language, send_sentence) if translate else None
+        try:
+            answer_parts = []
+            async for delta in iterate_in_thread(lambda: stream_answer(
+                request.prompt,
+                max_length=request.max_length,
+                temperature=request.temperature,
+                intent=request.intent,
+                subject=request.subject,
+                context=context,
+                cancel=current_deadline(),
+            )):
+                answer_parts.append(delta)
+                await events.put({"event": "token", "text": delta})
+                if translator is not None:
+                    translator.feed(delta)
+            answer = {"text": "".join(answer_parts).strip()}
+            if translator is not None:
+                translated = await translator.finish()
+                if not translator.failed:
+                    answer["local_text"] = translated
+            if request.session_id and answer["text"]:
+                await asyncio.to_thread(session_store.add_turn, request.session_id, owner, request.prompt, answer["text"])
+            await events.put({"event": "result", "answers": [answer]})
+        except Exception as e:
+            logger.error(f"Error in answer streaming: {str(e)}")
+            await events.put({"event": "error", "detail": str(e)})
+        finally:
+            if translator is not None:
+                await translator.aclose()
+            await events.put(finished)
+
+    async def event_stream():
+        # The producer task inherits the request priority and deadline
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await events.get()
+                if event is finished:
+                    break
+                yield json_dumps(event) + b"\n"
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 # Notes generation endpoint
 @app.post("/generate-notes", response_model=AnswerGenerationResponse)
-async def generate_notes_endpoint(request: NotesGenerationRequest):
+def generate_notes_endpoint(request: NotesGenerationRequest):
+    precomputed = content_store.get("notes", request.subject, request.topic, request.language)
+    if precomputed is not None:
+        return precomputed
     try:
         notes = generate_notes(
             text=request.text,
+            mode=request.mode,
+            language=request.language,
             max_length=request.max_length,
             temperature=request.temperature
         )
         return {"answers": notes}
+    except GenerationAborted:
+        raise
     except Exception as e:
         logger.error(f"Error in notes generation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Notes generation with progress, streamed as newline-delimited JSON events:
+# {"event": "progress", "stage": "map", "done": 3, "total": 8} ... then
+# {"event": "result", "answers": [...]} or {"event": "error", "detail": "..."}
+@app.post("/generate-notes/stream")
+async def generate_notes_stream_endpoint(request: NotesGenerationRequest):
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def report(stage: str, done: int, total: int):
+        event = {"event": "progress", "stage": stage, "done": done, "total": total}
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    def run():
+        return generate_notes(
+            text=request.text,
+            mode=request.mode,
+            progress=report,
+            language=request.language,
+            max_length=request.max_length,
+            temperature=request.temperature
+        )
+
+    async def event_stream():
+        # copy_context carries the request priority and deadline into the worker thread
+        task = loop.run_in_executor(executor, contextvars.copy_context().run, run)
+        while not task.done() or not events.empty():
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield json_dumps(getter.result()) + b"\n"
+            else:
+                getter.cancel()
+        try:
+            yield json_dumps({"event": "result", "answers": task.result()}) + b"\n"
+        except Exception as e:
+            logger.error(f"Error in notes generation: {str(e)}")
+            yield json_dumps({"event": "error", "detail": str(e)}) + b"\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+def _precomputed_quiz(subject: Optional[str], topic: Optional[str], language: str, num_questions: int) -> Optional[Dict[str, Any]]:
+    """First `num_questions` questions of a precomputed quiz, or None if the store has too few."""
+    precomputed = content_store.get("quiz", subject, topic, language)
+    if precomputed is None or len(precomputed["questions"]) < num_questions:
+        return None
+    questions = precomputed["questions"][:num_questions]
+    return {
+        "answers": [{"text": format_quiz_text(questions), "score": precomputed["answers"][0]["score"]}],
+        "questions": questions,
+        "local_questions": precomputed["local_questions"][:num_questions],
+    }
+
 # Quiz generation endpoint
-@app.post("/generate-quiz", response_model=AnswerGenerationResponse)
-async def generate_quiz_endpoint(request: QuizGenerationRequest):
+@app.post("/generate-quiz", response_model=QuizGenerationResponse)
+def generate_quiz_endpoint(request: QuizGenerationRequest):
+    """Generate a quiz; runs in the threadpool because chunks fan out in parallel."""
+    precomputed = _precomputed_quiz(request.subject, request.topic, request.language, request.num_questions)
+    if precomputed is not None:
+        return precomputed
     try:
-        quiz = generate_quiz(
+        return generate_quiz_structured(
             text=request.text,
             num_questions=request.num_questions,
             max_length=request.max_length,
             temperature=request.temperature
         )
-        return {"answers": quiz}
+    except GenerationAborted:
+        raise
     except Exception as e:
         logger.error(f"Error in quiz generation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Cacheable GET variants of notes and quizzes, served only from the precomputed
+# content store (ETag and Cache-Control are added by HTTPCacheMiddleware)
+@app.get("/notes", response_model=AnswerGenerationResponse)
+async def get_notes_endpoint(subject: str, topic: str, language: str = "en"):
+    precomputed = content_store.get("notes", subject, topic, language)
+    if precomputed is None:
+        raise HTTPException(status_code=404, detail="No precomputed notes for this topic")
+    return precomputed
+
+@app.get("/quiz", response_model=QuizGenerationResponse)
+async def get_quiz_endpoint(subject: str, topic: str, language: str = "en", num_questions: int = 5):
+    precomputed = _precomputed_quiz(subject, topic, language, num_questions)
+    if precomputed is None:
+        raise HTTPException(status_code=404, detail="No precomputed quiz for this topic")
+    return precomputed
+
+# Chat sessions: ids are issued here and only the creating client (API key,
+# else address) can use, read or delete its session. Plain def: the session
+# store is SQLite, so these run in the threadpool
+@app.post("/sessions", status_code=status.HTTP_201_CREATED)
+def create_session_endpoint(http_request: Request):
+    return {"session_id": session_store.create(session_owner(http_request))}
+
+# Chat session state (summary and recent turns)
+@app.get("/sessions/{session_id}")
+def get_session_endpoint(session_id: str, http_request: Request):
+    session = session_store.get(session_id, session_owner(http_request))
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+@app.delete("/sessions/{session_id}")
+def delete_session_endpoint(session_id: str, http_request: Request):
+    if not session_store.delete(session_id, session_owner(http_request)):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
+
+# Submit a batch of notes/quiz tasks to the background job queue (plain def:
+# the queue is SQLite, which may wait for another writer)
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+def submit_job_endpoint(request: JobSubmissionRequest):
+    try:
+        return job_queue.submit([task.dict() for task in request.tasks])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error submitting job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Job progress and results
+@app.get("/jobs/{job_id}")
+def get_job_endpoint(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Loaded models, their memory footprint and the registry's memory budget
+@app.get("/models")
+async def get_models():
+    return registry.stats()
+
+# Admission state: running/queued generation requests, loop lag, rejections
+@app.get("/admission")
+async def get_admission():
+    return admission_controller.stats()
+
+def require_admin(request: Request):
+    """Allow /debug endpoints only with the DEBUG_ADMIN_TOKEN (404 when it is not configured)."""
+    if not DEBUG_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), DEBUG_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+# Memory diagnostics: RSS, allocator, torch, per-model footprint and cache sizes.
+# tracemalloc=start|diff|stop manages allocation tracing; diff compares with
+# the previous diff call. trim=true returns free heap pages to the OS first.
+@app.get("/debug/memory", dependencies=[Depends(require_admin)])
+def debug_memory(tracemalloc: Optional[str] = None, top: int = 20, group_by: str = "lineno", trim: bool = False):
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    if trim:
+        malloc_trim()
+    report = memory_report({
+        "content_store": content_store.stats,
+        "retrieval_index": retriever.stats,
+        "sessions": session_store.stats,
+        "admission": admission_controller.stats,
+        "log_queue": logging_stats,
+        "generation_policy_samples": lambda: {intent: s["samples"] for intent, s in policy_stats().items()},
+    })
+    if tracemalloc == "start":
+        allocation_tracker.start()
+        report["tracemalloc"] = allocation_tracker.diff(top, group_by)
+    elif tracemalloc == "diff":
+        report["tracemalloc"] = allocation_tracker.diff(top, group_by)
+    elif tracemalloc == "stop":
+        allocation_tracker.stop()
+        report["tracemalloc"] = {"tracing": False}
+    return report
+
+# Token usage and estimated cost grouped by endpoint, intent, client or backend
+# (admin only: client groups contain API key hashes and addresses)
+@app.get("/usage", dependencies=[Depends(require_admin)])
+async def get_usage(by: str = "endpoint", top: int = 20, sort: str = "cost_usd"):
+    try:
+        return usage_accountant.summary(by, top, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Generation backends in configured order with their capabilities
+@app.get("/backends")
+async def get_backends():
+    return backends_info()
+
+# Generation slots per backend: running, waiting and granted per priority class
+@app.get("/priority-lanes")
+async def get_priority_lanes():
+    return {"groq": groq_scheduler.stats(), "groq_pool": groq_executor.stats(), "local": local_scheduler.stats()}
+
+# Per-intent generation budgets (configured and tuned) and observed completion lengths
+@app.get("/generation-policy")
+async def get_generation_policy():
+    return policy_stats()
+
 # Get supported languages
 @app.get("/supported-languages")
 async def get_supported_languages():
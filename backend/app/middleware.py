@@ -0,0 +1,486 @@
+"""
+HTTP middleware
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .services.admission import (
+    ADMISSION_ENABLED,
+    ENDPOINT_COSTS,
+    EXEMPT_PATHS,
+    LIGHT_COST,
+    AdmissionController,
+    AdmissionRejected,
+    admission_controller,
+    client_identity,
+)
+from .services.usage import tag_usage
+from .services.traffic import (
+    CAPTURED_HEADERS,
+    TRAFFIC_CAPTURE_MAX_BODY,
+    decode_body,
+    pseudonym,
+    sanitize_path,
+    should_capture,
+    summarize_usage,
+    traffic_recorder,
+)
+from .services.ml.priority import DEFAULT_PRIORITY, ENDPOINT_PRIORITIES, resolve_priority, use_priority
+from .services.ml.deadlines import ENDPOINT_DEADLINES, Deadline, parse_timeout, use_deadline
+from .services.structured_logging import new_request_id, use_request_id
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli quality 4-5 compresses better than gzip -6 at similar CPU cost
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Cache-Control for GET endpoints whose content only changes when the server
+# or the content store is updated; these responses also get ETags
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "3600"))
+CACHE_POLICIES = {
+    "/supported-languages": "public, max-age=86400",
+    "/notes": f"public, max-age={HTTP_CACHE_MAX_AGE}, stale-while-revalidate=86400",
+    "/quiz": f"public, max-age={HTTP_CACHE_MAX_AGE}, stale-while-revalidate=86400",
+}
+
+# Client-supplied request ids are kept only if they look like ids
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "application/x-msgpack", "text/")
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best encoding the client accepts (ignores q-values other than q=0)."""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0] or any(p.replace(" ", "") in ("q=0", "q=0.0") for p in parts[1:]):
+            continue
+        accepted.add(parts[0])
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Brotli/gzip compression for complete (non-streaming) responses above a
+    size threshold. Streaming responses pass through untouched so progress
+    and token events are not held back by the compressor.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class AdmissionMiddleware:
+    """
+    Rate limiting, weighted fair queuing and load shedding per client.
+
+    Generation endpoints (ENDPOINT_COSTS) hold a concurrency slot for the
+    whole response, streaming included; other endpoints are only rate
+    limited. Exempt paths and CORS preflights pass straight through.
+    WebSocket chat questions are admitted one by one in chat_socket.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope.get("path", "")
+        if (
+            not ADMISSION_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or path in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        self.controller.ensure_monitor()
+        client = scope.get("client")
+        client_id, weight = client_identity(Headers(scope=scope), client[0] if client else None)
+        cost = ENDPOINT_COSTS.get(path) if scope["method"] == "POST" else None
+
+        try:
+            if cost is None:
+                self.controller.check_rate(client_id, weight, LIGHT_COST)
+            else:
+                await self.controller.acquire(client_id, weight, cost)
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        if cost is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.monotonic() - start)
+
+
+class PriorityMiddleware:
+    """
+    Set the generation priority class for the request: the endpoint's
+    default from ENDPOINT_PRIORITIES, or the X-Priority header (interactive,
+    standard or bulk) if it asks for less. Only API keys weighted above 1
+    in API_KEY_WEIGHTS may ask for more.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        default = ENDPOINT_PRIORITIES.get(scope.get("path", ""), DEFAULT_PRIORITY)
+        requested = headers.get("x-priority")
+        may_raise = False
+        if requested and "x-api-key" in headers:
+            client = scope.get("client")
+            may_raise = client_identity(headers, client[0] if client else None)[1] > 1.0
+        with use_priority(resolve_priority(requested, default, may_raise)):
+            await self.app(scope, receive, send)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class HTTPCacheMiddleware:
+    """
+    Content-hash ETags, Cache-Control and 304 Not Modified for the GET
+    endpoints in CACHE_POLICIES. The ETag is weak because compression,
+    which runs outside this middleware, changes the bytes on the wire.
+    """
+
+    def __init__(self, app: ASGIApp, policies: Optional[dict] = None):
+        self.app = app
+        self.policies = CACHE_POLICIES if policies is None else policies
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or scope.get("path") not in self.policies
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        cache_control = self.policies[scope["path"]]
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start_message: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            if start_message["status"] != 200:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b"".join(chunks)})
+                return
+
+            body = b"".join(chunks)
+            etag = 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["etag"] = etag
+            headers["cache-control"] = cache_control
+            if if_none_match and etag_matches(if_none_match, etag):
+                del headers["content-length"]
+                del headers["content-type"]
+                await send({**start_message, "status": 304})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class UsageMiddleware:
+    """
+    Attribute generation usage to the endpoint and client of the request.
+    With `X-Include-Usage: 1` the response carries an `X-Usage` header
+    summarizing the tokens, backends and cost of the request's generations
+    (for streaming responses, only those finished before the first byte).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        client = scope.get("client")
+        client_id, _ = client_identity(headers, client[0] if client else None)
+        include = headers.get("x-include-usage", "").lower() in ("1", "true", "yes")
+        capture = scope.get("traffic_capture")
+
+        with tag_usage(scope.get("path", ""), client_id, collect=include or capture is not None) as records:
+            if capture is not None:
+                capture["client"] = client_id
+                capture["usage"] = records
+            if not include:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start":
+                    summary = {
+                        "calls": len(records),
+                        "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+                        "completion_tokens": sum(r["completion_tokens"] for r in records),
+                        "backends": sorted({r["backend"] for r in records}),
+                        "latency_s": round(sum(r["latency_s"] for r in records), 3),
+                        "cost_usd": round(sum(r["cost_usd"] for r in records), 6),
+                    }
+                    MutableHeaders(raw=message["headers"])["x-usage"] = json.dumps(summary, separators=(",", ":"))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+class TrafficCaptureMiddleware:
+    """
+    Record a sample of HTTP requests for replay (see services/traffic.py):
+    the sanitized request, status, time to first byte, total latency and
+    the generation usage collected by UsageMiddleware, which must sit
+    inside this middleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not should_capture(scope.get("path", "")):
+            await self.app(scope, receive, send)
+            return
+        capture: dict = {}
+        scope["traffic_capture"] = capture
+        chunks: List[bytes] = []
+        request_bytes = 0
+        status = None
+        response_bytes = 0
+        first_byte: Optional[float] = None
+        started_at = time.time()
+        start = time.perf_counter()
+
+        async def receive_wrapper() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                request_bytes += len(body)
+                if request_bytes <= TRAFFIC_CAPTURE_MAX_BODY:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal status, response_bytes, first_byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            headers = Headers(scope=scope)
+            body_complete = request_bytes <= TRAFFIC_CAPTURE_MAX_BODY
+            traffic_recorder.record({
+                "ts": round(started_at, 3),
+                "method": scope["method"],
+                "path": sanitize_path(scope.get("path", "")),
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "client": pseudonym(capture.get("client", "unknown"), "c-"),
+                "headers": {name: headers[name] for name in CAPTURED_HEADERS if name in headers},
+                "body": decode_body(b"".join(chunks), headers.get("content-type", "")) if body_complete else None,
+                "body_truncated": not body_complete,
+                "request_bytes": request_bytes,
+                # None: the client went away (or the app failed) before a response
+                "status": status,
+                "response_bytes": response_bytes,
+                "ttfb_s": round(first_byte, 4) if first_byte is not None else None,
+                "latency_s": round(time.perf_counter() - start, 4),
+                "usage": summarize_usage(capture.get("usage")),
+            })
+
+
+class DeadlineMiddleware:
+    """
+    Give each HTTP request a Deadline: `X-Request-Timeout` seconds if the
+    client sent a valid value, else the endpoint's default from
+    ENDPOINT_DEADLINES. Once the request body has been read, a watcher
+    waits for http.disconnect and cancels the deadline, so generation for
+    a client that went away stops at its next check.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope.get("path", "")
+        timeout = parse_timeout(Headers(scope=scope).get("x-request-timeout")) or ENDPOINT_DEADLINES.get(path)
+        deadline = Deadline(timeout)
+        watcher: Optional[asyncio.Task] = None
+
+        async def watch_disconnect() -> Message:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                deadline.cancel()
+            return message
+
+        async def receive_wrapper() -> Message:
+            nonlocal watcher
+            if watcher is not None:
+                # The body is complete; the next message can only be the disconnect
+                return await asyncio.shield(watcher)
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                deadline.cancel()
+            elif not message.get("more_body", False):
+                watcher = asyncio.ensure_future(watch_disconnect())
+            return message
+
+        with use_deadline(deadline):
+            try:
+                await self.app(scope, receive_wrapper, send)
+            finally:
+                if watcher is not None and not watcher.done():
+                    watcher.cancel()
+
+
+class RequestIdMiddleware:
+    """
+    Tag every request (and WebSocket connection) with an id for the log
+    records written while handling it: the client's `X-Request-ID` if it
+    sent a usable one, else a new one. HTTP responses echo it back.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        request_id = Headers(scope=scope).get("x-request-id", "")
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = new_request_id()
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])["x-request-id"] = request_id
+            await send(message)
+
+        with use_request_id(request_id):
+            await self.app(scope, receive, send_wrapper if scope["type"] == "http" else send)
@@ -0,0 +1,84 @@
+"""
+Prepare local model artifacts
+
+Usage (from the backend directory):
+    python -m app.prepare_models [answer intent translation ...] [--dtype float16]
+    python -m app.prepare_models --verify
+
+Downloads each registered model (all of them by default) once and writes a
+new safetensors artifact version with a checksummed manifest under
+MODEL_ARTIFACTS_DIR. The API then loads the models offline from these
+artifacts, memory-mapped, instead of from the Hugging Face cache.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from typing import List
+
+# Importing the services registers their artifact specs
+from .services.ml import answer_generator, intent_classifier, translator  # noqa: F401
+from .services.ml.model_artifacts import (
+    MODEL_ARTIFACTS_DIR,
+    SPECS,
+    prepare_artifact,
+    resolve_artifact_path,
+    verify_artifact,
+)
+
+logger = logging.getLogger("prepare_models")
+
+DTYPES = ("float32", "float16", "bfloat16")
+
+
+def verify(names: List[str], artifacts_dir: str) -> int:
+    failed = 0
+    for name in names:
+        path = resolve_artifact_path(name, artifacts_dir)
+        if path is None:
+            logger.warning(f"{name}: no artifact")
+            continue
+        problems = verify_artifact(path)
+        if problems:
+            failed += 1
+            logger.error(f"{name}: {path} is damaged: {'; '.join(problems)}")
+        else:
+            logger.info(f"{name}: {path} OK")
+    return 1 if failed else 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Download models once into versioned safetensors artifacts")
+    parser.add_argument("models", nargs="*", help=f"Registry names (default: all of {', '.join(SPECS)})")
+    parser.add_argument("--output-dir", default=MODEL_ARTIFACTS_DIR, help="Model artifacts directory")
+    parser.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"), help="Artifact version label")
+    parser.add_argument("--dtype", choices=DTYPES, help="Store the weights in this dtype (half precision is for GPU hosts)")
+    parser.add_argument("--no-activate", action="store_true", help="Build without pointing CURRENT at the new version")
+    parser.add_argument("--verify", action="store_true", help="Check the current artifacts against their manifests instead")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    names = args.models or list(SPECS)
+    unknown = [name for name in names if name not in SPECS]
+    if unknown:
+        logger.error(f"Unknown models: {', '.join(unknown)} (known: {', '.join(SPECS)})")
+        return 1
+    if args.verify:
+        return verify(names, args.output_dir)
+
+    for name in names:
+        started = time.time()
+        path = prepare_artifact(
+            name,
+            artifacts_dir=args.output_dir,
+            version=args.version,
+            dtype=args.dtype,
+            make_current=not args.no_activate,
+        )
+        logger.info(f"Wrote {path} ({time.time() - started:.0f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Fast response serialization
+JSON is encoded with orjson when it is installed, and clients that send
+`Accept: application/msgpack` get MessagePack instead (if msgpack is
+installed). Both libraries are optional; the stdlib json encoder is the
+fallback.
+"""
+
+import contextvars
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Set per request by ContentNegotiationMiddleware
+_wants_msgpack: contextvars.ContextVar[bool] = contextvars.ContextVar("wants_msgpack", default=False)
+
+
+def json_dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson, or MessagePack when the client asked for it."""
+
+    def __init__(self, content: Any = None, *args, **kwargs):
+        if msgpack is not None and _wants_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPES[0]
+        super().__init__(content, *args, **kwargs)
+        self.headers.setdefault("vary", "Accept")
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type in MSGPACK_MEDIA_TYPES:
+            return msgpack.packb(content, use_bin_type=True)
+        return json_dumps(content)
+
+
+class ContentNegotiationMiddleware:
+    """Record whether the client accepts MessagePack so FastJSONResponse can use it."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or msgpack is None:
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1").lower()
+                break
+        token = _wants_msgpack.set(any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _wants_msgpack.reset(token)
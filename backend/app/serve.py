@@ -0,0 +1,248 @@
+"""
+Production multi-worker launcher
+
+Usage (from the backend directory):
+    python -m app.serve --workers 8 --port 8000
+
+The master process imports the app and loads the configured models once,
+freezes the GC so the preloaded objects are never touched by collection,
+then forks the workers. Workers share the model weights copy-on-write, so
+RAM grows by the per-worker request state only, not by a full set of
+models per worker.
+
+Signals (to the master):
+    SIGHUP          rolling restart: workers are replaced one at a time
+    SIGTERM/SIGINT  graceful shutdown: workers finish in-flight requests
+    SIGTTIN/SIGTTOU add/remove one worker
+
+Code changes need a full restart: reloaded workers are forked from the
+already-imported master.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+logger = logging.getLogger("serve")
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+# Comma-separated model registry names, "none", or "all"
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "answer,intent,translation")
+# Torch intra-op threads per worker; 0 = CPU count / workers
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "0"))
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "30"))
+
+
+def preload_models(names: List[str]):
+    """Load models in the master so forked workers share the weights."""
+    from .services.ml.model_registry import registry
+
+    if names == ["all"]:
+        names = registry.names()
+    for name in names:
+        if name == "none":
+            continue
+        if name not in registry.names():
+            raise ValueError(f"Unknown model '{name}'; expected one of {', '.join(registry.names())}")
+        start = time.time()
+        try:
+            registry.get(name)
+            logger.info(f"Preloaded {name} model in {time.time() - start:.1f}s")
+        except Exception as e:
+            # Workers fall back to lazy loading, as in single-process mode
+            logger.warning(f"Failed to preload {name} model: {e}")
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def configure_torch_threads(threads: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before the first inter-op parallel work in this process
+        pass
+
+
+def run_worker(app, sock: socket.socket, threads: int, args) -> None:
+    """Body of a forked worker; never returns."""
+    import uvicorn
+
+    for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    gc.enable()
+    configure_torch_threads(threads)
+
+    config = uvicorn.Config(
+        app,
+        log_level=args.log_level,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=WORKER_SHUTDOWN_TIMEOUT,
+        # The app routes uvicorn's loggers through its logging queue
+        log_config=None,
+    )
+    server = uvicorn.Server(config)
+    try:
+        server.run(sockets=[sock])
+    except BaseException as e:
+        logger.error(f"Worker {os.getpid()} crashed: {e}")
+        os._exit(1)
+    os._exit(0)
+
+
+class Master:
+    def __init__(self, app, sock: socket.socket, workers: int, threads: int, args):
+        self.app = app
+        self.sock = sock
+        self.target_workers = workers
+        self.threads = threads
+        self.args = args
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.pending_signals: List[int] = []
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.app, self.sock, self.threads, self.args)
+        self.workers[pid] = time.time()
+        logger.info(f"Started worker {pid}")
+        return pid
+
+    def stop_worker(self, pid: int, sig: int = signal.SIGTERM):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+
+    def reap(self):
+        """Collect exited workers; returns pids that exited."""
+        exited = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                started = self.workers.pop(pid)
+                exited.append(pid)
+                code = os.waitstatus_to_exitcode(status)
+                if code != 0:
+                    logger.warning(f"Worker {pid} exited with {code} after {time.time() - started:.0f}s")
+        return exited
+
+    def rolling_restart(self):
+        logger.info("Rolling restart of workers")
+        for pid in list(self.workers):
+            self.spawn()
+            self.stop_worker(pid)
+            deadline = time.time() + WORKER_SHUTDOWN_TIMEOUT
+            while pid in self.workers and time.time() < deadline:
+                time.sleep(0.2)
+                self.reap()
+            if pid in self.workers:
+                self.stop_worker(pid, signal.SIGKILL)
+
+    def shutdown(self):
+        logger.info("Shutting down workers")
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        deadline = time.time() + WORKER_SHUTDOWN_TIMEOUT
+        while self.workers and time.time() < deadline:
+            time.sleep(0.2)
+            self.reap()
+        for pid in list(self.workers):
+            self.stop_worker(pid, signal.SIGKILL)
+        self.reap()
+
+    def run(self):
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, lambda signum, frame: self.pending_signals.append(signum))
+
+        for _ in range(self.target_workers):
+            self.spawn()
+
+        last_respawn = 0.0
+        while True:
+            while self.pending_signals:
+                signum = self.pending_signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.shutdown()
+                    return
+                if signum == signal.SIGHUP:
+                    self.rolling_restart()
+                elif signum == signal.SIGTTIN:
+                    self.target_workers += 1
+                elif signum == signal.SIGTTOU and self.target_workers > 1:
+                    self.target_workers -= 1
+                    self.stop_worker(max(self.workers, key=self.workers.get))
+
+            self.reap()
+            # Respawn crashed workers, at most once per second to avoid fork storms
+            if len(self.workers) < self.target_workers and time.time() - last_respawn >= 1.0:
+                self.spawn()
+                last_respawn = time.time()
+            time.sleep(0.5)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the API with preloaded, shared models")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--preload", default=PRELOAD_MODELS, help="Models to load before forking")
+    parser.add_argument("--torch-threads", type=int, default=TORCH_THREADS_PER_WORKER)
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(name)s: %(message)s")
+
+    # Keep the GC from running while the shared heap is being built
+    gc.disable()
+
+    # Requeue interrupted jobs once here; workers must not reset each other's running tasks
+    from .services.jobs import job_queue
+    resumed = job_queue.recover()
+    job_queue.close()
+    os.environ["JOBS_RECOVER_ON_START"] = "0"
+    if resumed:
+        logger.info(f"Requeued {resumed} interrupted job task(s)")
+
+    from .main import app
+    preload_models([name.strip() for name in args.preload.split(",") if name.strip()])
+
+    threads = args.torch_threads or max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers, {threads} torch thread(s) each")
+
+    # Move everything allocated so far to the permanent generation: collections
+    # in the workers then never write to (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+
+    Master(app, sock, args.workers, threads, args).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Admission control
+Per-client token buckets, weighted fair queuing of generation requests
+across clients, and load shedding on event-loop lag and queue wait, so one
+misbehaving bulk client cannot starve interactive users.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# Sustained requests/second and burst per client (multiplied by the client weight)
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "2"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "20"))
+# Generation requests running at once across all clients
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+# Shed requests expected to (or that actually) wait longer than this in the queue
+ADMISSION_MAX_QUEUE_WAIT = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT", "15"))
+# Shed new requests while the event loop lags more than this (seconds)
+ADMISSION_MAX_LOOP_LAG = float(os.getenv("ADMISSION_MAX_LOOP_LAG", "0.25"))
+# "key:weight,key:weight" — API keys with a larger share of capacity
+API_KEY_WEIGHTS = os.getenv("API_KEY_WEIGHTS", "")
+# Use X-Forwarded-For for client identity (only behind a trusted proxy)
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") == "1"
+MAX_TRACKED_CLIENTS = 10000
+
+# Cheap endpoints bypass admission entirely
+EXEMPT_PATHS = {"/", "/detect-language", "/transliterate", "/supported-languages", "/docs", "/openapi.json", "/redoc"}
+
+# Relative cost of an endpoint in bucket tokens and fair-queue service units
+ENDPOINT_COSTS: Dict[str, float] = {
+    "/generate-answer": 1.0,
+    "/generate-answer/stream": 2.0,
+    # Per question on the chat WebSocket (admitted in chat_socket)
+    "/ws/chat": 2.0,
+    "/translate": 1.0,
+    "/classify-intent": 0.5,
+    "/generate-notes": 3.0,
+    "/generate-notes/stream": 3.0,
+    "/generate-quiz": 5.0,
+    "/jobs": 2.0,
+}
+# Other (non-generation) endpoints only pay this many tokens and skip the queue
+LIGHT_COST = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    weights = {}
+    for item in raw.split(","):
+        if ":" in item:
+            key, weight = item.rsplit(":", 1)
+            weights[key.strip()] = float(weight)
+    return weights
+
+
+def client_identity(headers: Dict[str, str], client_host: Optional[str]) -> Tuple[str, float]:
+    """Return (client id, weight) from the API key, else the client address."""
+    api_key = headers.get("x-api-key")
+    if api_key:
+        weight = _weights.get(api_key, 1.0)
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16], weight
+    host = client_host or "unknown"
+    if TRUST_PROXY_HEADERS and headers.get("x-forwarded-for"):
+        host = headers["x-forwarded-for"].split(",")[0].strip()
+    return "ip:" + host, 1.0
+
+
+_weights = _parse_weights(API_KEY_WEIGHTS)
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float, rate: float, capacity: float) -> float:
+        """Consume `cost` tokens; returns 0 on success, else seconds until enough tokens."""
+        now = time.monotonic()
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / rate
+
+
+class AdmissionController:
+    """Token buckets + weighted fair queue in front of the generation endpoints."""
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.running = 0
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # (virtual finish time, seq, future, client)
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: "OrderedDict[str, float]" = OrderedDict()
+        self._service_time = 1.0  # EWMA of slot hold time, seconds
+        self.loop_lag = 0.0
+        self._lag_task: Optional[asyncio.Task] = None
+        self.rejected = {"rate_limited": 0, "shed_lag": 0, "shed_queue": 0}
+
+    # Event-loop lag
+
+    def ensure_monitor(self):
+        if self._lag_task is None:
+            self._lag_task = asyncio.get_running_loop().create_task(self._monitor_lag())
+
+    async def _monitor_lag(self, interval: float = 0.1):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            self.loop_lag = 0.7 * self.loop_lag + 0.3 * lag
+
+    # Admission
+
+    def _bucket(self, client: str) -> TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(ADMISSION_BURST)
+            self._buckets[client] = bucket
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket
+
+    def _estimated_wait(self) -> float:
+        return len(self._queue) * self._service_time / max(1, self.max_concurrent)
+
+    def check_rate(self, client: str, weight: float, cost: float):
+        """Charge the client's token bucket or raise AdmissionRejected (429)."""
+        retry_after = self._bucket(client).take(cost, ADMISSION_RATE * weight, ADMISSION_BURST * weight)
+        if retry_after > 0:
+            self.rejected["rate_limited"] += 1
+            raise AdmissionRejected(429, "Rate limit exceeded", retry_after)
+
+    async def acquire(self, client: str, weight: float, cost: float):
+        """
+        Admit a generation request or raise AdmissionRejected.
+
+        Returns once the request holds a concurrency slot; release() must be
+        called when it finishes.
+        """
+        self.check_rate(client, weight, cost)
+
+        if self.loop_lag > ADMISSION_MAX_LOOP_LAG:
+            self.rejected["shed_lag"] += 1
+            raise AdmissionRejected(503, "Server overloaded", 1.0)
+
+        if self.running < self.max_concurrent and not self._queue:
+            self.running += 1
+            self._advance(client, weight, cost)
+            return
+
+        if self._estimated_wait() > ADMISSION_MAX_QUEUE_WAIT:
+            self.rejected["shed_queue"] += 1
+            raise AdmissionRejected(503, "Server busy, queue is full", self._estimated_wait())
+
+        # Weighted fair queuing: order by virtual finish time
+        start = max(self._virtual_time, self._last_finish.get(client, 0.0))
+        finish = start + cost / weight
+        self._set_last_finish(client, finish)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._seq), future, client))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=ADMISSION_MAX_QUEUE_WAIT)
+        except asyncio.TimeoutError:
+            if future.done():
+                return
+            future.cancel()
+            self.rejected["shed_queue"] += 1
+            raise AdmissionRejected(503, "Server busy, queue wait exceeded", self._estimated_wait())
+        except asyncio.CancelledError:
+            # Client went away while queued; hand the slot on if it was granted
+            if future.done() and not future.cancelled():
+                self.release(0.0)
+            future.cancel()
+            raise
+
+    def _advance(self, client: str, weight: float, cost: float):
+        start = max(self._virtual_time, self._last_finish.get(client, 0.0))
+        self._set_last_finish(client, start + cost / weight)
+
+    def _set_last_finish(self, client: str, finish: float):
+        self._last_finish[client] = finish
+        self._last_finish.move_to_end(client)
+        if len(self._last_finish) > MAX_TRACKED_CLIENTS:
+            self._last_finish.popitem(last=False)
+
+    def release(self, held_for: float):
+        """Free a slot and grant it to the queued request with the smallest finish time."""
+        if held_for > 0:
+            self._service_time = 0.9 * self._service_time + 0.1 * held_for
+        while self._queue:
+            finish, _, future, _ = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self._virtual_time = finish
+            future.set_result(None)
+            return
+        self.running -= 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": self.running,
+            "queued": len(self._queue),
+            "max_concurrent": self.max_concurrent,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "estimated_wait_s": round(self._estimated_wait(), 2),
+            "tracked_clients": len(self._buckets),
+            **self.rejected,
+        }
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,180 @@
+"""
+Precomputed curriculum content store
+A versioned, read-only SQLite file holding notes and quizzes (with their
+translations) for known subject/topic pairs. The API consults it before
+calling any model; the file is produced offline by `python -m app.build_content`.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+CONTENT_STORE_DIR = os.getenv(
+    "CONTENT_STORE_DIR",
+    os.path.join(os.path.dirname(__file__), "../../content_store"),
+)
+# Explicit store file; defaults to the version named in CONTENT_STORE_DIR/CURRENT
+CONTENT_STORE_PATH = os.getenv("CONTENT_STORE_PATH")
+# Decoded entries kept in memory so hot topics are served without SQLite
+CONTENT_CACHE_SIZE = int(os.getenv("CONTENT_CACHE_SIZE", "1024"))
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE content (
+    kind TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    language TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (kind, subject, topic, language)
+) WITHOUT ROWID;
+"""
+
+
+def normalize_key(value: Optional[str]) -> str:
+    """Normalize a subject/topic for lookups (case and whitespace insensitive)."""
+    return " ".join((value or "").lower().split())
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def _decode(blob: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def resolve_store_path(store_dir: str = CONTENT_STORE_DIR) -> Optional[str]:
+    """Return the store file to serve: CONTENT_STORE_PATH, else the CURRENT version."""
+    if CONTENT_STORE_PATH:
+        return CONTENT_STORE_PATH
+    pointer = os.path.join(store_dir, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        name = f.read().strip()
+    return os.path.join(store_dir, name) if name else None
+
+
+class ContentStore:
+    """Read-only lookups against a built content store file."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.meta: Dict[str, str] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[tuple, Optional[Dict[str, Any]]]" = OrderedDict()
+
+        if not path or not os.path.exists(path):
+            logger.info("No precomputed content store found")
+            return
+        try:
+            # immutable=1: no locking or change detection, the file is never written in place
+            conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            self.meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            if int(self.meta.get("schema_version", 0)) != SCHEMA_VERSION:
+                logger.warning(f"Ignoring content store {path}: schema {self.meta.get('schema_version')} != {SCHEMA_VERSION}")
+                conn.close()
+                return
+            self._conn = conn
+            logger.info(f"Loaded content store {path} (version {self.meta.get('build_version')})")
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to open content store {path}: {e}")
+
+    @property
+    def available(self) -> bool:
+        return self._conn is not None
+
+    def get(self, kind: str, subject: Optional[str], topic: Optional[str], language: str = "en") -> Optional[Dict[str, Any]]:
+        """
+        Look up precomputed content.
+
+        Args:
+            kind: "notes" or "quiz"
+            subject: Subject name as sent by the frontend
+            topic: Topic name as sent by the frontend
+            language: Language code of the translation wanted
+
+        Returns:
+            The stored payload, or None if the topic is not precomputed
+        """
+        if self._conn is None or not topic:
+            return None
+        key = (kind, normalize_key(subject), normalize_key(topic), language.lower())
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            row = self._conn.execute(
+                "SELECT payload FROM content WHERE kind = ? AND subject = ? AND topic = ? AND language = ?",
+                key,
+            ).fetchone()
+            payload = _decode(row[0]) if row else None
+            self._cache[key] = payload
+            if len(self._cache) > CONTENT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return payload
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "available": self.available, "cached_entries": len(self._cache), **self.meta}
+
+
+class ContentStoreWriter:
+    """Builds a new store version; the file only becomes visible on commit()."""
+
+    def __init__(self, store_dir: str, version: str, source: str = ""):
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.version = version
+        self.filename = f"content-{version}.sqlite3"
+        self._tmp_path = os.path.join(store_dir, f".{self.filename}.tmp")
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._conn = sqlite3.connect(self._tmp_path)
+        self._conn.executescript(SCHEMA)
+        self._conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("schema_version", str(SCHEMA_VERSION)),
+                ("build_version", version),
+                ("built_at", str(int(time.time()))),
+                ("source", source),
+            ],
+        )
+
+    def put(self, kind: str, subject: str, topic: str, language: str, payload: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO content (kind, subject, topic, language, payload) VALUES (?, ?, ?, ?, ?)",
+            (kind, normalize_key(subject), normalize_key(topic), language.lower(), _encode(payload)),
+        )
+
+    def commit(self, make_current: bool = True) -> str:
+        """Finalize the file, move it into place and optionally point CURRENT at it."""
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+        self._conn.close()
+        path = os.path.join(self.store_dir, self.filename)
+        os.replace(self._tmp_path, path)
+        if make_current:
+            pointer_tmp = os.path.join(self.store_dir, ".CURRENT.tmp")
+            with open(pointer_tmp, "w") as f:
+                f.write(self.filename + "\n")
+            os.replace(pointer_tmp, os.path.join(self.store_dir, "CURRENT"))
+        return path
+
+
+content_store = ContentStore(resolve_store_path())
@@ -0,0 +1,217 @@
+"""
+Memory diagnostics
+Process, allocator, model and cache memory figures for GET /debug/memory,
+plus an optional tracemalloc snapshot diff between two calls to find
+growth in the request path.
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from .ml.model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Admin token for /debug endpoints; the endpoints are disabled when unset
+DEBUG_ADMIN_TOKEN = os.getenv("DEBUG_ADMIN_TOKEN", "")
+# Start tracing allocations at import (costs CPU and memory; off by default)
+DEBUG_TRACEMALLOC = os.getenv("DEBUG_TRACEMALLOC", "0") == "1"
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+_STATUS_FIELDS = ("VmRSS", "VmHWM", "VmSize", "RssAnon", "RssFile", "RssShmem", "VmSwap")
+
+
+def process_memory() -> Dict[str, Any]:
+    """Memory figures from /proc/self/status in bytes (Linux; empty elsewhere)."""
+    stats: Dict[str, Any] = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in _STATUS_FIELDS:
+                    stats[name] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    stats["threads"] = threading.active_count()
+    stats["gc_counts"] = gc.get_count()
+    if hasattr(gc, "get_freeze_count"):
+        # Objects frozen before forking by app.serve (shared copy-on-write)
+        stats["gc_frozen"] = gc.get_freeze_count()
+    return stats
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in (
+        "arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks",
+        "fsmblks", "uordblks", "fordblks", "keepcost",
+    )]
+
+
+def _libc() -> Optional[ctypes.CDLL]:
+    path = ctypes.util.find_library("c")
+    if not path:
+        return None
+    try:
+        return ctypes.CDLL(path)
+    except OSError:
+        return None
+
+
+_libc_handle = _libc()
+
+
+def malloc_stats() -> Optional[Dict[str, int]]:
+    """glibc heap statistics (mallinfo2, glibc >= 2.33), or None if unavailable."""
+    if _libc_handle is None or not hasattr(_libc_handle, "mallinfo2"):
+        return None
+    _libc_handle.mallinfo2.restype = _MallInfo2
+    info = _libc_handle.mallinfo2()
+    return {
+        "heap_bytes": info.arena,
+        "mmap_bytes": info.hblkhd,
+        "in_use_bytes": info.uordblks,
+        "free_bytes": info.fordblks,
+        "releasable_bytes": info.keepcost,
+    }
+
+
+def malloc_trim() -> bool:
+    """Return free heap pages to the OS (glibc only)."""
+    if _libc_handle is None or not hasattr(_libc_handle, "malloc_trim"):
+        return False
+    return bool(_libc_handle.malloc_trim(0))
+
+
+def torch_stats() -> Optional[Dict[str, Any]]:
+    """Torch allocator statistics (CUDA when available), or None without torch."""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+    stats: Dict[str, Any] = {
+        "version": torch.__version__,
+        "num_threads": torch.get_num_threads(),
+        "cuda_available": torch.cuda.is_available(),
+    }
+    if stats["cuda_available"]:
+        stats["cuda"] = {
+            "allocated_bytes": torch.cuda.memory_allocated(),
+            "reserved_bytes": torch.cuda.memory_reserved(),
+            "max_allocated_bytes": torch.cuda.max_memory_allocated(),
+        }
+    return stats
+
+
+def model_memory() -> Dict[str, Any]:
+    """Registry statistics plus the tokenizer of each loaded model."""
+    stats = registry.stats()
+    tokenizers = {}
+    for name, (_, tokenizer) in registry.loaded_models().items():
+        tokenizers[name] = {
+            "class": type(tokenizer).__name__,
+            "vocab_size": getattr(tokenizer, "vocab_size", None),
+            "fast": getattr(tokenizer, "is_fast", None),
+        }
+    stats["tokenizers"] = tokenizers
+    return stats
+
+
+def langdetect_profiles() -> int:
+    """Number of language profiles langdetect keeps in memory (0 until first use)."""
+    factory_module = sys.modules.get("langdetect.detector_factory")
+    factory = getattr(factory_module, "_factory", None)
+    return len(factory.langlist) if factory is not None else 0
+
+
+class AllocationTracker:
+    """Diffs tracemalloc snapshots between successive calls."""
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+        if DEBUG_TRACEMALLOC:
+            self.start()
+
+    def start(self, frames: int = TRACEMALLOC_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info(f"tracemalloc started ({frames} frames)")
+
+    def stop(self):
+        with self._lock:
+            self._baseline = None
+        tracemalloc.stop()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    def diff(self, limit: int = 20, group_by: str = "lineno") -> Dict[str, Any]:
+        """
+        Compare allocations with the previous call and make this call the new baseline.
+
+        Args:
+            limit: Number of sites with the largest growth to return
+            group_by: "lineno", "filename" or "traceback"
+
+        Returns:
+            Dictionary with traced totals and the top growth sites (the first
+            call only records the baseline)
+        """
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        snapshot = self._snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            baseline, self._baseline = self._baseline, snapshot
+
+        result: Dict[str, Any] = {"tracing": True, "traced_bytes": current, "traced_peak_bytes": peak}
+        if baseline is None:
+            result["baseline"] = "recorded"
+            return result
+
+        growth: List[Dict[str, Any]] = []
+        for stat in snapshot.compare_to(baseline, group_by)[:limit]:
+            growth.append({
+                "site": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+            })
+        result["growth"] = growth
+        return result
+
+
+allocation_tracker = AllocationTracker()
+
+
+def memory_report(caches: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """
+    Collect process, allocator, torch, model and cache memory figures.
+
+    Args:
+        caches: Name -> stats function of each module-level cache to report
+    """
+    cache_stats: Dict[str, Any] = {"langdetect_profiles": langdetect_profiles()}
+    for name, stats in caches.items():
+        try:
+            cache_stats[name] = stats()
+        except Exception as e:
+            cache_stats[name] = {"error": str(e)}
+    return {
+        "pid": os.getpid(),
+        "process": process_memory(),
+        "malloc": malloc_stats(),
+        "torch": torch_stats(),
+        "models": model_memory(),
+        "caches": cache_stats,
+    }
@@ -0,0 +1,401 @@
+"""
+Persistent background job queue for bulk notes and quiz generation
+Jobs are batches of tasks stored in SQLite, so queued work survives a
+restart. Tasks are identified by an idempotency key: a task whose key has
+already completed is never re-run (and never re-billed), even when it is
+submitted again in a later job. Within a task, each LLM chunk call
+(map-reduce notes steps, quiz chunks) is checkpointed under the task key,
+so a task interrupted partway is resumed without re-billing the chunks it
+already finished.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .ml.answer_generator import generate_notes, generate_quiz_structured
+from .ml.generation_backends import CompletionCheckpoint, use_completion_checkpoint
+from .ml.priority import use_priority
+from .usage import tag_usage
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv(
+    "JOBS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "../../data/jobs.sqlite3"),
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Idle workers re-check the queue at least this often (seconds)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+# On shutdown, running tasks get this long to finish before being requeued
+JOB_SHUTDOWN_GRACE = float(os.getenv("JOB_SHUTDOWN_GRACE", "20"))
+
+TASK_PENDING = "pending"
+TASK_RUNNING = "running"
+TASK_COMPLETED = "completed"
+TASK_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at);
+CREATE TABLE IF NOT EXISTS task_checkpoints (
+    task_key TEXT NOT NULL,
+    call_key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (task_key, call_key)
+);
+CREATE TABLE IF NOT EXISTS job_tasks (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    task_key TEXT NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+
+def _run_notes(params: Dict[str, Any], progress: Callable[[str, int, int], None]) -> Dict[str, Any]:
+    answers = generate_notes(
+        text=params["text"],
+        mode=params.get("mode", "auto"),
+        progress=progress,
+        max_length=params.get("max_length", 500),
+        temperature=params.get("temperature", 0.7),
+    )
+    return {"answers": answers}
+
+
+def _run_quiz(params: Dict[str, Any], progress: Callable[[str, int, int], None]) -> Dict[str, Any]:
+    return generate_quiz_structured(
+        text=params["text"],
+        num_questions=params.get("num_questions", 5),
+        max_length=params.get("max_length", 1000),
+        temperature=params.get("temperature", 0.7),
+    )
+
+
+# Task kind -> handler(params, progress) returning a JSON-serializable result
+TASK_HANDLERS: Dict[str, Callable[[Dict[str, Any], Callable[[str, int, int], None]], Dict[str, Any]]] = {
+    "notes": _run_notes,
+    "quiz": _run_quiz,
+}
+
+
+def task_key_for(kind: str, params: Dict[str, Any]) -> str:
+    """Default idempotency key: a hash of the task kind and its parameters."""
+    canonical = json.dumps({"kind": kind, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TaskCheckpoint(CompletionCheckpoint):
+    """Completion results of one task, kept in SQLite until the task completes."""
+
+    def __init__(self, queue: "JobQueue", task_key: str):
+        super().__init__()
+        self.queue = queue
+        self.task_key = task_key
+
+    def get(self, key: str) -> Optional[str]:
+        rows = self.queue._execute(
+            "SELECT result FROM task_checkpoints WHERE task_key = ? AND call_key = ?", (self.task_key, key)
+        )
+        return rows[0]["result"] if rows else None
+
+    def put(self, key: str, text: str):
+        self.queue._execute(
+            "INSERT OR REPLACE INTO task_checkpoints (task_key, call_key, result) VALUES (?, ?, ?)",
+            (self.task_key, key, text),
+        )
+
+
+class JobQueue:
+    """SQLite-backed durable queue drained by asyncio worker coroutines."""
+
+    def __init__(self, db_path: str = JOBS_DB_PATH, workers: int = JOB_WORKERS):
+        self.db_path = db_path
+        self.num_workers = workers
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+        # Dedicated pool so bulk jobs never take the request threads
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="jobs")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, args: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(sql, args).fetchall()
+
+    # Submission and status
+
+    def submit(self, tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Queue a batch of tasks as a new job.
+
+        Args:
+            tasks: Items of the form {"kind": "notes"|"quiz", "params": {...}, "key": optional}
+
+        Returns:
+            The job status dictionary
+
+        Raises:
+            ValueError: If a task kind is unknown or a task has no text
+        """
+        if not tasks:
+            raise ValueError("A job needs at least one task")
+        for task in tasks:
+            if task.get("kind") not in TASK_HANDLERS:
+                raise ValueError(f"Unknown task kind: {task.get('kind')}")
+            if not str(task.get("params", {}).get("text", "")).strip():
+                raise ValueError("Every task needs a non-empty 'text' parameter")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("INSERT INTO jobs (id, created_at) VALUES (?, ?)", (job_id, now))
+                for position, task in enumerate(tasks):
+                    params = task.get("params", {})
+                    key = task.get("key") or task_key_for(task["kind"], params)
+                    # Existing keys keep their state (and their result, if completed)
+                    conn.execute(
+                        "INSERT OR IGNORE INTO tasks (task_key, kind, params, status, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, task["kind"], json.dumps(params), TASK_PENDING, now, now),
+                    )
+                    # A previously failed key is retried when submitted again
+                    conn.execute(
+                        "UPDATE tasks SET status = ?, attempts = 0, error = NULL, updated_at = ? "
+                        "WHERE task_key = ? AND status = ?",
+                        (TASK_PENDING, now, key, TASK_FAILED),
+                    )
+                    conn.execute(
+                        "INSERT INTO job_tasks (job_id, position, task_key) VALUES (?, ?, ?)",
+                        (job_id, position, key),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if self._wakeup is not None:
+            # Submissions come from request threads; asyncio.Event is not thread-safe
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return progress and results for a job, or None if it does not exist."""
+        if not self._execute("SELECT id FROM jobs WHERE id = ?", (job_id,)):
+            return None
+        rows = self._execute(
+            "SELECT t.* FROM job_tasks j JOIN tasks t ON t.task_key = j.task_key "
+            "WHERE j.job_id = ? ORDER BY j.position",
+            (job_id,),
+        )
+        tasks = [
+            {
+                "key": row["task_key"],
+                "kind": row["kind"],
+                "status": row["status"],
+                "attempts": row["attempts"],
+                "progress": json.loads(row["progress"]) if row["progress"] else None,
+                "result": json.loads(row["result"]) if row["result"] else None,
+                "error": row["error"],
+            }
+            for row in rows
+        ]
+        counts = {status: 0 for status in (TASK_PENDING, TASK_RUNNING, TASK_COMPLETED, TASK_FAILED)}
+        for task in tasks:
+            counts[task["status"]] += 1
+
+        if counts[TASK_COMPLETED] + counts[TASK_FAILED] == len(tasks):
+            status = TASK_FAILED if counts[TASK_FAILED] else TASK_COMPLETED
+        elif counts[TASK_RUNNING] or counts[TASK_COMPLETED] or counts[TASK_FAILED]:
+            status = TASK_RUNNING
+        else:
+            status = TASK_PENDING
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": len(tasks),
+            "completed": counts[TASK_COMPLETED],
+            "failed": counts[TASK_FAILED],
+            "tasks": tasks,
+        }
+
+    # Worker side
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Atomically move the oldest pending task to running."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM tasks WHERE status = ? ORDER BY created_at LIMIT 1",
+                    (TASK_PENDING,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE tasks SET status = ?, attempts = attempts + 1, updated_at = ? WHERE task_key = ?",
+                        (TASK_RUNNING, time.time(), row["task_key"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return row
+
+    def _finish(self, key: str, result: Optional[Dict[str, Any]], error: Optional[str], attempts: int):
+        if error is None:
+            self._execute(
+                "UPDATE tasks SET status = ?, result = ?, error = NULL, updated_at = ? WHERE task_key = ?",
+                (TASK_COMPLETED, json.dumps(result, ensure_ascii=False), time.time(), key),
+            )
+            self._execute("DELETE FROM task_checkpoints WHERE task_key = ?", (key,))
+        else:
+            status = TASK_FAILED if attempts >= JOB_MAX_ATTEMPTS else TASK_PENDING
+            self._execute(
+                "UPDATE tasks SET status = ?, error = ?, updated_at = ? WHERE task_key = ?",
+                (status, error, time.time(), key),
+            )
+
+    def _requeue(self, key: str):
+        """Put an interrupted task back without counting the attempt."""
+        self._execute(
+            "UPDATE tasks SET status = ?, attempts = attempts - 1, updated_at = ? WHERE task_key = ?",
+            (TASK_PENDING, time.time(), key),
+        )
+
+    def _run_task(self, row: sqlite3.Row) -> Dict[str, Any]:
+        key = row["task_key"]
+
+        def progress(stage: str, done: int, total: int):
+            self._execute(
+                "UPDATE tasks SET progress = ?, updated_at = ? WHERE task_key = ?",
+                (json.dumps({"stage": stage, "done": done, "total": total}), time.time(), key),
+            )
+
+        # Background jobs yield generation slots to live requests
+        with use_priority("bulk"), tag_usage(f"job:{row['kind']}"), use_completion_checkpoint(TaskCheckpoint(self, key)):
+            return TASK_HANDLERS[row["kind"]](json.loads(row["params"]), progress)
+
+    async def _worker(self, index: int):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            # SQLite waits for its write lock; keep that off the event loop
+            row = await asyncio.to_thread(self._claim_next)
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            key = row["task_key"]
+            attempts = row["attempts"] + 1
+            logger.info(f"[JOBS] worker {index} running {row['kind']} task {key[:12]} (attempt {attempts})")
+            try:
+                result = await loop.run_in_executor(self._executor, self._run_task, row)
+                await asyncio.to_thread(self._finish, key, result, None, attempts)
+            except asyncio.CancelledError:
+                # Shutting down: leave the task to be resumed on the next start
+                await asyncio.to_thread(self._requeue, key)
+                raise
+            except Exception as e:
+                logger.error(f"[JOBS] task {key[:12]} failed: {e}")
+                await asyncio.to_thread(self._finish, key, None, str(e), attempts)
+
+    def recover(self) -> int:
+        """Requeue tasks that were running when the process stopped."""
+        rows = self._execute("SELECT COUNT(*) AS n FROM tasks WHERE status = ?", (TASK_RUNNING,))
+        self._execute(
+            "UPDATE tasks SET status = ?, updated_at = ? WHERE status = ?",
+            (TASK_PENDING, time.time(), TASK_RUNNING),
+        )
+        return rows[0]["n"]
+
+    def close(self):
+        """Close the SQLite connection (it must not be shared across fork())."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def start(self, recover: bool = True):
+        """
+        Resume interrupted work and start the worker coroutines.
+
+        Args:
+            recover: Requeue tasks left running by a previous process. The
+                multi-worker launcher recovers once in the master instead,
+                so one worker never requeues another worker's running task.
+        """
+        if recover:
+            resumed = self.recover()
+            if resumed:
+                logger.info(f"[JOBS] resumed {resumed} interrupted task(s)")
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.num_workers)]
+        logger.info(f"[JOBS] started {self.num_workers} worker(s) on {self.db_path}")
+
+    async def stop(self):
+        """
+        Stop the workers. Running tasks get JOB_SHUTDOWN_GRACE seconds to
+        finish (so tokens already spent are not lost); anything still running
+        after that is requeued for the next start.
+        """
+        if not self._workers:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, still_running = await asyncio.wait(self._workers, timeout=JOB_SHUTDOWN_GRACE)
+        for worker in still_running:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._wakeup = None
+
+
+job_queue = JobQueue()
@@ -1,49 +1,341 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSeq2SeqLM,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
+)
 import torch
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import contextvars
+import logging
 import os
-from .groq_service import is_groq_available, generate_answer_groq, generate_notes_groq, generate_quiz_groq
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from .groq_service import (
+    generate_notes_groq,
+    generate_quiz_questions_groq,
+    generate_chunk_notes_groq,
+    merge_notes_groq,
+    notes_prompt,
+    executor as groq_executor,
+)
+from .generation_backends import GenerationBackend, backend_chain, register_backend
+from .quiz_parser import parse_quiz_text, format_quiz_text
+from .text_chunker import estimate_tokens, split_into_chunks
+from .model_registry import registry
+from .generation_policy import resolve_policy, record_completion, apply_stop_sequences
+from .priority import local_scheduler, submit_with_context
+from .deadlines import DeadlineExceeded, GenerationAborted, check_deadline, current_deadline
+from .retrieval import retriever, extract_definition, grounding_context
+from .model_artifacts import load_artifact, register_artifact
+from .extractive_notes import extract_notes, compress_text
+from .bilingual import (
+    supports_bilingual,
+    bilingual_prompt,
+    bilingual_max_tokens,
+    parse_bilingual,
+    is_valid_local_text,
+)
+from .translator import translate_text
+from ..usage import usage_accountant
+
+logger = logging.getLogger(__name__)
 
 # Model configuration
 MODEL_NAME = "google/flan-t5-small"
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "../../models")
+REGISTRY_NAME = "answer"
 
-# Initialize model and tokenizer
-tokenizer = None
-model = None
+# Map-reduce notes configuration
+NOTES_SINGLE_PASS_TOKENS = int(os.getenv("NOTES_SINGLE_PASS_TOKENS", "3000"))
+NOTES_CHUNK_TOKENS = int(os.getenv("NOTES_CHUNK_TOKENS", "1500"))
+NOTES_REDUCE_INPUT_TOKENS = int(os.getenv("NOTES_REDUCE_INPUT_TOKENS", "4000"))
+NOTES_MAP_CONCURRENCY = int(os.getenv("NOTES_MAP_CONCURRENCY", "4"))
+# flan-t5 truncates inputs at 512 tokens; leave room for the instruction
+LOCAL_NOTES_CHUNK_TOKENS = 380
+LOCAL_BATCH_SIZE = int(os.getenv("LOCAL_BATCH_SIZE", "4"))
+# Notes without a remote LLM: "model" (the local FLAN-T5 model) or
+# "extractive" (TextRank over the source text, milliseconds). Extractive
+# notes are also the fallback when the model fails.
+NOTES_LOCAL_ENGINE = os.getenv("NOTES_LOCAL_ENGINE", "model")
+# Longer documents are cut down to this many tokens extractively before
+# LLM map-reduce notes (0 disables)
+NOTES_PRECOMPRESS_TOKENS = int(os.getenv("NOTES_PRECOMPRESS_TOKENS", "8000"))
+EXTRACTIVE_NOTES_SCORE = 0.6
 
-def load_model():
-    """Load the answer generation model."""
-    global tokenizer, model
+# progress(stage, done, total) callback used by the streaming and job APIs
+ProgressCallback = Callable[[str, int, int], None]
+
+def _load_answer_model():
+    """Load the answer generation model and tokenizer."""
+    tokenizer = AutoTokenizer.from_pretrained(
+        MODEL_NAME,
+        cache_dir=CACHE_DIR
+    )
     
-    if tokenizer is None:
-        tokenizer = AutoTokenizer.from_pretrained(
+    # Try to load with 8-bit quantization if available
+    try:
+        from transformers import BitsAndBytesConfig
+        quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            MODEL_NAME,
+            cache_dir=CACHE_DIR,
+            device_map="auto",
+            quantization_config=quantization_config
+        )
+    except ImportError:
+        # Fallback to FP16 if 8-bit not available
+        model = AutoModelForSeq2SeqLM.from_pretrained(
             MODEL_NAME,
-            cache_dir=CACHE_DIR
+            cache_dir=CACHE_DIR,
+            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
         )
     
-    if model is None:
-        # Try to load with 8-bit quantization if available
-        try:
-            from transformers import BitsAndBytesConfig
-            quantization_config = BitsAndBytesConfig(load_in_8bit=True)
-            model = AutoModelForSeq2SeqLM.from_pretrained(
-                MODEL_NAME,
-                cache_dir=CACHE_DIR,
-                device_map="auto",
-                quantization_config=quantization_config
-            )
-        except ImportError:
-            # Fallback to FP16 if 8-bit not available
-            model = AutoModelForSeq2SeqLM.from_pretrained(
-                MODEL_NAME,
-                cache_dir=CACHE_DIR,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+    model.eval()  # Set to evaluation mode
+    return model, tokenizer
+
+register_artifact(REGISTRY_NAME, MODEL_NAME, AutoModelForSeq2SeqLM, CACHE_DIR)
+# Prepared artifacts (python -m app.prepare_models) load offline; otherwise from the hub
+registry.register(REGISTRY_NAME, lambda: load_artifact(REGISTRY_NAME) or _load_answer_model())
+
+def load_model():
+    """Load the answer generation model (once, via the model registry)."""
+    return registry.get(REGISTRY_NAME)
+
+def _retrieve(question: str, intent: Optional[str], subject: Optional[str]):
+    """
+    Look the question up in the curriculum index (only for classified questions).
+
+    Returns:
+        (extractive answer or None, grounding excerpts for the prompt)
+    """
+    if intent is None or not retriever.available:
+        return None, ""
+    started = time.perf_counter()
+    passages = retriever.search(question, subject)
+    if intent == "definition":
+        extracted = extract_definition(question, passages)
+        if extracted is not None:
+            usage_accountant.record({"backend": "retrieval", "intent": intent, "latency_s": time.perf_counter() - started})
+            return extracted, ""
+    return None, grounding_context(passages)
+
+def _prepare_prompt(
+    prompt: str,
+    max_length: int,
+    temperature: float,
+    intent: Optional[str],
+    subject: Optional[str],
+    context: Optional[str],
+    grounding: str = "",
+):
+    """Apply the intent policy, textbook excerpts and conversation context; returns (prompt, max_length, temperature, stop)."""
+    stop: List[str] = []
+    if intent is not None:
+        policy = resolve_policy(intent, prompt, max_length, subject)
+        prompt = policy["prompt"]
+        max_length = policy["max_tokens"]
+        temperature = policy["temperature"]
+        stop = policy["stop"]
+    
+    if grounding:
+        prompt = f"Textbook excerpts:\n{grounding}\n\nUse the excerpts where they are relevant.\n\n{prompt}"
+    
+    if context:
+        prompt = f"Conversation so far:\n{context}\n\nCurrent question:\n{prompt}"
+    return prompt, max_length, temperature, stop
+
+class _CancelCriteria(StoppingCriteria):
+    """Stops local generation as soon as any of the events (or deadlines) is set."""
+
+    def __init__(self, *events: threading.Event):
+        self.events = [event for event in events if event is not None]
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return any(event.is_set() for event in self.events)
+
+class LocalBackend(GenerationBackend):
+    """The local seq2seq model (FLAN-T5) run with transformers."""
+
+    name = "local"
+    streaming = True
+    batching = True
+    max_input_tokens = 512
+    score = 1.0
+
+    def generate_sequences(
+        self,
+        prompt: str,
+        max_tokens: int = 200,
+        temperature: float = 0.7,
+        stop: Optional[List[str]] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        top_p: float = 0.9,
+        top_k: int = 50,
+        num_return_sequences: int = 1,
+    ) -> List[str]:
+        """Sample `num_return_sequences` completions; usage describes the first."""
+        usage = usage if usage is not None else {}
+        usage["backend"] = self.name
+        usage["model"] = MODEL_NAME
+        model, tokenizer = load_model()
+        
+        # Tokenize input
+        inputs = tokenizer(
+            prompt,
+            return_tensors="pt",
+            truncation=True,
+            max_length=512,
+            padding=True
+        )
+        
+        # Move to device (GPU if available)
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        
+        # Generate output; the request deadline stops it between tokens
+        with local_scheduler.slot(), torch.no_grad():
+            outputs = model.generate(
+                **inputs,
+                max_length=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                top_k=top_k,
+                num_return_sequences=num_return_sequences,
+                do_sample=True,
+                no_repeat_ngram_size=3,
+                early_stopping=True,
+                stopping_criteria=StoppingCriteriaList([_CancelCriteria(current_deadline())]),
             )
+        check_deadline()
         
-        model.eval()  # Set to evaluation mode
-    
-    return model, tokenizer
+        completion_tokens = int((outputs[0] != tokenizer.pad_token_id).sum())
+        usage["prompt_tokens"] = int(inputs["attention_mask"].sum())
+        usage["completion_tokens"] = completion_tokens
+        usage["finish_reason"] = "length" if completion_tokens >= max_tokens else "stop"
+        return [apply_stop_sequences(tokenizer.decode(output, skip_special_tokens=True), stop or []) for output in outputs]
+
+    def _generate(self, prompt, max_tokens, temperature, stop, usage, json_mode):
+        return self.generate_sequences(prompt, max_tokens, temperature, stop, usage)[0]
+
+    def _stream(self, prompt, max_tokens, temperature, stop, usage, cancel):
+        """Generate in a background thread and relay decoded text."""
+        usage["model"] = MODEL_NAME
+        stop = stop or []
+        model, tokenizer = load_model()
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        deadline = current_deadline()
+        remaining = deadline.remaining() if deadline is not None else None
+        # Waits for the next piece of text are bounded by the deadline too
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=remaining)
+        # Set when this stream stops early (stop sequence or consumer gone); unlike
+        # `cancel` it does not mark the whole request as cancelled
+        halt = threading.Event()
+        failure: List[BaseException] = []
+        
+        def run():
+            try:
+                with local_scheduler.slot(timeout=remaining), torch.no_grad():
+                    model.generate(
+                        **inputs,
+                        max_length=max_tokens,
+                        temperature=temperature,
+                        do_sample=True,
+                        no_repeat_ngram_size=3,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([_CancelCriteria(cancel, halt, deadline)]),
+                    )
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                # generate() only ends the stream when it completes; without
+                # this the consumer would wait forever on a failed or
+                # never-started generation
+                streamer.end()
+        
+        # Runs in the request context (priority and deadline), so a queued
+        # stream leaves the slot queue when the request is cancelled
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True)
+        worker.start()
+        emitted_text = ""
+        try:
+            try:
+                for delta in streamer:
+                    if cancel.is_set():
+                        break
+                    emitted_text += delta
+                    # Honour stop sequences the local model cannot apply natively
+                    cut = apply_stop_sequences(emitted_text, stop)
+                    if len(cut) < len(emitted_text):
+                        remainder = cut[len(emitted_text) - len(delta):]
+                        if remainder:
+                            yield remainder
+                        break
+                    yield delta
+            except queue.Empty:
+                raise DeadlineExceeded("Request deadline exceeded")
+        finally:
+            halt.set()
+            worker.join()
+        if failure:
+            raise failure[0]
+        usage["prompt_tokens"] = int(inputs["attention_mask"].sum())
+        usage["completion_tokens"] = len(tokenizer(emitted_text, add_special_tokens=False)["input_ids"])
+
+local_backend = LocalBackend()
+register_backend(local_backend)
+
+def _generate_bilingual(
+    backend: GenerationBackend,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    language: str,
+    usage: Dict[str, Any],
+) -> Tuple[str, Optional[str]]:
+    """
+    One JSON-mode completion with the English text and its `language` version.
+
+    Returns:
+        (english, local); local is None when it is missing or not written
+        in the language's script. An unusable JSON response is replaced
+        by a plain English completion.
+    """
+    raw = backend.generate(
+        bilingual_prompt(prompt, language), bilingual_max_tokens(max_tokens), temperature, usage=usage, json_mode=True
+    )
+    try:
+        english, local = parse_bilingual(raw)
+    except ValueError as e:
+        logger.warning(f"{backend.name} bilingual output unusable ({e}); generating English only")
+        return backend.generate(prompt, max_tokens, temperature, usage={"intent": usage.get("intent")}), None
+    if not is_valid_local_text(local, language):
+        logger.warning(f"{backend.name} {language} text failed script validation")
+        local = None
+    return english, local
+
+def _attach_local_text(answer: Dict[str, Any], language: str, local: Optional[str] = None):
+    """
+    Add the `language` version of answer["text"] as local_text: the
+    generated one when valid, else from the translation model (when that
+    fails too, local_text is left out and clients show English).
+    """
+    if local is not None:
+        answer["local_text"] = local
+        answer["local_source"] = "generated"
+        return
+    try:
+        answer["local_text"] = translate_text(answer["text"], language)
+        answer["local_source"] = "translated"
+    except GenerationAborted:
+        raise
+    except Exception as e:
+        logger.warning(f"Translation fallback failed: {e}")
 
 def generate_answer(
     prompt: str,
@@ -51,19 +343,39 @@ def generate_answer(
     temperature: float = 0.7,
     top_p: float = 0.9,
     top_k: int = 50,
-    num_return_sequences: int = 1
+    num_return_sequences: int = 1,
+    intent: Optional[str] = None,
+    subject: Optional[str] = None,
+    context: Optional[str] = None,
+    backends: Optional[List[GenerationBackend]] = None,
+    language: Optional[str] = None,
 ) -> List[Dict[str, str]]:
     """
     Generate an answer based on the given prompt.
-    Uses Groq API if available, falls back to local model.
+    Tries each backend of GENERATION_BACKENDS in order (Groq, an
+    OpenAI-compatible server, the local model). Classified questions are
+    grounded with passages from the retrieval index; definition questions
+    with a confident extractive match are answered from the passage alone.
     
     Args:
         prompt: The input prompt/question
         max_length: Maximum length of the generated text
         temperature: Controls randomness (lower = more deterministic)
-        top_p: Nucleus sampling parameter
-        top_k: Top-k sampling parameter
-        num_return_sequences: Number of sequences to generate
+        top_p: Nucleus sampling parameter (local model)
+        top_k: Top-k sampling parameter (local model)
+        num_return_sequences: Number of sequences to generate (local model)
+        intent: Classified intent of the question. When given, the
+            generation policy picks the prompt template, token budget
+            (capped at max_length), temperature and stop sequences
+        subject: Optional subject added to the policy prompt
+        context: Optional conversation context (e.g. from a chat session)
+            placed before the question
+        backends: Backends to try (default: backend_chain())
+        language: Optional Indian language code ("hi", "te", "ta", "kn").
+            JSON-mode backends then return the answer in English and this
+            language in one completion; the first answer gets it as
+            local_text (translated with the translation model when the
+            generated text is missing or in the wrong script)
         
     Returns:
         List of dictionaries containing generated answers and their scores
@@ -71,113 +383,456 @@ def generate_answer(
     if not prompt.strip():
         return [{"text": "", "score": 0.0}]
     
-    # Try Groq API first
-    if is_groq_available():
+    bilingual = supports_bilingual(language)
+    extracted, grounding = _retrieve(prompt, intent, subject)
+    if extracted is not None:
+        logger.debug("Answered from retrieval index", extra={"title": extracted["title"]})
+        answer = {"text": extracted["text"], "score": extracted["score"], "source": "retrieval"}
+        if bilingual:
+            _attach_local_text(answer, language)
+        return [answer]
+    prompt, max_length, temperature, stop = _prepare_prompt(
+        prompt, max_length, temperature, intent, subject, context, grounding
+    )
+    
+    for backend in backend_chain() if backends is None else backends:
+        local: Optional[str] = None
         try:
-            print(f"[ANSWER_GEN] Attempting Groq API...")
-            result = generate_answer_groq(prompt, max_length, temperature)
-            print(f"[ANSWER_GEN] ✓ Successfully got answer from Groq")
-            return result
+            logger.debug("Generating answer", extra={"backend": backend.name})
+            usage: Dict[str, Any] = {"intent": intent}
+            if bilingual and backend.json_mode:
+                english, local = _generate_bilingual(backend, prompt, max_length, temperature, language, usage)
+                texts = [english]
+            elif isinstance(backend, LocalBackend):
+                texts = backend.generate_sequences(
+                    prompt, max_length, temperature, stop, usage, top_p, top_k, num_return_sequences
+                )
+            else:
+                texts = [backend.generate(prompt, max_length, temperature, stop=stop, usage=usage)]
+        except GenerationAborted:
+            # Out of time or cancelled: falling back to another backend would not help
+            raise
         except Exception as e:
-            print(f"[ANSWER_GEN] ✗ Groq failed: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
-        print(f"[ANSWER_GEN] Groq not available")
-    
-    # Fallback to local model
-    print(f"[ANSWER_GEN] Falling back to local model...")
-    try:
-        model, tokenizer = load_model()
+            logger.warning(f"{backend.name} failed to generate an answer: {e}", exc_info=True)
+            continue
         
-        # Tokenize input
+        # Bilingual completions would skew the English length statistics
+        if intent is not None and "completion_tokens" in usage and not (bilingual and backend.json_mode):
+            record_completion(intent, usage["completion_tokens"], max_length, usage.get("finish_reason") == "length")
+        logger.debug("Generated answer", extra={"backend": backend.name})
+        # First result has the highest score
+        answers = [{"text": text, "score": max(0.0, backend.score - i * 0.1)} for i, text in enumerate(texts)]
+        if bilingual:
+            _attach_local_text(answers[0], language, local)
+        return answers
+    
+    logger.error("No generation backend succeeded")
+    return [{"text": "Error generating answer", "score": 0.0}]
+
+def stream_answer(
+    prompt: str,
+    max_length: int = 200,
+    temperature: float = 0.7,
+    intent: Optional[str] = None,
+    subject: Optional[str] = None,
+    context: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[str]:
+    """
+    Stream an answer as text deltas from the first streaming backend that
+    works. A backend that fails after emitting text is not retried.
+    
+    Args:
+        prompt: The input prompt/question
+        max_length: Maximum length of the generated text
+        temperature: Controls randomness
+        intent: Classified intent (see generate_answer)
+        subject: Optional subject added to the policy prompt
+        context: Optional conversation context
+        cancel: Optional event; setting it stops generation
+    """
+    if not prompt.strip():
+        return
+    
+    extracted, grounding = _retrieve(prompt, intent, subject)
+    if extracted is not None:
+        yield extracted["text"]
+        return
+    prompt, max_length, temperature, stop = _prepare_prompt(
+        prompt, max_length, temperature, intent, subject, context, grounding
+    )
+    cancel = cancel or threading.Event()
+    
+    last_error: Optional[Exception] = None
+    for backend in backend_chain():
+        if not backend.streaming:
+            continue
+        usage: Dict[str, Any] = {"intent": intent}
+        emitted = False
+        try:
+            for delta in backend.stream(prompt, max_length, temperature, stop=stop, usage=usage, cancel=cancel):
+                emitted = True
+                yield delta
+        except GenerationAborted:
+            raise
+        except Exception as e:
+            logger.warning(f"{backend.name} streaming failed: {e}")
+            if emitted:
+                raise
+            last_error = e
+            continue
+        if intent is not None and "completion_tokens" in usage:
+            record_completion(intent, usage["completion_tokens"], max_length, usage.get("finish_reason") == "length")
+        return
+    if last_error is not None:
+        raise last_error
+    raise RuntimeError("No streaming generation backend is available")
+
+def generate_answers_batch(
+    prompts: List[str],
+    max_length: int = 200,
+    temperature: float = 0.7,
+    batch_size: int = LOCAL_BATCH_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+) -> List[str]:
+    """
+    Generate one completion per prompt with the local model, in padded batches.
+
+    Args:
+        prompts: Input prompts
+        max_length: Maximum length of each generated text
+        temperature: Controls randomness
+        batch_size: Prompts per forward pass
+        progress: Called with the number of prompts completed so far
+
+    Returns:
+        Generated texts, in prompt order
+    """
+    model, tokenizer = load_model()
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    outputs_text: List[str] = []
+    for start in range(0, len(prompts), batch_size):
+        check_deadline()
+        batch = prompts[start:start + batch_size]
         inputs = tokenizer(
-            prompt,
+            batch,
             return_tensors="pt",
             truncation=True,
             max_length=512,
             padding=True
         )
-        
-        # Move to device (GPU if available)
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Generate output
-        with torch.no_grad():
+        # One slot per batch, so interactive requests can run between batches
+        started = time.perf_counter()
+        with local_scheduler.slot(), torch.no_grad():
             outputs = model.generate(
                 **inputs,
                 max_length=max_length,
                 temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                num_return_sequences=num_return_sequences,
-                do_sample=True,
+                do_sample=temperature > 0,
                 no_repeat_ngram_size=3,
-                early_stopping=True
             )
-        
-        # Decode and process outputs
-        results = []
-        for i, output in enumerate(outputs):
-            text = tokenizer.decode(output, skip_special_tokens=True)
-            # Simple heuristic for score (can be replaced with model scores if available)
-            score = 1.0 - (i * 0.1)  # First result has highest score
-            results.append({
-                "text": text,
-                "score": min(max(score, 0), 1.0)  # Ensure score is between 0 and 1
-            })
-        
-        print(f"[ANSWER_GEN] ✓ Got answer from local model")
-        return results
+        usage_accountant.record({
+            "backend": local_backend.name,
+            "model": MODEL_NAME,
+            "prompt_tokens": int(inputs["attention_mask"].sum()),
+            "completion_tokens": int((outputs != tokenizer.pad_token_id).sum()),
+            "latency_s": time.perf_counter() - started,
+        })
+        outputs_text.extend(tokenizer.batch_decode(outputs, skip_special_tokens=True))
+        if progress:
+            progress(len(outputs_text))
+    return outputs_text
+
+def _map_bounded(fn: Callable, items: List[Any], limit: int, on_done: Optional[Callable[[int], None]] = None) -> List[Any]:
+    """Run `fn` over `items` on the Groq pool with at most `limit` calls in flight."""
+    results: List[Any] = [None] * len(items)
+    in_flight = {}
+    next_index = 0
+    completed = 0
+    while next_index < len(items) or in_flight:
+        while next_index < len(items) and len(in_flight) < max(1, limit):
+            in_flight[submit_with_context(groq_executor, fn, next_index, items[next_index])] = next_index
+            next_index += 1
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[in_flight.pop(future)] = future.result()
+            completed += 1
+            if on_done:
+                on_done(completed)
+    return results
+
+def _extractive_notes(text: str) -> Optional[List[Dict[str, Any]]]:
+    """Notes extracted from `text` itself, or None if it is too short (e.g. just a topic)."""
+    started = time.perf_counter()
+    notes = extract_notes(text)
+    if notes is None:
+        return None
+    usage_accountant.record({"backend": "extractive", "intent": "notes", "latency_s": time.perf_counter() - started})
+    logger.debug("Extracted notes", extra={"ms": round((time.perf_counter() - started) * 1000)})
+    return [{"text": notes, "score": EXTRACTIVE_NOTES_SCORE, "source": "extractive"}]
+
+def _merge_notes_locally(partial_notes: List[str]) -> str:
+    """Reduce step without an LLM: concatenate partial notes, dropping repeated lines."""
+    seen = set()
+    lines = []
+    for notes in partial_notes:
+        for line in notes.splitlines():
+            key = line.strip().lstrip("-*• ").lower()
+            if key and key in seen:
+                continue
+            seen.add(key)
+            lines.append(line)
+        lines.append("")
+    return "\n".join(lines).strip()
+
+def generate_notes_map_reduce(
+    text: str,
+    max_length: int = 500,
+    temperature: float = 0.3,
+    progress: Optional[ProgressCallback] = None,
+) -> List[Dict[str, str]]:
+    """
+    Generate notes for a long document with a map-reduce pass.
+
+    The text is split on section/paragraph boundaries within a token budget,
+    each chunk is summarized concurrently (bounded parallelism against remote
+    backends, batched against the local model), and the partial notes are merged.
+    Partial notes that are still too long to merge in one call are reduced
+    hierarchically. Documents over NOTES_PRECOMPRESS_TOKENS are first cut
+    down to their highest-ranked sentences; without a remote backend the
+    notes are extracted directly (NOTES_LOCAL_ENGINE).
+
+    Args:
+        text: Source document
+        max_length: Token budget for the final notes
+        temperature: Controls randomness
+        progress: Optional progress(stage, done, total) callback; stages are
+            "map" and "reduce"
+
+    Returns:
+        List with a single dictionary containing the notes and a score
+    """
+    report = progress or (lambda stage, done, total: None)
+    source = text
+    if NOTES_PRECOMPRESS_TOKENS > 0:
+        # Fewer map calls; only the highest-ranked sentences reach the LLM
+        text = compress_text(text, NOTES_PRECOMPRESS_TOKENS)
+
+    for backend in backend_chain():
+        if backend.batching:
+            if NOTES_LOCAL_ENGINE == "extractive":
+                extracted = _extractive_notes(source)
+                if extracted is not None:
+                    return extracted
+            result = _map_reduce_notes_locally(backend, source, max_length, temperature, report)
+            if result[0]["score"] > 0:
+                return result
+            continue
+        try:
+            chunks = split_into_chunks(text, min(NOTES_CHUNK_TOKENS, backend.max_input_tokens // 2))
+            logger.debug("Map-reduce notes", extra={"backend": backend.name, "chunks": len(chunks)})
+            report("map", 0, len(chunks))
+            partials = _map_bounded(
+                lambda i, chunk: generate_chunk_notes_groq(
+                    chunk, i + 1, len(chunks), temperature=temperature, complete=backend.complete
+                ),
+                chunks,
+                NOTES_MAP_CONCURRENCY,
+                lambda done: report("map", done, len(chunks)),
+            )
+
+            # Hierarchical reduce until the partial notes fit one merge call.
+            # Intermediate merges stay under a third of the budget so that
+            # several of them fit one group and every round shrinks the notes.
+            reduce_budget = min(NOTES_REDUCE_INPUT_TOKENS, backend.max_input_tokens // 2)
+            merge_tokens = max(1, min(max_length, reduce_budget // 3))
+            size = estimate_tokens("\n\n".join(partials))
+            while len(partials) > 1 and size > reduce_budget:
+                groups = split_into_chunks("\n\n".join(partials), reduce_budget)
+                if len(groups) >= len(partials):
+                    break
+                report("reduce", 0, len(groups))
+                partials = _map_bounded(
+                    lambda i, group: merge_notes_groq([group], merge_tokens, temperature, complete=backend.complete),
+                    groups,
+                    NOTES_MAP_CONCURRENCY,
+                    lambda done: report("reduce", done, len(groups)),
+                )
+                merged_size = estimate_tokens("\n\n".join(partials))
+                if merged_size >= size:
+                    # The backend is not condensing; merge what there is
+                    break
+                size = merged_size
+
+            report("reduce", 0, 1)
+            if len(partials) > 1:
+                notes = merge_notes_groq(partials, max_length, temperature, complete=backend.complete)
+            else:
+                notes = partials[0]
+            report("reduce", 1, 1)
+            logger.debug("Map-reduce notes complete", extra={"backend": backend.name})
+            return [{"text": notes, "score": backend.score}]
+        except GenerationAborted:
+            raise
+        except Exception as e:
+            logger.warning(f"{backend.name} error for map-reduce notes: {e}", exc_info=True)
+
+    return _extractive_notes(source) or [{"text": "Error generating notes", "score": 0.0}]
+
+def _map_reduce_notes_locally(
+    backend: GenerationBackend,
+    text: str,
+    max_length: int,
+    temperature: float,
+    report: ProgressCallback,
+) -> List[Dict[str, str]]:
+    """Local model: batch the map step, merge without an LLM."""
+    logger.debug("Map-reduce notes", extra={"backend": backend.name})
+    chunks = split_into_chunks(text, LOCAL_NOTES_CHUNK_TOKENS)
+    report("map", 0, len(chunks))
+    prompts = [f"Summarize the following text into concise study notes:\n\n{chunk}" for chunk in chunks]
+    try:
+        partials = generate_answers_batch(
+            prompts,
+            max_length=min(max_length, 200),
+            temperature=temperature,
+            progress=lambda done: report("map", done, len(chunks)),
+        )
+    except GenerationAborted:
+        raise
     except Exception as e:
-        print(f"[ANSWER_GEN] ✗ Local model also failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return [{"text": "Error generating answer", "score": 0.0}]
-
-def generate_notes(text: str, **kwargs) -> List[Dict[str, str]]:
-    """Generate study notes from the given text."""
-    # Try Groq API first
-    if is_groq_available():
+        logger.warning(f"Local map-reduce notes failed: {e}", exc_info=True)
+        return [{"text": "Error generating notes", "score": 0.0}]
+    report("reduce", 0, 1)
+    notes = _merge_notes_locally(partials)
+    report("reduce", 1, 1)
+    return [{"text": notes, "score": 0.8}]
+
+def generate_notes(
+    text: str,
+    mode: str = "auto",
+    progress: Optional[ProgressCallback] = None,
+    language: Optional[str] = None,
+    **kwargs,
+) -> List[Dict[str, str]]:
+    """
+    Generate study notes from the given text.
+
+    Args:
+        text: Topic or source document
+        mode: "single" (one prompt), "map_reduce", or "auto" (map-reduce when
+            the text is longer than the single-pass budget of the first
+            available backend)
+        progress: Optional progress(stage, done, total) callback
+        language: Optional Indian language code; the notes then carry a
+            local_text version (generated in the same completion by
+            JSON-mode backends in single mode, else translated)
+
+    Documents (not bare topics) get extractive notes instead of the local
+    model's, and when every backend fails.
+    """
+    bilingual = supports_bilingual(language)
+    chain = backend_chain()
+    if mode == "auto":
+        primary = chain[0] if chain else local_backend
+        if primary.batching:
+            single_pass_budget = LOCAL_NOTES_CHUNK_TOKENS
+        else:
+            single_pass_budget = min(NOTES_SINGLE_PASS_TOKENS, primary.max_input_tokens // 2)
+        mode = "map_reduce" if estimate_tokens(text) > single_pass_budget else "single"
+    if mode == "map_reduce":
+        result = generate_notes_map_reduce(
+            text,
+            max_length=kwargs.get('max_length', 500),
+            temperature=kwargs.get('temperature', 0.3),
+            progress=progress,
+        )
+        if bilingual and result[0]["score"] > 0:
+            _attach_local_text(result[0], language)
+        return result
+
+    for backend in chain:
+        if backend.batching:
+            if NOTES_LOCAL_ENGINE == "extractive":
+                extracted = _extractive_notes(text)
+                if extracted is not None:
+                    if bilingual:
+                        _attach_local_text(extracted[0], language)
+                    return extracted
+            # Small local model: a plain summarization prompt works better
+            logger.info("Falling back to the local model for notes")
+            prompt = f"Summarize the following text into concise study notes:\n\n{text}"
+            result = generate_answer(prompt, backends=[backend], language=language, **kwargs)
+            if result and result[0]["score"] > 0:
+                return result
+            logger.warning(f"{backend.name} failed to generate notes")
+            continue
         try:
-            print(f"[GROQ] Attempting to generate notes using Groq API...")
+            logger.debug("Generating notes", extra={"backend": backend.name})
             max_length = kwargs.get('max_length', 500)
             temperature = kwargs.get('temperature', 0.7)
-            result = generate_notes_groq(text, max_length, temperature)
-            print(f"[GROQ] ✓ Successfully used Groq API for notes")
+            local = None
+            if bilingual and backend.json_mode:
+                english, local = _generate_bilingual(
+                    backend, notes_prompt(text), min(max_length, 1024), temperature, language, {}
+                )
+                result = [{"text": english, "score": backend.score}]
+            else:
+                result = generate_notes_groq(text, max_length, temperature, complete=backend.complete)
+                result[0]["score"] = backend.score
+            if bilingual:
+                _attach_local_text(result[0], language, local)
+            logger.debug("Generated notes", extra={"backend": backend.name})
             return result
+        except GenerationAborted:
+            raise
         except Exception as e:
-            print(f"[GROQ] ✗ Groq API error for notes: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
-        print(f"[GROQ] Groq API not available for notes")
+            logger.warning(f"{backend.name} error for notes: {e}", exc_info=True)
     
-    # Fallback to local model
-    print(f"[LOCAL] Falling back to local ML model for notes...")
-    prompt = f"Summarize the following text into concise study notes:\n\n{text}"
-    return generate_answer(prompt, **kwargs)
+    extracted = _extractive_notes(text)
+    if extracted is not None:
+        if bilingual:
+            _attach_local_text(extracted[0], language)
+        return extracted
+    return [{"text": "Error generating notes", "score": 0.0}]
 
-def generate_quiz(text: str, num_questions: int = 5, **kwargs) -> List[Dict[str, str]]:
-    """Generate a quiz with questions and answers from the given text."""
-    # Try Groq API first
-    if is_groq_available():
+def generate_quiz_structured(text: str, num_questions: int = 5, **kwargs) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Generate a quiz and parse it server-side.
+
+    Returns:
+        Dictionary with "answers" (the quiz rendered as Q:/A) text, for
+        existing clients) and "questions" (validated
+        {question, options, correct_index, explanation} dictionaries)
+    """
+    for backend in backend_chain():
+        if backend.batching:
+            # Small local model: legacy text format, parsed afterwards
+            logger.info("Falling back to the local model for quiz")
+            prompt = f"Generate {num_questions} multiple-choice questions with answers based on the following text. Format each question with 'Q:' and options as 'A)', 'B)', etc. with the correct answer marked with [CORRECT]:\n\n{text}"
+            answers = generate_answer(prompt, backends=[backend], **kwargs)
+            questions = parse_quiz_text(answers[0]["text"]) if answers else []
+            return {"answers": answers, "questions": questions[:num_questions]}
         try:
-            print(f"[GROQ] Attempting to generate quiz using Groq API...")
-            max_length = kwargs.get('max_length', 1000)
+            logger.debug("Generating quiz", extra={"backend": backend.name})
             temperature = kwargs.get('temperature', 0.7)
-            result = generate_quiz_groq(text, num_questions, max_length, temperature)
-            print(f"[GROQ] ✓ Successfully used Groq API for quiz")
-            return result
+            questions = generate_quiz_questions_groq(text, num_questions, temperature, complete=backend.complete)
+            if questions:
+                logger.debug("Generated quiz", extra={"backend": backend.name, "questions": len(questions)})
+                return {
+                    "answers": [{"text": format_quiz_text(questions), "score": backend.score}],
+                    "questions": questions,
+                }
+            logger.warning(f"{backend.name} returned no valid quiz questions")
+        except GenerationAborted:
+            raise
         except Exception as e:
-            print(f"[GROQ] ✗ Groq API error for quiz: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
-        print(f"[GROQ] Groq API not available for quiz")
+            logger.warning(f"{backend.name} error for quiz: {e}", exc_info=True)
     
-    # Fallback to local model
-    print(f"[LOCAL] Falling back to local ML model for quiz...")
-    prompt = f"Generate {num_questions} multiple-choice questions with answers based on the following text. Format each question with 'Q:' and options as 'A)', 'B)', etc. with the correct answer marked with [CORRECT]:\n\n{text}"
-    return generate_answer(prompt, **kwargs)
+    return {"answers": [{"text": "Error generating quiz", "score": 0.0}], "questions": []}
+
+def generate_quiz(text: str, num_questions: int = 5, **kwargs) -> List[Dict[str, str]]:
+    """Generate a quiz with questions and answers from the given text."""
+    return generate_quiz_structured(text, num_questions, **kwargs)["answers"]
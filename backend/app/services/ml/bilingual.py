@@ -0,0 +1,91 @@
+"""
+Single-call bilingual generation
+Asks a JSON-mode LLM for the English text and its translation in one
+completion, so local-language answers and notes skip the IndicTrans2
+stage. The local-language part is accepted only if it is written in the
+language's script; otherwise callers fall back to translate_text.
+"""
+
+import json
+import os
+import re
+import unicodedata
+from typing import Optional, Tuple
+
+BILINGUAL_GENERATION = os.getenv("BILINGUAL_GENERATION", "1") == "1"
+# Share of the letters that must be in the target script (the rest may be
+# Latin technical terms, formulas or names)
+BILINGUAL_MIN_SCRIPT_RATIO = float(os.getenv("BILINGUAL_MIN_SCRIPT_RATIO", "0.6"))
+# Output budget multiplier: both texts are returned, and Indic scripts take
+# several times more tokens than English with Llama-style tokenizers
+BILINGUAL_TOKEN_FACTOR = float(os.getenv("BILINGUAL_TOKEN_FACTOR", "4"))
+BILINGUAL_MAX_TOKENS = int(os.getenv("BILINGUAL_MAX_TOKENS", "4096"))
+
+# language code -> (language name, script name, first code point, last code point)
+SCRIPTS = {
+    "hi": ("Hindi", "Devanagari", 0x0900, 0x097F),
+    "te": ("Telugu", "Telugu", 0x0C00, 0x0C7F),
+    "ta": ("Tamil", "Tamil", 0x0B80, 0x0BFF),
+    "kn": ("Kannada", "Kannada", 0x0C80, 0x0CFF),
+}
+
+
+def supports_bilingual(language: Optional[str]) -> bool:
+    """True if single-call bilingual generation applies to `language`."""
+    return BILINGUAL_GENERATION and language in SCRIPTS
+
+
+def script_ratio(text: str, language: str) -> float:
+    """Share of the letters (and combining signs) in `text` that belong to the language's script."""
+    _, _, first, last = SCRIPTS[language]
+    letters = [ch for ch in text if ch.isalpha() or unicodedata.category(ch).startswith("M")]
+    if not letters:
+        return 0.0
+    return sum(1 for ch in letters if first <= ord(ch) <= last) / len(letters)
+
+
+def is_valid_local_text(text: Optional[str], language: str) -> bool:
+    return bool(text and text.strip()) and script_ratio(text, language) >= BILINGUAL_MIN_SCRIPT_RATIO
+
+
+def bilingual_prompt(prompt: str, language: str) -> str:
+    """Wrap a generation prompt so the model answers in English and `language` as JSON."""
+    name, script, _, _ = SCRIPTS[language]
+    return f"""{prompt}
+
+Respond with JSON only, in exactly this shape:
+{{"english": "...", "local": "..."}}
+
+"english" is your response in English. "local" is the same response translated into {name}, written in {script} script; keep technical terms that have no common {name} word in English. Keep the same formatting (line breaks, bullet points) in both."""
+
+
+def bilingual_max_tokens(max_tokens: int) -> int:
+    return min(int(max_tokens * BILINGUAL_TOKEN_FACTOR), BILINGUAL_MAX_TOKENS)
+
+
+def parse_bilingual(raw: str) -> Tuple[str, Optional[str]]:
+    """
+    Parse a bilingual completion.
+
+    Returns:
+        (english, local); local is None when missing
+
+    Raises:
+        ValueError: The completion is not a JSON object with an English text
+    """
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = re.sub(r"^```[a-zA-Z]*\s*", "", raw)
+        raw = re.sub(r"\s*```$", "", raw)
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON object in bilingual response")
+    try:
+        data = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid bilingual JSON: {e}")
+    english = data.get("english") if isinstance(data, dict) else None
+    if not isinstance(english, str) or not english.strip():
+        raise ValueError("Bilingual response has no English text")
+    local = data.get("local")
+    return english.strip(), local.strip() if isinstance(local, str) else None
@@ -0,0 +1,123 @@
+"""
+Request deadlines and cancellation
+A Deadline travels with the request in a context variable (copied into
+worker threads with the request context). Generation code checks it
+before expensive steps, bounds Groq/HTTP timeouts by the time left and
+stops local generate() through a stopping criterion, so work for a
+client that gave up or timed out stops taking capacity.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Upper bound for deadlines requested through the X-Request-Timeout header
+MAX_REQUEST_TIMEOUT = float(os.getenv("MAX_REQUEST_TIMEOUT", "600"))
+
+# Default deadline (seconds) per endpoint; others run without a deadline.
+# For /ws/chat it applies to each question.
+ENDPOINT_DEADLINES = {
+    "/generate-answer": float(os.getenv("ANSWER_DEADLINE", "30")),
+    "/generate-answer/stream": float(os.getenv("CHAT_DEADLINE", "60")),
+    "/ws/chat": float(os.getenv("CHAT_DEADLINE", "60")),
+    "/translate": float(os.getenv("TRANSLATE_DEADLINE", "30")),
+    "/generate-notes": float(os.getenv("NOTES_DEADLINE", "180")),
+    "/generate-notes/stream": float(os.getenv("NOTES_DEADLINE", "180")),
+    "/generate-quiz": float(os.getenv("QUIZ_DEADLINE", "180")),
+}
+
+
+class GenerationAborted(Exception):
+    """Base class: the request's generation was stopped before it finished."""
+
+
+class DeadlineExceeded(GenerationAborted):
+    pass
+
+
+class RequestCancelled(GenerationAborted):
+    pass
+
+
+class Deadline:
+    """
+    Expiry time plus a cancel flag. is_set() mirrors threading.Event, so a
+    Deadline can be passed wherever a cancel event is polled.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, cancel: Optional[threading.Event] = None):
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self.cancelled = cancel or threading.Event()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a time limit."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_set(self) -> bool:
+        return self.cancelled.is_set() or self.expired()
+
+    def check(self):
+        """Raise RequestCancelled or DeadlineExceeded if generation should stop."""
+        if self.cancelled.is_set():
+            raise RequestCancelled("Request was cancelled")
+        if self.expired():
+            raise DeadlineExceeded("Request deadline exceeded")
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def check_deadline():
+    """Raise if the current request's deadline passed or it was cancelled."""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def time_left(default: Optional[float] = None) -> Optional[float]:
+    """
+    Timeout for a blocking call: the time left on the current deadline,
+    capped at `default` (which is also used without a deadline).
+    """
+    deadline = _current_deadline.get()
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(remaining, default) if default else remaining
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """Parse an X-Request-Timeout header value (seconds); invalid values are ignored."""
+    try:
+        timeout = float(value) if value else None
+    except ValueError:
+        return None
+    if timeout is None or timeout <= 0:
+        return None
+    return min(timeout, MAX_REQUEST_TIMEOUT)
@@ -0,0 +1,214 @@
+"""
+Extractive study notes
+Builds notes from the source text itself, without a language model:
+sentences are ranked with TextRank over TF-IDF sentence vectors (all
+pairwise similarities in one NumPy matrix product), the best ones are kept
+in document order as bullets under their section headings, and the
+highest-weighted terms are listed as key terms. A chapter takes
+milliseconds, so this serves notes when no LLM is available and shrinks
+long documents before LLM map-reduce notes.
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .retrieval import tokenize
+from .text_chunker import HEADING_RE, SENTENCE_END_RE, estimate_tokens
+
+# Share of the sentences kept as bullets
+EXTRACTIVE_NOTES_RATIO = float(os.getenv("EXTRACTIVE_NOTES_RATIO", "0.3"))
+EXTRACTIVE_MAX_BULLETS = int(os.getenv("EXTRACTIVE_MAX_BULLETS", "40"))
+EXTRACTIVE_KEY_TERMS = int(os.getenv("EXTRACTIVE_KEY_TERMS", "8"))
+# Below this many sentences (e.g. a bare topic) there is nothing to extract from
+EXTRACTIVE_MIN_SENTENCES = int(os.getenv("EXTRACTIVE_MIN_SENTENCES", "5"))
+# Shorter pieces are list fragments or captions, not sentences
+MIN_SENTENCE_WORDS = 4
+
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_MAX_ITERATIONS = 100
+TEXTRANK_TOLERANCE = 1e-6
+
+_BULLET_RE = re.compile(r"^\s*([-*•]|\d+[.)])\s+")
+
+
+def _is_heading(line: str) -> bool:
+    return bool(HEADING_RE.match(line)) and len(line.split()) <= 12 and not line.endswith(".")
+
+
+def split_sentences(text: str) -> List[Tuple[str, str]]:
+    """
+    Split a document into sentences.
+
+    Returns:
+        (heading, sentence) pairs in document order; heading is the
+        nearest section heading above the sentence, or ""
+    """
+    sentences: List[Tuple[str, str]] = []
+    heading = ""
+
+    def add(paragraph: List[str]):
+        for sentence in SENTENCE_END_RE.split(" ".join(paragraph)):
+            sentence = sentence.strip()
+            if len(sentence.split()) >= MIN_SENTENCE_WORDS:
+                sentences.append((heading, sentence))
+
+    for block in re.split(r"\n\s*\n", text):
+        paragraph: List[str] = []
+        for line in block.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if _is_heading(line):
+                add(paragraph)
+                paragraph = []
+                heading = line.lstrip("#").strip().rstrip(":")
+            elif _BULLET_RE.match(line):
+                # List items are sentences of their own
+                add(paragraph)
+                paragraph = []
+                add([_BULLET_RE.sub("", line)])
+            else:
+                paragraph.append(line)
+        add(paragraph)
+    return sentences
+
+
+def rank_sentences(sentences: List[str]) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    TextRank over TF-IDF sentence vectors.
+
+    Returns:
+        (score per sentence, weight per shared term); a term's weight is
+        its TF-IDF mass in the sentences, weighted by their scores
+    """
+    n = len(sentences)
+    vocab: Dict[str, int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    counts: List[int] = []
+    for i, sentence in enumerate(sentences):
+        for term, tf in Counter(tokenize(sentence)).items():
+            rows.append(i)
+            cols.append(vocab.setdefault(term, len(vocab)))
+            counts.append(tf)
+    if not vocab:
+        return np.full(n, 1.0 / max(n, 1)), {}
+
+    row_array = np.asarray(rows)
+    col_array = np.asarray(cols)
+    df = np.bincount(col_array, minlength=len(vocab))
+    idf = np.log((1 + n) / (1 + df)) + 1
+    weights = np.asarray(counts, dtype=np.float32) * idf[col_array]
+    norms = np.sqrt(np.bincount(row_array, weights=weights ** 2, minlength=n))
+    weights /= np.maximum(norms[row_array], 1e-9)
+
+    # Terms in a single sentence add nothing to any similarity, so the dense
+    # matrix only needs the shared ones (a small fraction of the vocabulary)
+    shared = df > 1
+    columns = np.cumsum(shared) - 1
+    keep = shared[col_array]
+    matrix = np.zeros((n, int(shared.sum())), dtype=np.float32)
+    matrix[row_array[keep], columns[col_array[keep]]] = weights[keep]
+
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, out_weight, out=np.zeros_like(similarity), where=out_weight > 0)
+
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(TEXTRANK_MAX_ITERATIONS):
+        updated = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * (transition.T @ scores)
+        converged = np.abs(updated - scores).sum() < TEXTRANK_TOLERANCE
+        scores = updated
+        if converged:
+            break
+
+    terms = [term for term, index in vocab.items() if shared[index]]
+    term_weights = dict(zip(terms, (scores @ matrix).tolist())) if terms else {}
+    return scores, term_weights
+
+
+def key_terms(term_weights: Dict[str, float], limit: int = EXTRACTIVE_KEY_TERMS) -> List[str]:
+    """Highest-weighted terms, skipping numbers and very short words."""
+    candidates = [term for term in term_weights if len(term) > 2 and not term.isdigit()]
+    return sorted(candidates, key=lambda term: -term_weights[term])[:limit]
+
+
+def _select(scores: np.ndarray, sentences: List[str], count: Optional[int], max_tokens: Optional[int]) -> List[int]:
+    """Indices of the best sentences (at most `count`, within `max_tokens`), in document order."""
+    chosen = []
+    used = 0
+    for index in np.argsort(-scores, kind="stable"):
+        if count is not None and len(chosen) >= count:
+            break
+        tokens = estimate_tokens(sentences[index])
+        if max_tokens is not None and used + tokens > max_tokens:
+            continue
+        chosen.append(int(index))
+        used += tokens
+    return sorted(chosen)
+
+
+def _group_by_heading(pairs: List[Tuple[str, str]], indices: List[int]) -> List[Tuple[str, List[str]]]:
+    groups: List[Tuple[str, List[str]]] = []
+    for index in indices:
+        heading, sentence = pairs[index]
+        if not groups or groups[-1][0] != heading:
+            groups.append((heading, []))
+        groups[-1][1].append(sentence)
+    return groups
+
+
+def extract_notes(text: str, max_tokens: Optional[int] = None) -> Optional[str]:
+    """
+    Extractive bullet notes for a document.
+
+    Args:
+        text: Source document
+        max_tokens: Optional budget for the bullets
+
+    Returns:
+        Notes text, or None if the text has too few sentences (e.g. a topic
+        name rather than a document)
+    """
+    pairs = split_sentences(text)
+    if len(pairs) < EXTRACTIVE_MIN_SENTENCES:
+        return None
+    sentences = [sentence for _, sentence in pairs]
+    scores, term_weights = rank_sentences(sentences)
+    count = min(max(3, round(len(sentences) * EXTRACTIVE_NOTES_RATIO)), EXTRACTIVE_MAX_BULLETS)
+
+    lines = []
+    terms = key_terms(term_weights)
+    if terms:
+        lines += [f"Key terms: {', '.join(terms)}", ""]
+    for heading, group in _group_by_heading(pairs, _select(scores, sentences, count, max_tokens)):
+        if heading:
+            lines.append(f"## {heading}")
+        lines += [f"- {sentence}" for sentence in group]
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def compress_text(text: str, max_tokens: int) -> str:
+    """
+    Shorten a document to about `max_tokens` by keeping its highest-ranked
+    sentences in document order (under their headings). Text within the
+    budget is returned unchanged.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    pairs = split_sentences(text)
+    if not pairs:
+        return text
+    sentences = [sentence for _, sentence in pairs]
+    scores, _ = rank_sentences(sentences)
+    blocks = []
+    for heading, group in _group_by_heading(pairs, _select(scores, sentences, None, max_tokens)):
+        paragraph = " ".join(group)
+        blocks.append(f"{heading}\n{paragraph}" if heading else paragraph)
+    return "\n\n".join(blocks)
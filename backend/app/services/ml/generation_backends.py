@@ -0,0 +1,566 @@
+"""
+Pluggable generation backends
+Every text generation goes through a GenerationBackend: Groq, an
+OpenAI-compatible HTTP server (vLLM, llama.cpp, TGI, ... on our own
+nodes) or the local transformers model. GENERATION_BACKENDS orders them;
+callers try each available backend in turn, so traffic can be moved to
+the cheapest fast backend without code changes.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from .groq_service import (
+    GROQ_MAX_CONCURRENCY,
+    MODEL_NAME as GROQ_MODEL_NAME,
+    complete_json_groq,
+    generate_answer_groq,
+    is_groq_available,
+    stream_answer_groq,
+)
+from .priority import LOCAL_GENERATION_SLOTS, PriorityScheduler
+from .deadlines import check_deadline, current_deadline, time_left
+from ..usage import usage_accountant
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated backend names, tried in order
+GENERATION_BACKENDS = os.getenv("GENERATION_BACKENDS", "groq,openai_compat,local")
+
+# OpenAI-compatible server, e.g. http://inference:8080/v1 (disabled when unset)
+OPENAI_COMPAT_BASE_URL = os.getenv("OPENAI_COMPAT_BASE_URL", "")
+OPENAI_COMPAT_API_KEY = os.getenv("OPENAI_COMPAT_API_KEY", "")
+OPENAI_COMPAT_MODEL = os.getenv("OPENAI_COMPAT_MODEL", "default")
+OPENAI_COMPAT_TIMEOUT = float(os.getenv("OPENAI_COMPAT_TIMEOUT", "60"))
+OPENAI_COMPAT_MAX_CONCURRENCY = int(os.getenv("OPENAI_COMPAT_MAX_CONCURRENCY", "4"))
+OPENAI_COMPAT_CONTEXT_TOKENS = int(os.getenv("OPENAI_COMPAT_CONTEXT_TOKENS", "4096"))
+# Not every server implements response_format={"type": "json_object"}
+OPENAI_COMPAT_JSON_MODE = os.getenv("OPENAI_COMPAT_JSON_MODE", "1") == "1"
+
+# Simulated LLM for load tests and traffic replays (GENERATION_BACKENDS=fake)
+FAKE_LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "300"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "250"))
+FAKE_LLM_COMPLETION_TOKENS = int(os.getenv("FAKE_LLM_COMPLETION_TOKENS", "200"))
+FAKE_LLM_MAX_CONCURRENCY = int(os.getenv("FAKE_LLM_MAX_CONCURRENCY", "64"))
+
+# Threads for agenerate/astream. A stream holds its thread until the last token,
+# so these calls get their own pool rather than the loop's default executor,
+# which asyncio.to_thread and sentence translation share. More threads than
+# backend slots would only park extra streams in the schedulers.
+GENERATION_THREADS = int(os.getenv(
+    "GENERATION_THREADS", str(GROQ_MAX_CONCURRENCY + OPENAI_COMPAT_MAX_CONCURRENCY + LOCAL_GENERATION_SLOTS)
+))
+generation_executor = ThreadPoolExecutor(max_workers=max(1, GENERATION_THREADS), thread_name_prefix="generation")
+
+
+class CompletionCheckpoint:
+    """
+    Durable store of completion results for one unit of work (a job task),
+    so a task resumed after a crash does not pay again for the chunk calls
+    it already made. Subclasses implement get and put.
+
+    Calls are keyed by their arguments plus how many identical calls came
+    before in this run, so a deliberate retry of the same prompt is a new
+    call rather than a replay of the failed one.
+    """
+
+    def __init__(self):
+        self._occurrences: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def call_key(self, prompt: str, max_tokens: int, temperature: float, json_mode: bool) -> str:
+        digest = hashlib.sha256(
+            json.dumps([prompt, max_tokens, temperature, json_mode], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            occurrence = self._occurrences.get(digest, 0)
+            self._occurrences[digest] = occurrence + 1
+        return f"{digest}:{occurrence}"
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def put(self, key: str, text: str):
+        raise NotImplementedError
+
+
+_completion_checkpoint: contextvars.ContextVar[Optional[CompletionCheckpoint]] = contextvars.ContextVar(
+    "completion_checkpoint", default=None
+)
+
+
+@contextlib.contextmanager
+def use_completion_checkpoint(checkpoint: Optional[CompletionCheckpoint]) -> Iterator[None]:
+    """Checkpoint complete() calls made in the enclosed block (and threads started with its context)."""
+    token = _completion_checkpoint.set(checkpoint)
+    try:
+        yield
+    finally:
+        _completion_checkpoint.reset(token)
+
+
+class GenerationBackend:
+    """
+    Base class of a text generation backend.
+
+    Subclasses implement _generate (and _stream when `streaming` is set).
+    generate() and stream() add the backend name and latency to `usage`
+    and record it with the usage accountant; backends also report
+    prompt_tokens, completion_tokens and finish_reason when they know them.
+    Both raise DeadlineExceeded or RequestCancelled when the current
+    request's deadline (see deadlines.py) stops the generation.
+    """
+
+    name = "base"
+    # Capability flags
+    streaming = False
+    json_mode = False
+    native_stop = False
+    # Several prompts per forward pass (local models)
+    batching = False
+    # Largest prompt the backend handles well; small models get
+    # shorter chunks and simpler prompts
+    max_input_tokens = 512
+    # Score reported with generated answers
+    score = 0.9
+
+    def is_available(self) -> bool:
+        return True
+
+    def _generate(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[List[str]],
+        usage: Dict[str, Any],
+        json_mode: bool,
+    ) -> str:
+        raise NotImplementedError
+
+    def _stream(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[List[str]],
+        usage: Dict[str, Any],
+        cancel: threading.Event,
+    ) -> Iterator[str]:
+        raise NotImplementedError(f"{self.name} does not support streaming")
+
+    def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 300,
+        temperature: float = 0.7,
+        stop: Optional[List[str]] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        json_mode: bool = False,
+    ) -> str:
+        """
+        Generate a completion.
+
+        Args:
+            prompt: The input prompt
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            stop: Stop sequences (applied natively when `native_stop`)
+            usage: Optional dictionary filled with backend, latency_s,
+                prompt_tokens, completion_tokens and finish_reason; an
+                "intent" set by the caller is used to group usage
+            json_mode: Ask for a JSON object (ignored without `json_mode`)
+
+        Returns:
+            The generated text
+        """
+        check_deadline()
+        usage = usage if usage is not None else {}
+        usage["backend"] = self.name
+        start = time.perf_counter()
+        try:
+            return self._generate(prompt, max_tokens, temperature, stop, usage, json_mode and self.json_mode)
+        except BaseException:
+            usage["error"] = True
+            # A timeout caused by the request deadline surfaces as DeadlineExceeded
+            check_deadline()
+            raise
+        finally:
+            usage["latency_s"] = time.perf_counter() - start
+            usage_accountant.record(usage)
+
+    def stream(
+        self,
+        prompt: str,
+        max_tokens: int = 300,
+        temperature: float = 0.7,
+        stop: Optional[List[str]] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Iterator[str]:
+        """
+        Stream a completion as text deltas (see generate for the arguments).
+        Setting `cancel` (default: the request deadline) ends the stream.
+        """
+        check_deadline()
+        usage = usage if usage is not None else {}
+        usage["backend"] = self.name
+        start = time.perf_counter()
+        try:
+            yield from self._stream(
+                prompt, max_tokens, temperature, stop, usage, cancel or current_deadline() or threading.Event()
+            )
+            # A stream cut short by the deadline is incomplete, not finished
+            check_deadline()
+        except Exception:
+            usage["error"] = True
+            check_deadline()
+            raise
+        finally:
+            usage["latency_s"] = time.perf_counter() - start
+            usage_accountant.record(usage)
+
+    def complete(self, prompt: str, max_tokens: int, temperature: float, json_mode: bool = False) -> str:
+        """
+        Completion function for the groq_service notes and quiz helpers.
+        Under a CompletionCheckpoint, results already stored are returned
+        without calling the backend.
+        """
+        checkpoint = _completion_checkpoint.get()
+        if checkpoint is None:
+            return self.generate(prompt, max_tokens, temperature, json_mode=json_mode)
+        key = checkpoint.call_key(prompt, max_tokens, temperature, json_mode)
+        cached = checkpoint.get(key)
+        if cached is not None:
+            return cached
+        text = self.generate(prompt, max_tokens, temperature, json_mode=json_mode)
+        checkpoint.put(key, text)
+        return text
+
+    async def agenerate(self, *args, **kwargs) -> str:
+        """generate() in a worker thread, keeping the request context (priority)."""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(generation_executor, lambda: context.run(self.generate, *args, **kwargs))
+
+    async def astream(self, *args, **kwargs) -> AsyncIterator[str]:
+        """stream() relayed from a worker thread."""
+        async for delta in iterate_in_thread(lambda: self.stream(*args, **kwargs)):
+            yield delta
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "available": self.is_available(),
+            "streaming": self.streaming,
+            "json_mode": self.json_mode,
+            "native_stop": self.native_stop,
+            "batching": self.batching,
+            "max_input_tokens": self.max_input_tokens,
+        }
+
+
+async def iterate_in_thread(factory: Callable[[], Iterator[Any]]) -> AsyncIterator[Any]:
+    """Run a blocking generator on generation_executor and relay its items."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    def pump():
+        try:
+            for item in factory():
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+    # Run in a copy of the caller's context so the generation priority carries over
+    producer = loop.run_in_executor(generation_executor, contextvars.copy_context().run, pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is finished:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        await asyncio.shield(producer)
+
+
+class GroqBackend(GenerationBackend):
+    name = "groq"
+    streaming = True
+    json_mode = True
+    native_stop = True
+    max_input_tokens = 8192
+    score = 0.95
+
+    def is_available(self) -> bool:
+        return is_groq_available()
+
+    def _generate(self, prompt, max_tokens, temperature, stop, usage, json_mode):
+        usage["model"] = GROQ_MODEL_NAME
+        if json_mode:
+            return complete_json_groq(prompt, max_tokens, temperature, usage=usage)
+        return generate_answer_groq(prompt, max_tokens, temperature, stop=stop, usage=usage)[0]["text"]
+
+    def _stream(self, prompt, max_tokens, temperature, stop, usage, cancel):
+        usage["model"] = GROQ_MODEL_NAME
+        return stream_answer_groq(prompt, max_tokens, temperature, stop=stop, usage=usage, cancel=cancel)
+
+
+class OpenAICompatibleBackend(GenerationBackend):
+    """Chat completions against any server implementing the OpenAI HTTP API."""
+
+    name = "openai_compat"
+    streaming = True
+    native_stop = True
+
+    def __init__(
+        self,
+        base_url: str = OPENAI_COMPAT_BASE_URL,
+        model: str = OPENAI_COMPAT_MODEL,
+        api_key: str = OPENAI_COMPAT_API_KEY,
+        timeout: float = OPENAI_COMPAT_TIMEOUT,
+        max_concurrency: int = OPENAI_COMPAT_MAX_CONCURRENCY,
+        max_input_tokens: int = OPENAI_COMPAT_CONTEXT_TOKENS,
+        json_mode: bool = OPENAI_COMPAT_JSON_MODE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_input_tokens = max_input_tokens
+        self.json_mode = json_mode
+        self.timeout = timeout
+        self.scheduler = PriorityScheduler(self.name, max_concurrency)
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        # One pooled client; keep-alive connections are reused across requests
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        ) if self.base_url else None
+
+    def is_available(self) -> bool:
+        return self._client is not None
+
+    def _payload(self, prompt, max_tokens, temperature, stop, json_mode, stream) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": max(0.0, min(2.0, temperature)),
+        }
+        if stop:
+            payload["stop"] = stop[:4]
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    @staticmethod
+    def _record_usage(usage: Dict[str, Any], data: Dict[str, Any]):
+        reported = data.get("usage") or {}
+        if "prompt_tokens" in reported:
+            usage["prompt_tokens"] = reported["prompt_tokens"]
+        if "completion_tokens" in reported:
+            usage["completion_tokens"] = reported["completion_tokens"]
+
+    def _generate(self, prompt, max_tokens, temperature, stop, usage, json_mode):
+        usage["model"] = self.model
+        with self.scheduler.slot():
+            response = self._client.post(
+                "/chat/completions",
+                json=self._payload(prompt, max_tokens, temperature, stop, json_mode, stream=False),
+                timeout=time_left(self.timeout),
+            )
+        response.raise_for_status()
+        data = response.json()
+        self._record_usage(usage, data)
+        choices = data.get("choices") or []
+        if not choices:
+            raise ValueError("No choices in response")
+        usage["finish_reason"] = choices[0].get("finish_reason")
+        return choices[0].get("message", {}).get("content") or ""
+
+    def _stream(self, prompt, max_tokens, temperature, stop, usage, cancel):
+        usage["model"] = self.model
+        payload = self._payload(prompt, max_tokens, temperature, stop, json_mode=False, stream=True)
+        with self.scheduler.slot(), self._client.stream(
+            "POST", "/chat/completions", json=payload, timeout=time_left(self.timeout)
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if cancel.is_set():
+                    break
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                self._record_usage(usage, event)
+                for choice in event.get("choices") or []:
+                    if choice.get("finish_reason"):
+                        usage["finish_reason"] = choice["finish_reason"]
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "base_url": self.base_url, "model": self.model, "slots": self.scheduler.stats()}
+
+
+class FakeBackend(GenerationBackend):
+    """
+    Simulated LLM: canned text after a fixed time to first token, then at a
+    fixed token rate. Only used when listed in GENERATION_BACKENDS, for load
+    tests and traffic replays without provider cost. JSON-mode calls get a
+    quiz or bilingual object shaped like the prompt asks for.
+    """
+
+    name = "fake"
+    streaming = True
+    json_mode = True
+    native_stop = True
+    max_input_tokens = 8192
+
+    def __init__(
+        self,
+        ttft_ms: float = FAKE_LLM_TTFT_MS,
+        tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+        completion_tokens: int = FAKE_LLM_COMPLETION_TOKENS,
+        max_concurrency: int = FAKE_LLM_MAX_CONCURRENCY,
+    ):
+        self.ttft = ttft_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.scheduler = PriorityScheduler(self.name, max_concurrency)
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+
+    def _next_id(self) -> int:
+        with self._counter_lock:
+            self._counter += 1
+            return self._counter
+
+    @staticmethod
+    def _words(count: int, word: str = "answer") -> List[str]:
+        # Sentences of ten words, so sentence-level consumers see boundaries
+        return [f"{word}." if (i + 1) % 10 == 0 else word for i in range(count)]
+
+    def _json(self, prompt: str, tokens: int) -> str:
+        if '"questions"' in prompt or "multiple-choice" in prompt.lower():
+            start = self._next_id() * 100
+            requested = re.search(r"Generate (\d+)", prompt)
+            count = int(requested.group(1)) if requested else 5
+            return json.dumps({"questions": [{
+                "question": f"Simulated question {start + i}?",
+                "options": [f"Option {letter} {start + i}" for letter in "ABCD"],
+                "correct_index": i % 4,
+                "explanation": "Simulated explanation.",
+            } for i in range(count)]})
+        english = " ".join(self._words(tokens // 2))
+        local = english
+        from .bilingual import SCRIPTS
+        for _, script, first, _ in SCRIPTS.values():
+            if f"in {script} script" in prompt:
+                local = " ".join(self._words(tokens // 2, chr(first + 0x15) * 3))
+                break
+        return json.dumps({"english": english, "local": local}, ensure_ascii=False)
+
+    @staticmethod
+    def _wait(seconds: float, cancel: Optional[threading.Event] = None) -> bool:
+        """Sleep for `seconds` unless cancelled or past the deadline; True if it slept the full time."""
+        cancel = cancel or current_deadline()
+        until = time.monotonic() + seconds
+        while True:
+            if cancel is not None and cancel.is_set():
+                return False
+            remaining = until - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 0.05))
+
+    def _generate(self, prompt, max_tokens, temperature, stop, usage, json_mode):
+        usage["model"] = self.name
+        tokens = min(max_tokens, self.completion_tokens)
+        with self.scheduler.slot():
+            self._wait(self.ttft + tokens / self.tokens_per_second)
+            check_deadline()
+        usage["prompt_tokens"] = len(prompt.split())
+        usage["completion_tokens"] = tokens
+        usage["finish_reason"] = "stop"
+        return self._json(prompt, tokens) if json_mode else " ".join(self._words(tokens))
+
+    def _stream(self, prompt, max_tokens, temperature, stop, usage, cancel):
+        usage["model"] = self.name
+        usage["prompt_tokens"] = len(prompt.split())
+        tokens = min(max_tokens, self.completion_tokens)
+        with self.scheduler.slot():
+            if not self._wait(self.ttft, cancel):
+                return
+            for i, word in enumerate(self._words(tokens)):
+                if not self._wait(1 / self.tokens_per_second, cancel):
+                    return
+                usage["completion_tokens"] = i + 1
+                yield word if i == 0 else " " + word
+        usage["finish_reason"] = "stop"
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            **super().describe(),
+            "ttft_ms": self.ttft * 1000,
+            "tokens_per_second": self.tokens_per_second,
+            "slots": self.scheduler.stats(),
+        }
+
+
+_backends: Dict[str, GenerationBackend] = {}
+
+
+def register_backend(backend: GenerationBackend):
+    """Make a backend selectable by name in GENERATION_BACKENDS."""
+    _backends[backend.name] = backend
+
+
+def get_backend(name: str) -> Optional[GenerationBackend]:
+    return _backends.get(name)
+
+
+def backend_chain(names: Optional[str] = None) -> List[GenerationBackend]:
+    """Available backends in configured order (unknown names are skipped)."""
+    chain = []
+    for name in (names or GENERATION_BACKENDS).split(","):
+        backend = _backends.get(name.strip())
+        if backend is not None and backend.is_available():
+            chain.append(backend)
+    return chain
+
+
+def backends_info() -> Dict[str, Any]:
+    return {
+        "order": [name.strip() for name in GENERATION_BACKENDS.split(",") if name.strip()],
+        "backends": [backend.describe() for backend in _backends.values()],
+    }
+
+
+register_backend(GroqBackend())
+register_backend(OpenAICompatibleBackend())
+register_backend(FakeBackend())
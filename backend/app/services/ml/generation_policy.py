@@ -0,0 +1,185 @@
+"""
+Intent-driven generation policy
+Maps a classified intent (and the question length) to a token budget,
+temperature, prompt template and stop sequences, so short definitions stop
+early instead of always using the caller's fixed max_length. Realized
+completion lengths are fed back to tune each intent's budget.
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Budgets are retuned from the last POLICY_WINDOW completions per intent,
+# once at least POLICY_MIN_SAMPLES have been observed
+POLICY_WINDOW = int(os.getenv("POLICY_WINDOW", "200"))
+POLICY_MIN_SAMPLES = int(os.getenv("POLICY_MIN_SAMPLES", "20"))
+POLICY_TUNING = os.getenv("POLICY_TUNING", "1") == "1"
+# Headroom over the observed 95th percentile completion length
+POLICY_HEADROOM = 1.2
+# Questions longer than this many words get a larger budget
+LONG_QUESTION_WORDS = 40
+
+POLICIES: Dict[str, Dict[str, Any]] = {
+    "definition": {
+        "max_tokens": 80,
+        "min_tokens": 40,
+        "cap_tokens": 160,
+        "temperature": 0.3,
+        "template": "Define the following in two or three short sentences for a school student.\n\n{question}",
+        "stop": ["\n\n\n"],
+    },
+    "concept": {
+        "max_tokens": 200,
+        "min_tokens": 80,
+        "cap_tokens": 400,
+        "temperature": 0.5,
+        "template": "Explain the concept in simple terms with one short example.\n\n{question}",
+        "stop": [],
+    },
+    "numerical": {
+        "max_tokens": 350,
+        "min_tokens": 120,
+        "cap_tokens": 600,
+        "temperature": 0.2,
+        "template": "Solve this problem step by step and end with a line starting 'Final answer:'.\n\n{question}",
+        "stop": [],
+    },
+    "comparison": {
+        "max_tokens": 250,
+        "min_tokens": 100,
+        "cap_tokens": 450,
+        "temperature": 0.4,
+        "template": "Compare and contrast the following as a short list of key differences and similarities.\n\n{question}",
+        "stop": [],
+    },
+    "explanation": {
+        "max_tokens": 300,
+        "min_tokens": 120,
+        "cap_tokens": 600,
+        "temperature": 0.5,
+        "template": "Explain in detail, in clear steps a student can follow.\n\n{question}",
+        "stop": [],
+    },
+    "example": {
+        "max_tokens": 180,
+        "min_tokens": 80,
+        "cap_tokens": 350,
+        "temperature": 0.7,
+        "template": "Give three short, concrete examples of the following, one line each.\n\n{question}",
+        "stop": ["\n\n\n"],
+    },
+    "other": {
+        "max_tokens": 200,
+        "min_tokens": 80,
+        "cap_tokens": 400,
+        "temperature": 0.6,
+        "template": "Answer this question clearly and concisely.\n\n{question}",
+        "stop": [],
+    },
+}
+
+_lock = threading.Lock()
+# intent -> recent (completion_tokens, truncated) observations
+_observations: Dict[str, Deque] = {}
+# intent -> tuned max_tokens
+_tuned_budgets: Dict[str, int] = {}
+
+
+def _policy_for(intent: Optional[str]) -> Dict[str, Any]:
+    return POLICIES.get(intent or "other", POLICIES["other"])
+
+
+def resolve_policy(
+    intent: Optional[str],
+    question: str,
+    max_length: Optional[int] = None,
+    subject: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Resolve generation settings for a question.
+
+    Args:
+        intent: Intent label from classify_intent (unknown labels use "other")
+        question: The student's question
+        max_length: Caller's limit; the policy budget never exceeds it
+        subject: Optional subject appended to the prompt
+
+    Returns:
+        Dictionary with prompt, max_tokens, temperature, stop and intent
+    """
+    intent = intent if intent in POLICIES else "other"
+    policy = _policy_for(intent)
+
+    budget = _tuned_budgets.get(intent, policy["max_tokens"])
+    if len(question.split()) > LONG_QUESTION_WORDS:
+        budget = min(int(budget * 1.5), policy["cap_tokens"])
+    if max_length:
+        budget = min(budget, max_length)
+
+    prompt = policy["template"].format(question=question.strip())
+    if subject:
+        prompt += f"\n\n(Subject: {subject})"
+
+    return {
+        "intent": intent,
+        "prompt": prompt,
+        "max_tokens": budget,
+        "temperature": policy["temperature"],
+        "stop": list(policy["stop"]),
+    }
+
+
+def record_completion(intent: Optional[str], completion_tokens: int, max_tokens: int, truncated: Optional[bool] = None):
+    """
+    Feed back a realized completion length and retune the intent's budget.
+
+    The budget follows the 95th percentile of recent completions plus
+    headroom, and grows when too many completions hit the limit.
+    """
+    intent = intent if intent in POLICIES else "other"
+    if truncated is None:
+        truncated = completion_tokens >= max_tokens
+    with _lock:
+        window = _observations.setdefault(intent, deque(maxlen=POLICY_WINDOW))
+        window.append((completion_tokens, truncated))
+        if not POLICY_TUNING or len(window) < POLICY_MIN_SAMPLES:
+            return
+
+        policy = _policy_for(intent)
+        lengths = sorted(tokens for tokens, _ in window)
+        p95 = lengths[min(len(lengths) - 1, int(len(lengths) * 0.95))]
+        budget = int(p95 * POLICY_HEADROOM)
+        truncation_rate = sum(1 for _, cut in window if cut) / len(window)
+        if truncation_rate > 0.1:
+            budget = int(max(budget, _tuned_budgets.get(intent, policy["max_tokens"])) * 1.25)
+        _tuned_budgets[intent] = max(policy["min_tokens"], min(budget, policy["cap_tokens"]))
+
+
+def apply_stop_sequences(text: str, stop: List[str]) -> str:
+    """Cut text at the first stop sequence (for backends without native stop support)."""
+    cut = len(text)
+    for sequence in stop:
+        index = text.find(sequence)
+        if index != -1:
+            cut = min(cut, index)
+    return text[:cut]
+
+
+def policy_stats() -> Dict[str, Any]:
+    """Configured and tuned budgets with recent completion statistics per intent."""
+    with _lock:
+        stats = {}
+        for intent, policy in POLICIES.items():
+            window = _observations.get(intent, ())
+            lengths = [tokens for tokens, _ in window]
+            stats[intent] = {
+                "default_max_tokens": policy["max_tokens"],
+                "max_tokens": _tuned_budgets.get(intent, policy["max_tokens"]),
+                "temperature": policy["temperature"],
+                "samples": len(lengths),
+                "mean_completion_tokens": round(sum(lengths) / len(lengths), 1) if lengths else None,
+                "truncation_rate": round(sum(1 for _, cut in window if cut) / len(window), 3) if window else None,
+            }
+        return stats
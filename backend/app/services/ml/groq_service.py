@@ -5,11 +5,16 @@ Uses Groq's API for answer generation, notes, and quiz generation
 
 import os
 import logging
+import threading
 from groq import Groq
-from typing import List, Dict
+from typing import Any, Callable, Iterator, List, Dict, Optional
 from dotenv import load_dotenv
 import sys
 
+from .quiz_parser import parse_quiz_json, dedupe_questions
+from .priority import PriorityExecutor, PriorityScheduler, submit_with_context
+from .deadlines import GenerationAborted, check_deadline, current_deadline, time_left
+
 # Load environment variables from backend/.env explicitly
 env_path = os.path.join(os.path.dirname(__file__), '../../../.env')
 load_dotenv(env_path)
@@ -18,20 +23,15 @@ logger = logging.getLogger(__name__)
 
 # Initialize Groq client
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-print(f"[GROQ_SERVICE] GROQ_API_KEY present: {bool(GROQ_API_KEY)}")
-print(f"[GROQ_SERVICE] API Key (first 10 chars): {GROQ_API_KEY[:10] if GROQ_API_KEY else 'None'}")
 
 client = None
 try:
     if GROQ_API_KEY:
-        print(f"[GROQ_SERVICE] Initializing Groq client...")
         client = Groq(api_key=GROQ_API_KEY)
-        print(f"[GROQ_SERVICE] Groq client initialized successfully")
-        logger.info(f"Groq API Key loaded successfully")
+        logger.info("Groq client initialized")
     else:
-        print(f"[GROQ_SERVICE] No API key found")
+        logger.info("GROQ_API_KEY not set; Groq API not available")
 except Exception as e:
-    print(f"[GROQ_SERVICE] Failed to initialize Groq client: {e}")
     logger.warning(f"Failed to initialize Groq client: {e}")
     client = None
 
@@ -40,11 +40,30 @@ except Exception as e:
 # Check https://console.groq.com/docs/models for the latest available models
 MODEL_NAME = "llama-3.1-8b-instant"  # Groq's fast model (mixtral and llama-3.1-70b are decommissioned)
 
-# Log Groq status
-if client is not None:
-    print(f"[GROQ_SERVICE] Groq API is AVAILABLE")
-else:
-    print(f"[GROQ_SERVICE] Groq API NOT available")
+# Quiz fan-out configuration: a quiz is split into chunks of QUIZ_CHUNK_SIZE
+# questions that are requested in parallel, so latency tracks the slowest
+# small completion instead of one long one.
+QUIZ_CHUNK_SIZE = int(os.getenv("QUIZ_CHUNK_SIZE", "3"))
+QUIZ_MAX_RETRIES = int(os.getenv("QUIZ_MAX_RETRIES", "2"))
+QUIZ_TOKENS_PER_QUESTION = 220
+# Largest quiz one request may ask for
+QUIZ_MAX_QUESTIONS = int(os.getenv("QUIZ_MAX_QUESTIONS", "30"))
+# Earlier questions listed in a retry prompt so it does not repeat them
+QUIZ_AVOID_MAX = 20
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+# Per-call HTTP timeout (seconds); a request deadline shortens it further
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))
+
+# Shared pool for parallel Groq calls (the SDK client is thread-safe). Queued
+# calls start by priority class, so an interactive map step is not stuck
+# behind a bulk job's quiz chunks
+executor = PriorityExecutor(GROQ_MAX_CONCURRENCY, thread_name_prefix="groq")
+# Every Groq call takes a slot here, so interactive answers overtake queued bulk calls
+scheduler = PriorityScheduler("groq", GROQ_MAX_CONCURRENCY)
+
+# complete(prompt, max_tokens, temperature, json_mode=False) -> text; lets the
+# notes and quiz helpers below run against any generation backend
+CompleteFn = Callable[..., str]
 
 
 def is_groq_available() -> bool:
@@ -59,6 +78,8 @@ def generate_answer_groq(
     prompt: str,
     max_tokens: int = 300,
     temperature: float = 0.7,
+    stop: Optional[List[str]] = None,
+    usage: Optional[Dict[str, Any]] = None,
 ) -> List[Dict[str, str]]:
     """
     Generate an answer using Groq API with token limiting.
@@ -67,6 +88,9 @@ def generate_answer_groq(
         prompt: The input prompt/question
         max_tokens: Maximum tokens in response (limited to 1024 for complex queries)
         temperature: Controls randomness (0.0 to 2.0)
+        stop: Optional stop sequences (at most 4)
+        usage: Optional dictionary filled with prompt_tokens,
+            completion_tokens and finish_reason
         
     Returns:
         List of dictionaries containing generated answers
@@ -82,7 +106,7 @@ def generate_answer_groq(
     if len(prompt.split()) > 100:
         # Complex query - limit tokens more strictly
         max_tokens = min(max_tokens, 512)
-        logger.info(f"Complex query detected - limiting tokens to {max_tokens}")
+        logger.debug("Complex query, limiting tokens", extra={"max_tokens": max_tokens})
     else:
         # Simple query - allow more tokens
         max_tokens = min(max_tokens, 1024)
@@ -91,67 +115,155 @@ def generate_answer_groq(
     temperature = max(0.0, min(2.0, temperature))
     
     try:
-        print(f"[GROQ] Calling Groq API...")
-        print(f"[GROQ] Client: {client is not None}")
-        print(f"[GROQ] Model: {MODEL_NAME}")
-        print(f"[GROQ] Max tokens: {max_tokens}")
-        
-        # Use a simple timeout mechanism
-        import signal
-        
-        def timeout_handler(signum, frame):
-            raise TimeoutError("Groq API request timed out")
-        
-        # Set 30 second timeout
-        #signal.signal(signal.SIGALRM, timeout_handler)
-        #signal.alarm(30)
+        logger.debug("Calling Groq API", extra={"model": MODEL_NAME, "max_tokens": max_tokens})
         
         try:
-            print(f"[GROQ] Making API call...")
-            message = client.chat.completions.create(
-                model=MODEL_NAME,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
-            
-            #signal.alarm(0)  # Cancel alarm
+            with scheduler.slot():
+                message = client.chat.completions.create(
+                    model=MODEL_NAME,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stop=stop[:4] if stop else None,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    timeout=time_left(GROQ_TIMEOUT),
+                )
             
-            print(f"[GROQ] Got response from API")
+            if usage is not None:
+                if message.usage is not None:
+                    usage["prompt_tokens"] = message.usage.prompt_tokens
+                    usage["completion_tokens"] = message.usage.completion_tokens
+                if message.choices:
+                    usage["finish_reason"] = message.choices[0].finish_reason
             
             # Extract the response text
             if message.choices and len(message.choices) > 0:
                 response_text = message.choices[0].message.content
-                print(f"[GROQ] Response success: {len(response_text)} chars")
+                logger.debug("Groq response", extra={"chars": len(response_text)})
                 return [{"text": response_text, "score": 0.95}]
             else:
-                print(f"[GROQ] No choices in response")
+                logger.warning("Groq response had no choices")
                 return [{"text": "No response generated", "score": 0.0}]
                 
         except TimeoutError as te:
-            print(f"[GROQ] Timeout: {te}")
+            logger.warning(f"Groq API timeout: {te}")
             raise
         
     except Exception as e:
-        print(f"[GROQ] Exception: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        logger.error(f"Groq API error: {str(e)}")
+        # A timeout cut short by the request deadline is reported as such
+        deadline = current_deadline()
+        if deadline is not None and deadline.is_set():
+            deadline.check()
+        logger.error(f"Groq API error: {type(e).__name__}: {e}", exc_info=True)
         raise
 
 
-def generate_notes_groq(
-    text: str,
-    max_tokens: int = 500,
+def stream_answer_groq(
+    prompt: str,
+    max_tokens: int = 300,
     temperature: float = 0.7,
-) -> List[Dict[str, str]]:
-    """Generate study notes using Groq API with token limiting."""
-    prompt = f"""Generate comprehensive and well-structured study notes for the following topic:
+    stop: Optional[List[str]] = None,
+    usage: Optional[Dict[str, Any]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[str]:
+    """
+    Stream an answer from Groq, yielding text deltas as they arrive.
+    
+    Args:
+        prompt: The input prompt/question
+        max_tokens: Maximum tokens in response
+        temperature: Controls randomness (0.0 to 2.0)
+        stop: Optional stop sequences (at most 4)
+        usage: Optional dictionary filled with finish_reason (and token
+            counts when the API reports them on the final chunk)
+        cancel: Optional event; setting it closes the stream (the request
+            deadline is used when not given)
+    """
+    if not is_groq_available():
+        raise ValueError("Groq API is not configured. Set GROQ_API_KEY environment variable.")
+    
+    if cancel is None:
+        cancel = current_deadline()
+    
+    # The slot is held for the whole stream
+    scheduler.acquire()
+    try:
+        stream = client.chat.completions.create(
+            model=MODEL_NAME,
+            max_tokens=min(max_tokens, 1024),
+            temperature=max(0.0, min(2.0, temperature)),
+            stop=stop[:4] if stop else None,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            timeout=time_left(GROQ_TIMEOUT),
+        )
+    except BaseException:
+        scheduler.release()
+        raise
+    try:
+        for chunk in stream:
+            if cancel is not None and cancel.is_set():
+                break
+            if usage is not None:
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                    usage["prompt_tokens"] = x_groq.usage.prompt_tokens
+                    usage["completion_tokens"] = x_groq.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if usage is not None and choice.finish_reason:
+                usage["finish_reason"] = choice.finish_reason
+            if choice.delta and choice.delta.content:
+                yield choice.delta.content
+    finally:
+        stream.close()
+        scheduler.release()
+
+
+def _complete_groq(prompt: str, max_tokens: int, temperature: float, json_mode: bool = False) -> str:
+    """Default completion function: one Groq call, returning the text."""
+    if json_mode:
+        return complete_json_groq(prompt, max_tokens, temperature)
+    return generate_answer_groq(prompt, max_tokens, temperature)[0]["text"]
+
+
+def complete_json_groq(
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    usage: Optional[Dict[str, Any]] = None,
+) -> str:
+    """One Groq call in JSON mode (no prompt-length token limiting)."""
+    if not is_groq_available():
+        raise ValueError("Groq API is not configured. Set GROQ_API_KEY environment variable.")
+    with scheduler.slot():
+        message = client.chat.completions.create(
+            model=MODEL_NAME,
+            max_tokens=max_tokens,
+            temperature=max(0.0, min(2.0, temperature)),
+            response_format={"type": "json_object"},
+            messages=[{"role": "user", "content": prompt}],
+            timeout=time_left(GROQ_TIMEOUT),
+        )
+    if usage is not None:
+        if message.usage is not None:
+            usage["prompt_tokens"] = message.usage.prompt_tokens
+            usage["completion_tokens"] = message.usage.completion_tokens
+        if message.choices:
+            usage["finish_reason"] = message.choices[0].finish_reason
+    if not message.choices:
+        raise ValueError("No choices in response")
+    return message.choices[0].message.content or ""
+
+
+def notes_prompt(text: str) -> str:
+    """Prompt for single-pass study notes on a topic or short document."""
+    return f"""Generate comprehensive and well-structured study notes for the following topic:
 
 {text}
 
@@ -162,31 +274,182 @@ Please provide:
 4. Summary
 
 Format the notes clearly with sections and bullet points."""
+
+
+def generate_notes_groq(
+    text: str,
+    max_tokens: int = 500,
+    temperature: float = 0.7,
+    complete: Optional[CompleteFn] = None,
+) -> List[Dict[str, str]]:
+    """Generate study notes using Groq API (or `complete`) with token limiting."""
+    prompt = notes_prompt(text)
     
     # For notes, use higher token limit (up to 1024)
     max_tokens = min(max_tokens, 1024)
+    if complete is not None:
+        return [{"text": complete(prompt, max_tokens, temperature), "score": 0.95}]
     return generate_answer_groq(prompt, max_tokens, temperature)
 
 
-def generate_quiz_groq(
+def generate_chunk_notes_groq(
+    chunk: str,
+    part: int,
+    total_parts: int,
+    max_tokens: int = 400,
+    temperature: float = 0.3,
+    complete: Optional[CompleteFn] = None,
+) -> str:
+    """Map step: summarize one section of a long document into partial notes."""
+    prompt = f"""You are writing study notes for part {part} of {total_parts} of a longer document.
+
+{chunk}
+
+Write concise bullet-point notes for this part only: key concepts, definitions,
+important facts and examples. Do not add an introduction or a conclusion."""
+    return (complete or _complete_groq)(prompt, max_tokens, temperature)
+
+
+def merge_notes_groq(
+    partial_notes: List[str],
+    max_tokens: int = 1024,
+    temperature: float = 0.3,
+    complete: Optional[CompleteFn] = None,
+) -> str:
+    """Reduce step: merge partial notes into one structured set of study notes."""
+    joined = "\n\n".join(f"Part {i + 1}:\n{notes}" for i, notes in enumerate(partial_notes))
+    prompt = f"""Merge the following partial study notes, taken from consecutive parts of one document, into a single set of study notes:
+
+{joined}
+
+Please provide:
+1. Key concepts and definitions
+2. Important points to remember
+3. Examples and applications
+4. Summary
+
+Remove duplicated points and keep the document's order. Format the notes clearly with sections and bullet points."""
+    return (complete or _complete_groq)(prompt, min(max_tokens, 1024), temperature)
+
+
+def _quiz_chunk_prompt(text: str, num_questions: int, part: int, total_parts: int, avoid: List[str]) -> str:
+    """Build the JSON-mode prompt for one chunk of a quiz."""
+    prompt = f"""Generate {num_questions} multiple-choice questions based on the following topic:
+
+{text}
+
+This is question set {part} of {total_parts}. Cover aspects of the topic that a
+different set would be unlikely to ask about.
+
+Respond with JSON only, in exactly this shape:
+{{"questions": [{{"question": "...", "options": ["...", "...", "...", "..."], "correct_index": 0, "explanation": "..."}}]}}
+
+Rules:
+- Exactly four distinct options per question, without "A)" style prefixes
+- correct_index is the 0-based index of the correct option
+- The explanation is one or two sentences"""
+
+    if avoid:
+        listed = "\n".join(f"- {q}" for q in avoid)
+        prompt += f"\n\nDo not repeat these questions:\n{listed}"
+    return prompt
+
+
+def _generate_quiz_chunk_groq(
+    text: str,
+    num_questions: int,
+    temperature: float,
+    part: int,
+    total_parts: int,
+    avoid: List[str],
+    complete: Optional[CompleteFn] = None,
+) -> List[Dict[str, Any]]:
+    """Request one small chunk of quiz questions in JSON mode and validate it."""
+    prompt = _quiz_chunk_prompt(text, num_questions, part, total_parts, avoid)
+    max_tokens = min(QUIZ_TOKENS_PER_QUESTION * num_questions + 100, 2048)
+    return parse_quiz_json((complete or _complete_groq)(prompt, max_tokens, temperature, json_mode=True))
+
+
+def _split_counts(total: int, chunk_size: int) -> List[int]:
+    """Split `total` questions into chunk sizes of at most `chunk_size`."""
+    chunk_size = max(1, chunk_size)
+    counts = [chunk_size] * (total // chunk_size)
+    if total % chunk_size:
+        counts.append(total % chunk_size)
+    return counts
+
+
+def generate_quiz_questions_groq(
     text: str,
     num_questions: int = 5,
-    max_tokens: int = 1000,
     temperature: float = 0.7,
-) -> List[Dict[str, str]]:
-    """Generate quiz questions using Groq API with token limiting."""
-    prompt = f"""Generate {num_questions} multiple-choice questions based on the following topic:
+    chunk_size: int = QUIZ_CHUNK_SIZE,
+    max_retries: int = QUIZ_MAX_RETRIES,
+    complete: Optional[CompleteFn] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate structured quiz questions by fanning out parallel JSON-mode calls.
 
-{text}
+    Chunks that fail (API error, invalid JSON, too few valid or unique
+    questions) are retried on their own; chunks that succeeded are kept.
 
-For each question, provide:
-1. The question
-2. Four options (A, B, C, D)
-3. The correct answer (mark with [CORRECT])
-4. A brief explanation
+    Args:
+        text: Topic or study material
+        num_questions: Number of questions wanted (at most QUIZ_MAX_QUESTIONS)
+        temperature: Sampling temperature
+        chunk_size: Questions requested per call
+        max_retries: Retry rounds for failed chunks
+        complete: Completion function of another backend (default: Groq)
 
-Format each question clearly with Q: prefix and options with A), B), C), D) prefixes."""
-    
-    # For quiz, use higher token limit (up to 2048 for complex queries)
-    max_tokens = min(max_tokens, 2048)
-    return generate_answer_groq(prompt, max_tokens, temperature)
+    Returns:
+        Up to `num_questions` unique questions as
+        {question, options, correct_index, explanation} dictionaries
+    """
+    if complete is None and not is_groq_available():
+        raise ValueError("Groq API is not configured. Set GROQ_API_KEY environment variable.")
+    if num_questions <= 0 or not text.strip():
+        return []
+    num_questions = min(num_questions, QUIZ_MAX_QUESTIONS)
+
+    questions: List[Dict[str, Any]] = []
+    seen: set = set()
+    pending = _split_counts(num_questions, chunk_size)
+    last_error = None
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        # Retries are pointless once the request ran out of time
+        check_deadline()
+        # The latest questions are the likeliest to be asked again
+        avoid = [q["question"] for q in questions[-QUIZ_AVOID_MAX:]]
+        futures = [
+            submit_with_context(
+                executor, _generate_quiz_chunk_groq, text, count, temperature, part + 1, len(pending), avoid, complete
+            )
+            for part, count in enumerate(pending)
+        ]
+
+        failed = []
+        # Collect in submission order so the quiz order is stable
+        for future, count in zip(futures, pending):
+            try:
+                chunk = future.result()
+            except GenerationAborted:
+                raise
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Quiz chunk failed (attempt {attempt + 1}): {e}")
+                failed.append(count)
+                continue
+            unique = dedupe_questions(chunk, seen, limit=count)
+            questions.extend(unique)
+            if len(unique) < count:
+                failed.append(count - len(unique))
+        pending = failed
+
+    if pending:
+        logger.warning(f"Quiz generation short by {sum(pending)} question(s) after {max_retries} retries")
+    if not questions and last_error is not None:
+        raise last_error
+    return questions[:num_questions]
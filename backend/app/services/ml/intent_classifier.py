@@ -2,10 +2,13 @@ from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 from typing import Dict, Any
 import os
+from .model_registry import registry
+from .model_artifacts import load_artifact, register_artifact
 
 # Model configuration
 MODEL_NAME = "distilbert-base-multilingual-cased"
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "../../models")
+REGISTRY_NAME = "intent"
 
 # Intent labels (customize based on your needs)
 INTENT_LABELS = [
@@ -18,29 +21,30 @@ INTENT_LABELS = [
     "other"
 ]
 
-# Initialize model and tokenizer
-tokenizer = None
-model = None
+def _load_intent_model():
+    """Load the intent classification model and tokenizer."""
+    tokenizer = AutoTokenizer.from_pretrained(
+        MODEL_NAME,
+        cache_dir=CACHE_DIR
+    )
+    model = AutoModelForSequenceClassification.from_pretrained(
+        MODEL_NAME,
+        num_labels=len(INTENT_LABELS),
+        cache_dir=CACHE_DIR
+    )
+    model.eval()  # Set to evaluation mode
+    return model, tokenizer
+
+register_artifact(
+    REGISTRY_NAME, MODEL_NAME, AutoModelForSequenceClassification, CACHE_DIR,
+    model_kwargs={"num_labels": len(INTENT_LABELS)},
+)
+# Prepared artifacts (python -m app.prepare_models) load offline; otherwise from the hub
+registry.register(REGISTRY_NAME, lambda: load_artifact(REGISTRY_NAME) or _load_intent_model())
 
 def load_model():
-    """Load the intent classification model."""
-    global tokenizer, model
-    
-    if tokenizer is None:
-        tokenizer = AutoTokenizer.from_pretrained(
-            MODEL_NAME,
-            cache_dir=CACHE_DIR
-        )
-    
-    if model is None:
-        model = AutoModelForSequenceClassification.from_pretrained(
-            MODEL_NAME,
-            num_labels=len(INTENT_LABELS),
-            cache_dir=CACHE_DIR
-        )
-        model.eval()  # Set to evaluation mode
-    
-    return model, tokenizer
+    """Load the intent classification model (once, via the model registry)."""
+    return registry.get(REGISTRY_NAME)
 
 def classify_intent(text: str, threshold: float = 0.5) -> Dict[str, Any]:
     """
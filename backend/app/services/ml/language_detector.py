@@ -1,5 +1,7 @@
 from langdetect import detect_langs, LangDetectException
 
+from .romanized import detect_romanized
+
 # Language code mapping
 LANG_MAP = {
     'hi': 'hi',
@@ -17,12 +19,20 @@ def detect_language(text: str) -> dict:
     """
     Detect the language of the input text using langdetect
     
+    Romanized Hindi, Telugu, Tamil and Kannada ("photosynthesis kya hai")
+    are recognized first, since langdetect reads them as European languages.
+    
     Args:
         text: Input text to detect language
         
     Returns:
-        Dictionary with language code and confidence
+        Dictionary with language code, confidence and whether the text is
+        an Indian language written in Latin script (romanized)
     """
+    romanized = detect_romanized(text)
+    if romanized is not None:
+        return {**romanized, "romanized": True}
+    
     try:
         # Get all language probabilities
         langs = detect_langs(text)
@@ -36,16 +46,19 @@ def detect_language(text: str) -> dict:
             
             return {
                 "language": language,
-                "confidence": float(confidence)
+                "confidence": float(confidence),
+                "romanized": False
             }
         else:
             return {
                 "language": "en",
-                "confidence": 0.5
+                "confidence": 0.5,
+                "romanized": False
             }
     except LangDetectException:
         # Default to English if detection fails
         return {
             "language": "en",
-            "confidence": 0.5
+            "confidence": 0.5,
+            "romanized": False
         }
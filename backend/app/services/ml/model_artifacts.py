@@ -0,0 +1,295 @@
+"""
+Prepared model artifacts
+`python -m app.prepare_models` downloads each registered model once and
+writes it to a versioned directory under MODEL_ARTIFACTS_DIR in
+safetensors format, with a manifest of file sizes and checksums:
+
+    model_artifacts/<registry name>/CURRENT
+    model_artifacts/<registry name>/model-<version>/{manifest.json, model.safetensors, config.json, tokenizer files}
+
+The service loaders use the CURRENT artifact when there is one: loading is
+offline, and the weights are tensors over a copy-on-write mapping of the
+safetensors file, so nothing is deserialized and every worker process on
+the host shares the same page-cache pages.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import transformers
+from transformers import AutoConfig, AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+MODEL_ARTIFACTS_DIR = os.getenv(
+    "MODEL_ARTIFACTS_DIR",
+    os.path.join(os.path.dirname(__file__), "../../../model_artifacts"),
+)
+# 0 ignores prepared artifacts and loads from the Hugging Face cache
+MODEL_ARTIFACTS = os.getenv("MODEL_ARTIFACTS", "1") == "1"
+# 0 reads the weights into process memory instead of mapping the file
+MODEL_ARTIFACTS_MMAP = os.getenv("MODEL_ARTIFACTS_MMAP", "1") == "1"
+
+WEIGHTS_FILE = "model.safetensors"
+MANIFEST_FILE = "manifest.json"
+
+# safetensors dtype names
+_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+class ArtifactSpec:
+    """How to fetch one registry model and rebuild it from its artifact."""
+
+    def __init__(
+        self,
+        name: str,
+        model_name: str,
+        model_class: Any,
+        cache_dir: str,
+        tokenizer_kwargs: Optional[Dict[str, Any]] = None,
+        model_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.model_name = model_name
+        self.model_class = model_class
+        self.cache_dir = cache_dir
+        self.tokenizer_kwargs = tokenizer_kwargs or {}
+        self.model_kwargs = model_kwargs or {}
+
+
+SPECS: Dict[str, ArtifactSpec] = {}
+
+
+def register_artifact(name: str, model_name: str, model_class: Any, cache_dir: str, **kwargs):
+    """Declare how `prepare_models` builds the artifact for registry model `name`."""
+    SPECS[name] = ArtifactSpec(name, model_name, model_class, cache_dir, **kwargs)
+
+
+def resolve_artifact_path(name: str, artifacts_dir: str = MODEL_ARTIFACTS_DIR) -> Optional[str]:
+    """Return the artifact directory named in artifacts_dir/<name>/CURRENT."""
+    pointer = os.path.join(artifacts_dir, name, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        dirname = f.read().strip()
+    return os.path.join(artifacts_dir, name, dirname) if dirname else None
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_entries(path: str) -> Dict[str, Dict[str, Any]]:
+    files = {}
+    for filename in sorted(os.listdir(path)):
+        if filename == MANIFEST_FILE:
+            continue
+        file_path = os.path.join(path, filename)
+        files[filename] = {"bytes": os.path.getsize(file_path), "sha256": _sha256(file_path)}
+    return files
+
+
+def verify_artifact(path: str, checksums: bool = True) -> List[str]:
+    """
+    Compare an artifact's files with its manifest.
+
+    Args:
+        path: Artifact directory
+        checksums: Also recompute SHA-256 (reads every file); otherwise only sizes
+
+    Returns:
+        Problems found; empty if the artifact is intact
+    """
+    problems = []
+    for filename, expected in read_manifest(path)["files"].items():
+        file_path = os.path.join(path, filename)
+        if not os.path.exists(file_path):
+            problems.append(f"{filename}: missing")
+        elif os.path.getsize(file_path) != expected["bytes"]:
+            problems.append(f"{filename}: {os.path.getsize(file_path)} bytes, expected {expected['bytes']}")
+        elif checksums and _sha256(file_path) != expected["sha256"]:
+            problems.append(f"{filename}: checksum mismatch")
+    return problems
+
+
+def mmap_state_dict(path: str) -> Dict[str, torch.Tensor]:
+    """
+    Tensors of a safetensors file over a copy-on-write mapping of it.
+
+    Pages are read on first use and stay shared with the page cache (and
+    so with other processes mapping the same file) unless written to.
+    """
+    with open(path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    data_start = 8 + header_len
+    tensors = {}
+    for key, info in header.items():
+        if key == "__metadata__":
+            continue
+        dtype = _DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[key] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // torch.tensor([], dtype=dtype).element_size()
+        tensors[key] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + start).reshape(info["shape"])
+    return tensors
+
+
+def _no_init_weights():
+    """Skip random weight initialization while building a model that is about to be overwritten."""
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:
+        return contextlib.nullcontext()
+    return no_init_weights()
+
+
+def _load_mapped_model(spec: ArtifactSpec, path: str):
+    config = AutoConfig.from_pretrained(path, local_files_only=True)
+    state = mmap_state_dict(os.path.join(path, WEIGHTS_FILE))
+    with _no_init_weights():
+        model = spec.model_class.from_config(config)
+    missing, _ = model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    # Tied weights (e.g. T5's shared embeddings) are stored once; anything
+    # else missing would be left uninitialized
+    mapped = {tensor.data_ptr() for tensor in state.values()}
+    named = {**dict(model.named_parameters(remove_duplicate=False)), **dict(model.named_buffers(remove_duplicate=False))}
+    untied = [key for key in missing if key in named and named[key].data_ptr() not in mapped]
+    if untied:
+        raise ValueError(f"Weights missing from {WEIGHTS_FILE}: {', '.join(untied[:5])}")
+    return model
+
+
+def load_artifact(name: str) -> Optional[Tuple[Any, Any]]:
+    """
+    Load (model, tokenizer) from the prepared artifact of registry model `name`.
+
+    Returns:
+        None if there is no usable artifact; callers then load from the hub
+    """
+    spec = SPECS.get(name)
+    if not MODEL_ARTIFACTS or spec is None:
+        return None
+    path = resolve_artifact_path(name)
+    if path is None:
+        return None
+    problems = verify_artifact(path, checksums=False)
+    if problems:
+        logger.warning(f"Ignoring model artifact {path}: {'; '.join(problems)}")
+        return None
+
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True, **spec.tokenizer_kwargs)
+    model = None
+    if MODEL_ARTIFACTS_MMAP:
+        try:
+            model = _load_mapped_model(spec, path)
+        except Exception as e:
+            logger.warning(f"Memory-mapped load of {path} failed, reading it instead: {e}")
+    if model is None:
+        model = spec.model_class.from_pretrained(path, local_files_only=True, use_safetensors=True)
+
+    if torch.cuda.is_available():
+        model = model.to("cuda")
+    elif any(param.dtype in (torch.float16, torch.bfloat16) for param in model.parameters()):
+        # Half-precision artifacts are meant for GPUs; CPU kernels want float32
+        model = model.float()
+    model.eval()
+    logger.info(f"Loaded model '{name}' from artifact {path}")
+    return model, tokenizer
+
+
+def prepare_artifact(
+    name: str,
+    artifacts_dir: str = MODEL_ARTIFACTS_DIR,
+    version: Optional[str] = None,
+    dtype: Optional[str] = None,
+    make_current: bool = True,
+) -> str:
+    """
+    Download registry model `name` and write it as a new artifact version.
+
+    Args:
+        name: Registry name (see SPECS)
+        artifacts_dir: Root artifacts directory
+        version: Version label (default: timestamp)
+        dtype: Optional torch dtype name to store the weights in, e.g. "float16"
+        make_current: Point CURRENT at the new version
+
+    Returns:
+        The artifact directory
+    """
+    spec = SPECS[name]
+    version = version or time.strftime("%Y%m%d%H%M%S")
+    tokenizer = AutoTokenizer.from_pretrained(spec.model_name, cache_dir=spec.cache_dir, **spec.tokenizer_kwargs)
+    model = spec.model_class.from_pretrained(spec.model_name, cache_dir=spec.cache_dir, **spec.model_kwargs)
+    if dtype:
+        model = model.to(getattr(torch, dtype))
+
+    model_dir = os.path.join(artifacts_dir, name)
+    os.makedirs(model_dir, exist_ok=True)
+    dirname = f"model-{version}"
+    tmp_path = os.path.join(model_dir, f".{dirname}.tmp")
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    # One weights file, so it can be mapped in one piece
+    model.save_pretrained(tmp_path, safe_serialization=True, max_shard_size="1000GB")
+    tokenizer.save_pretrained(tmp_path)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "schema_version": SCHEMA_VERSION,
+            "name": name,
+            "model_name": spec.model_name,
+            "model_class": spec.model_class.__name__,
+            "dtype": str(next(model.parameters()).dtype).replace("torch.", ""),
+            "version": version,
+            "built_at": int(time.time()),
+            "torch_version": torch.__version__,
+            "transformers_version": transformers.__version__,
+            "files": _file_entries(tmp_path),
+        }, f, indent=1)
+
+    path = os.path.join(model_dir, dirname)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    if make_current:
+        pointer_tmp = os.path.join(model_dir, ".CURRENT.tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(dirname + "\n")
+        os.replace(pointer_tmp, os.path.join(model_dir, "CURRENT"))
+    return path
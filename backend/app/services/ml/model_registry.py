@@ -0,0 +1,211 @@
+"""
+Central model registry
+Each model is loaded exactly once, even under concurrent first requests
+(callers wait on a shared future), its memory footprint is tracked, and
+least-recently-used models are evicted when MODEL_MEMORY_BUDGET_MB is
+exceeded.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 0 disables eviction
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
+Loader = Callable[[], Tuple[Any, Any]]
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process (Linux), or 0 if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def model_footprint(model: Any) -> Dict[str, Any]:
+    """Parameter and buffer bytes, dtypes and device of a torch model."""
+    param_bytes = 0
+    buffer_bytes = 0
+    dtypes: Dict[str, int] = {}
+    device = None
+    try:
+        for param in model.parameters():
+            size = param.numel() * param.element_size()
+            param_bytes += size
+            dtype = str(param.dtype).replace("torch.", "")
+            dtypes[dtype] = dtypes.get(dtype, 0) + size
+            device = device or str(param.device)
+        for buffer in model.buffers():
+            buffer_bytes += buffer.numel() * buffer.element_size()
+    except AttributeError:
+        pass
+    return {
+        "param_bytes": param_bytes,
+        "buffer_bytes": buffer_bytes,
+        "dtypes": dtypes,
+        "device": device,
+    }
+
+
+class _Entry:
+    __slots__ = ("name", "future", "footprint", "rss_delta", "load_seconds", "loaded_at", "last_used", "hits")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.future: Future = Future()
+        self.footprint: Dict[str, Any] = {}
+        self.rss_delta = 0
+        self.load_seconds = 0.0
+        self.loaded_at = 0.0
+        self.last_used = 0.0
+        self.hits = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.footprint.get("param_bytes", 0) + self.footprint.get("buffer_bytes", 0)
+
+
+class ModelRegistry:
+    """Thread-safe, budgeted registry of lazily loaded (model, tokenizer) pairs."""
+
+    def __init__(self, budget_mb: int = MODEL_MEMORY_BUDGET_MB):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self._loaders: Dict[str, Loader] = {}
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def register(self, name: str, loader: Loader):
+        """Register a loader returning (model, tokenizer); does not load it."""
+        self._loaders[name] = loader
+
+    def names(self) -> List[str]:
+        return list(self._loaders)
+
+    def get(self, name: str) -> Tuple[Any, Any]:
+        """
+        Return (model, tokenizer), loading it on first use.
+
+        Concurrent callers for a model that is still loading wait for the
+        same load instead of starting another one. A failed load is not
+        cached, so the next call retries.
+
+        Raises:
+            KeyError: If no loader is registered under `name`
+        """
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._lock:
+            entry = self._entries.get(name)
+            owner = entry is None
+            if owner:
+                entry = _Entry(name)
+                self._entries[name] = entry
+            else:
+                self._entries.move_to_end(name)
+            entry.last_used = time.time()
+            entry.hits += 1
+
+        if owner:
+            self._load(entry)
+        return entry.future.result()
+
+    def _load(self, entry: _Entry):
+        logger.info(f"Loading model '{entry.name}'...")
+        rss_before = _rss_bytes()
+        start = time.time()
+        try:
+            model, tokenizer = self._loaders[entry.name]()
+        except BaseException as e:
+            with self._lock:
+                if self._entries.get(entry.name) is entry:
+                    del self._entries[entry.name]
+            entry.future.set_exception(e)
+            logger.error(f"Failed to load model '{entry.name}': {e}")
+            return
+
+        entry.load_seconds = time.time() - start
+        entry.loaded_at = time.time()
+        entry.footprint = model_footprint(model)
+        entry.rss_delta = max(0, _rss_bytes() - rss_before)
+        entry.future.set_result((model, tokenizer))
+        logger.info(
+            f"Loaded model '{entry.name}' in {entry.load_seconds:.1f}s "
+            f"({entry.nbytes / 1e6:.0f} MB parameters)"
+        )
+        self._enforce_budget(keep=entry.name)
+
+    def _loaded_bytes(self) -> int:
+        return sum(e.nbytes for e in self._entries.values() if e.future.done() and not e.future.exception())
+
+    def _enforce_budget(self, keep: str):
+        """Evict least-recently-used models (other than `keep`) until under budget."""
+        if self.budget_bytes <= 0:
+            return
+        with self._lock:
+            for name in list(self._entries):
+                if self._loaded_bytes() <= self.budget_bytes:
+                    break
+                entry = self._entries[name]
+                if name == keep or not entry.future.done():
+                    continue
+                # Requests still holding the model keep it alive until they finish
+                del self._entries[name]
+                self.evictions += 1
+                logger.info(f"Evicted model '{name}' to stay within {self.budget_bytes / 1e6:.0f} MB")
+
+    def unload(self, name: str) -> bool:
+        """Drop a loaded model; returns False if it was not loaded."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or not entry.future.done():
+                return False
+            del self._entries[name]
+            return True
+
+    def is_loaded(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.future.done() and entry.future.exception() is None
+
+    def loaded_models(self) -> Dict[str, Tuple[Any, Any]]:
+        """(model, tokenizer) of every loaded model, without touching LRU order."""
+        with self._lock:
+            entries = list(self._entries.values())
+        return {e.name: e.future.result() for e in entries if e.future.done() and e.future.exception() is None}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self._entries.values())
+        models = []
+        for entry in entries:
+            loading = not entry.future.done()
+            models.append({
+                "name": entry.name,
+                "status": "loading" if loading else "loaded",
+                "bytes": entry.nbytes,
+                "rss_delta_bytes": entry.rss_delta,
+                "load_seconds": round(entry.load_seconds, 3),
+                "last_used": entry.last_used,
+                "hits": entry.hits,
+                **entry.footprint,
+            })
+        return {
+            "budget_bytes": self.budget_bytes,
+            "loaded_bytes": sum(m["bytes"] for m in models),
+            "evictions": self.evictions,
+            "registered": self.names(),
+            "models": models,
+        }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,289 @@
+"""
+Priority lanes for generation
+Requests carry a priority class (interactive, standard or bulk) in a
+context variable. Each generation backend is fronted by a scheduler with a
+fixed number of slots that always serves the highest waiting class first,
+keeps slots in reserve for interactive requests, and guarantees lower
+classes a minimum share of grants so bulk work is never starved.
+Fan-out work (quiz chunks, notes map steps) is queued on a PriorityExecutor,
+so it is ordered by class before it even reaches a scheduler.
+"""
+
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+from .deadlines import DeadlineExceeded, current_deadline
+
+# Highest priority first
+PRIORITIES = ("interactive", "standard", "bulk")
+DEFAULT_PRIORITY = "standard"
+
+# Minimum fraction of grants a waiting class receives while higher classes are busy
+PRIORITY_MIN_SHARES = {
+    "standard": float(os.getenv("PRIORITY_MIN_SHARE_STANDARD", "0.2")),
+    "bulk": float(os.getenv("PRIORITY_MIN_SHARE_BULK", "0.1")),
+}
+# Slots only interactive requests may use
+PRIORITY_RESERVED_SLOTS = int(os.getenv("PRIORITY_RESERVED_SLOTS", "1"))
+LOCAL_GENERATION_SLOTS = int(os.getenv("LOCAL_GENERATION_SLOTS", "2"))
+# How often a queued request re-checks its deadline and cancellation
+DEADLINE_POLL_INTERVAL = 0.1
+
+# Default class per endpoint; the X-Priority header can lower it (raise it
+# only for trusted clients, see resolve_priority)
+ENDPOINT_PRIORITIES = {
+    "/generate-answer": "interactive",
+    "/generate-answer/stream": "interactive",
+    "/ws/chat": "interactive",
+    "/translate": "interactive",
+    "/generate-notes": "standard",
+    "/generate-notes/stream": "standard",
+    "/generate-quiz": "standard",
+    "/jobs": "bulk",
+}
+
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("generation_priority", default=DEFAULT_PRIORITY)
+
+
+def normalize_priority(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip().lower()
+    return value if value in PRIORITIES else None
+
+
+def resolve_priority(requested: Optional[str], default: str, may_raise: bool = False) -> str:
+    """
+    Priority class for a request that asked for `requested` on an endpoint
+    whose class is `default`. Clients may always ask for less; asking for
+    more is honored only with `may_raise`, so an anonymous client cannot
+    move quiz or job work into the slots reserved for interactive chat.
+    """
+    requested = normalize_priority(requested)
+    if requested is None:
+        return default
+    if may_raise or PRIORITIES.index(requested) >= PRIORITIES.index(default):
+        return requested
+    return default
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+def set_priority(priority: str) -> contextvars.Token:
+    return _current_priority.set(normalize_priority(priority) or DEFAULT_PRIORITY)
+
+
+@contextmanager
+def use_priority(priority: str) -> Iterator[None]:
+    """Run the enclosed block (and work it submits via submit_with_context) at `priority`."""
+    token = set_priority(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def submit_with_context(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """executor.submit that carries the caller's priority and deadline into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class PriorityScheduler:
+    """Counting semaphore whose waiters are served by priority class."""
+
+    def __init__(self, name: str, capacity: int, reserved: int = PRIORITY_RESERVED_SLOTS):
+        self.name = name
+        self.capacity = max(1, capacity)
+        # Never reserve every slot, or only interactive requests could run
+        self.reserved = max(0, min(reserved, self.capacity - 1))
+        self.running = 0
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Deque[threading.Event]] = {p: deque() for p in PRIORITIES}
+        # Grants that went to another class while this class was waiting
+        self._skipped = {p: 0 for p in PRIORITIES}
+        self.granted = {p: 0 for p in PRIORITIES}
+
+    def _limit(self, priority: str) -> int:
+        return self.capacity if priority == "interactive" else self.capacity - self.reserved
+
+    def _starved(self, priority: str) -> bool:
+        share = PRIORITY_MIN_SHARES.get(priority)
+        if not share:
+            return False
+        return self._skipped[priority] >= max(0, round(1 / share) - 1)
+
+    def _dispatch(self):
+        """Hand free slots to waiters; call with the lock held."""
+        while True:
+            if self.running >= self.capacity:
+                return
+            # A starved class may also take a reserved slot; that is what guarantees its share
+            starved = [p for p in PRIORITIES if self._waiters[p] and self._starved(p)]
+            candidates = starved or [p for p in PRIORITIES if self._waiters[p] and self.running < self._limit(p)]
+            if not candidates:
+                return
+            chosen = candidates[0]
+            for p in PRIORITIES:
+                if p != chosen and self._waiters[p]:
+                    self._skipped[p] += 1
+            self._skipped[chosen] = 0
+            self.running += 1
+            self.granted[chosen] += 1
+            self._waiters[chosen].popleft().set()
+
+    def acquire(self, priority: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Wait for a slot. Raises DeadlineExceeded or RequestCancelled (and
+        leaves the queue) if the current request's deadline passes first,
+        and DeadlineExceeded after `timeout` seconds without a slot.
+        """
+        priority = normalize_priority(priority) or current_priority()
+        with self._lock:
+            if self.running < self._limit(priority) and not any(self._waiters.values()):
+                self.running += 1
+                self.granted[priority] += 1
+                return
+            event = threading.Event()
+            self._waiters[priority].append(event)
+            self._dispatch()
+        deadline = current_deadline()
+        give_up_at = time.monotonic() + timeout if timeout is not None else None
+        poll = DEADLINE_POLL_INTERVAL if deadline is not None or give_up_at is not None else None
+        while not event.wait(poll):
+            timed_out = give_up_at is not None and time.monotonic() >= give_up_at
+            if timed_out or (deadline is not None and deadline.is_set()):
+                with self._lock:
+                    if event.is_set():
+                        # Granted while the deadline passed; the caller releases it
+                        return
+                    self._waiters[priority].remove(event)
+                if deadline is not None:
+                    deadline.check()
+                raise DeadlineExceeded(f"No {self.name} generation slot within {timeout:.1f}s")
+
+    def release(self):
+        with self._lock:
+            self.running -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold one generation slot at `priority` (default: the current request's)."""
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "reserved_for_interactive": self.reserved,
+                "running": self.running,
+                "waiting": {p: len(q) for p, q in self._waiters.items()},
+                "granted": dict(self.granted),
+            }
+
+
+class PriorityExecutor(Executor):
+    """
+    Thread pool whose queue is served by priority class (FIFO within a
+    class) instead of first come, first served. Like PriorityScheduler,
+    `reserved` workers only take interactive work, so a backlog of bulk
+    calls cannot occupy every worker while an interactive one waits.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "priority", reserved: int = PRIORITY_RESERVED_SLOTS):
+        self.max_workers = max(1, max_workers)
+        self.reserved = max(0, min(reserved, self.max_workers - 1))
+        self.thread_name_prefix = thread_name_prefix
+        self._cond = threading.Condition()
+        # (class rank, seq, priority, future, fn, args, kwargs)
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._threads: list = []
+        self._idle = 0
+        # Workers running non-interactive work
+        self._busy_other = 0
+        self._shutdown = False
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue `fn` at the caller's current priority."""
+        priority = current_priority()
+        future: Future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            heapq.heappush(self._queue, (PRIORITIES.index(priority), next(self._seq), priority, future, fn, args, kwargs))
+            if self._idle == 0 and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work, name=f"{self.thread_name_prefix}_{len(self._threads)}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+        return future
+
+    def _runnable(self) -> bool:
+        """Whether the most urgent queued item may start now; call with the lock held."""
+        if not self._queue:
+            return False
+        return self._queue[0][2] == "interactive" or self._busy_other < self.max_workers - self.reserved
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._runnable() and not (self._shutdown and not self._queue):
+                    self._cond.wait()
+                self._idle -= 1
+                if not self._queue:
+                    return
+                _, _, priority, future, fn, args, kwargs = heapq.heappop(self._queue)
+                other = priority != "interactive"
+                if other:
+                    self._busy_other += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                if other:
+                    with self._cond:
+                        self._busy_other -= 1
+                        self._cond.notify_all()
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                for item in self._queue:
+                    item[3].cancel()
+                self._queue.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in list(self._threads):
+                thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waiting = {p: 0 for p in PRIORITIES}
+            for item in self._queue:
+                waiting[item[2]] += 1
+            return {"workers": len(self._threads), "busy_non_interactive": self._busy_other, "waiting": waiting}
+
+
+local_scheduler = PriorityScheduler("local", LOCAL_GENERATION_SLOTS)
@@ -0,0 +1,217 @@
+"""
+Quiz parsing and validation
+Turns LLM output (JSON or legacy "Q: / A) ... [CORRECT]" text) into
+structured questions of the form
+{question, options, correct_index, explanation}
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+NUM_OPTIONS = 4
+OPTION_LETTERS = "ABCD"
+
+# "A) text", "A. text", "(A) text" prefixes the model sometimes keeps inside options
+OPTION_PREFIX_RE = re.compile(r"^\s*\(?([A-Da-d])[\).:]\s+")
+CORRECT_MARKER_RE = re.compile(r"\s*\[(?:CORRECT|ANSWER)\]\s*", re.IGNORECASE)
+QUESTION_SPLIT_RE = re.compile(r"^\s*\**\s*Q\d*\s*[:.)]\s*\**\s*", re.MULTILINE)
+OPTION_LINE_RE = re.compile(r"^\s*\**\(?([A-D])[\).]\**\s*(.+)$")
+ANSWER_LINE_RE = re.compile(r"^\s*\**\s*(?:correct\s+)?answer\s*\**\s*[:\-]\s*\**\s*\(?([A-D])\b", re.IGNORECASE)
+EXPLANATION_RE = re.compile(r"^\s*\**\s*explanation\s*\**\s*[:\-]\s*", re.IGNORECASE)
+# Markdown emphasis around a whole field ("**Photosynthesis**"); asterisks
+# inside the text ("2*3", "a*b") are content
+EMPHASIS_RE = re.compile(r"^\*{1,2}\s*|\s*\*{1,2}$")
+
+
+def _clean(text: Any) -> str:
+    """Strip leading/trailing markdown emphasis and surrounding whitespace."""
+    if not isinstance(text, str):
+        return ""
+    return EMPHASIS_RE.sub("", text.strip()).strip()
+
+
+def _strip_code_fence(raw: str) -> str:
+    """Remove a ```json ... ``` fence if the model wrapped its output in one."""
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = re.sub(r"^```[a-zA-Z]*\s*", "", raw)
+        raw = re.sub(r"\s*```$", "", raw)
+    return raw
+
+
+def _resolve_correct_index(item: Dict[str, Any], options: List[str]) -> Optional[int]:
+    """Accept an index, a letter or the answer text for the correct option."""
+    for key in ("correct_index", "correct", "answer", "correct_answer"):
+        value = item.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, int):
+            return value if 0 <= value < len(options) else None
+        if isinstance(value, str):
+            value = value.strip()
+            if value.isdigit():
+                index = int(value)
+                return index if 0 <= index < len(options) else None
+            match = OPTION_PREFIX_RE.match(value + " ")
+            if len(value) == 1 or (match and match.end() >= len(value)):
+                letter = value[0].upper()
+                if letter in OPTION_LETTERS[:len(options)]:
+                    return OPTION_LETTERS.index(letter)
+            lowered = _clean(OPTION_PREFIX_RE.sub("", value)).lower()
+            for index, option in enumerate(options):
+                if option.lower() == lowered:
+                    return index
+    return None
+
+
+def normalize_question(item: Any) -> Optional[Dict[str, Any]]:
+    """
+    Validate a single question object.
+
+    Returns:
+        The normalized question, or None if it is not a usable
+        four-option multiple-choice question.
+    """
+    if not isinstance(item, dict):
+        return None
+
+    question = _clean(item.get("question") or item.get("q"))
+    raw_options = item.get("options") or item.get("choices")
+    if not question or not isinstance(raw_options, list):
+        return None
+
+    options = [_clean(OPTION_PREFIX_RE.sub("", CORRECT_MARKER_RE.sub("", str(o)))) for o in raw_options]
+    if len(options) != NUM_OPTIONS or not all(options):
+        return None
+    if len({o.lower() for o in options}) != NUM_OPTIONS:
+        return None
+
+    correct_index = _resolve_correct_index(item, options)
+    if correct_index is None:
+        return None
+
+    return {
+        "question": question,
+        "options": options,
+        "correct_index": correct_index,
+        "explanation": _clean(item.get("explanation")),
+    }
+
+
+def parse_quiz_json(raw: str) -> List[Dict[str, Any]]:
+    """
+    Parse a JSON quiz completion.
+
+    Accepts either {"questions": [...]} or a bare list. Invalid questions are
+    dropped rather than failing the whole completion.
+
+    Raises:
+        ValueError: If the payload is not valid JSON of a supported shape
+    """
+    try:
+        data = json.loads(_strip_code_fence(raw))
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Quiz completion is not valid JSON: {e}")
+
+    if isinstance(data, dict):
+        data = data.get("questions")
+    if not isinstance(data, list):
+        raise ValueError("Quiz completion does not contain a list of questions")
+
+    questions = []
+    for item in data:
+        question = normalize_question(item)
+        if question is not None:
+            questions.append(question)
+    return questions
+
+
+def parse_quiz_text(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse the legacy free-text quiz format produced by local models.
+
+    Blocks start with "Q:" (or "Q1:"), options are "A) ..." lines, and the
+    correct option carries a [CORRECT] marker or is named in an "Answer:" line.
+    """
+    questions = []
+    for block in QUESTION_SPLIT_RE.split(text or "")[1:]:
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        if not lines:
+            continue
+
+        question = _clean(lines[0])
+        options: List[str] = []
+        correct_index = None
+        explanation_lines: List[str] = []
+
+        for line in lines[1:]:
+            if explanation_lines:
+                explanation_lines.append(line)
+                continue
+            option_match = OPTION_LINE_RE.match(line)
+            if option_match and len(options) < NUM_OPTIONS:
+                option_text = option_match.group(2)
+                if CORRECT_MARKER_RE.search(option_text):
+                    correct_index = len(options)
+                options.append(_clean(CORRECT_MARKER_RE.sub(" ", option_text)))
+                continue
+            answer_match = ANSWER_LINE_RE.match(line)
+            if answer_match:
+                correct_index = OPTION_LETTERS.index(answer_match.group(1).upper())
+                continue
+            if EXPLANATION_RE.match(line) or len(options) == NUM_OPTIONS:
+                explanation_lines.append(EXPLANATION_RE.sub("", line))
+
+        normalized = normalize_question({
+            "question": question,
+            "options": options,
+            "correct_index": correct_index,
+            "explanation": " ".join(explanation_lines),
+        })
+        if normalized is not None:
+            questions.append(normalized)
+    return questions
+
+
+def question_key(question: Dict[str, Any]) -> str:
+    """Key used to deduplicate questions across independently generated chunks."""
+    words = re.findall(r"\w+", question["question"].lower())
+    return " ".join(words)
+
+
+def dedupe_questions(
+    questions: List[Dict[str, Any]], seen: Optional[set] = None, limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Drop questions whose normalized text was already seen (updates `seen`).
+    With `limit`, stops after that many unique questions, so extras beyond it
+    are not recorded as seen.
+    """
+    seen = set() if seen is None else seen
+    unique = []
+    for question in questions:
+        if limit is not None and len(unique) >= limit:
+            break
+        key = question_key(question)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(question)
+    return unique
+
+
+def format_quiz_text(questions: List[Dict[str, Any]]) -> str:
+    """Render structured questions in the legacy text format clients already parse."""
+    blocks = []
+    for question in questions:
+        lines = [f"Q: {question['question']}"]
+        for index, option in enumerate(question["options"]):
+            marker = " [CORRECT]" if index == question["correct_index"] else ""
+            lines.append(f"{OPTION_LETTERS[index]}) {option}{marker}")
+        if question.get("explanation"):
+            lines.append(f"Explanation: {question['explanation']}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
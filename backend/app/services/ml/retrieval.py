@@ -0,0 +1,413 @@
+"""
+BM25 retrieval over curriculum passages
+A versioned, read-only index directory built offline by
+`python -m app.build_index`. Each subject has its own inverted index stored
+as NumPy arrays (CSR-style postings: per-term offsets into doc id and term
+frequency arrays) that are memory-mapped at query time, so worker
+processes share the pages and opening an index costs almost nothing.
+
+generate_answer uses the top passages to ground its prompt and, for
+definition questions with a high-confidence extractive match, answers
+from the passage without calling a model.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .text_chunker import TOKENS_PER_WORD, split_into_chunks
+from ..content_store import normalize_key
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+RETRIEVAL_INDEX_DIR = os.getenv(
+    "RETRIEVAL_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "../../../retrieval_index"),
+)
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1") == "1"
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+# Passages covering less of the question's IDF mass are not used for grounding
+RETRIEVAL_MIN_COVERAGE = float(os.getenv("RETRIEVAL_MIN_COVERAGE", "0.5"))
+# Definition questions are answered from the passage at or above this coverage
+RETRIEVAL_EXTRACTIVE_MIN_COVERAGE = float(os.getenv("RETRIEVAL_EXTRACTIVE_MIN_COVERAGE", "0.9"))
+# Token budget for the excerpts added to a grounded prompt
+RETRIEVAL_CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "250"))
+PASSAGE_TOKENS = 120
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be by do does did for from has have how in into is it its of on or
+that the their this to was were what when where which who why will with you your
+define definition meaning mean means meant term explain describe tell me about please
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords, with plural 's' stripped."""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _subject_dirname(subject: str) -> str:
+    return re.sub(r"[^\w]+", "_", normalize_key(subject)).strip("_") or "general"
+
+
+def resolve_index_path(index_dir: str = RETRIEVAL_INDEX_DIR) -> Optional[str]:
+    """Return the index version directory named in index_dir/CURRENT."""
+    pointer = os.path.join(index_dir, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        name = f.read().strip()
+    return os.path.join(index_dir, name) if name else None
+
+
+class SubjectIndex:
+    """Memory-mapped BM25 index of one subject's passages."""
+
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        self.path = path
+        self.num_docs = meta["num_docs"]
+        self.avgdl = meta["avgdl"]
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        with open(os.path.join(path, "titles.json"), encoding="utf-8") as f:
+            self.titles: List[str] = json.load(f)
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.offsets = load("offsets")
+        self.doc_ids = load("doc_ids")
+        self.tfs = load("tfs")
+        self.doc_lens = load("doc_lens")
+        self.idf = load("idf")
+        self.text_offsets = load("text_offsets")
+        self.texts = np.memmap(os.path.join(path, "texts.bin"), dtype=np.uint8, mode="r")
+        # Length normalization is per document; compute it once
+        self._norm = (BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens / max(self.avgdl, 1e-9))).astype(np.float32)
+
+    def text(self, doc_id: int) -> str:
+        start, end = int(self.text_offsets[doc_id]), int(self.text_offsets[doc_id + 1])
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+    def _postings(self, term_id: int):
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def search(self, terms: List[str], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Score passages against query terms.
+
+        Returns:
+            Up to `top_k` {doc_id, score, coverage} dictionaries, best first.
+            coverage is the share of the query's IDF mass found in the
+            passage; terms missing from the vocabulary count with the
+            largest IDF, so unknown words lower it.
+        """
+        if not terms or self.num_docs == 0:
+            return []
+        term_ids = [self.vocab.get(term) for term in terms]
+        unknown_idf = float(self.idf.max()) if len(self.idf) else 1.0
+        total_idf = sum(float(self.idf[t]) if t is not None else unknown_idf for t in term_ids)
+
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term_id in term_ids:
+            if term_id is None:
+                continue
+            docs, tfs = self._postings(term_id)
+            tfs = tfs.astype(np.float32)
+            scores[docs] += self.idf[term_id] * tfs * (BM25_K1 + 1) / (tfs + self._norm[docs])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return []
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        results = []
+        for doc_id in candidates:
+            matched = 0.0
+            for term_id in term_ids:
+                if term_id is None:
+                    continue
+                docs, _ = self._postings(term_id)
+                position = np.searchsorted(docs, doc_id)
+                if position < len(docs) and docs[position] == doc_id:
+                    matched += float(self.idf[term_id])
+            results.append({
+                "doc_id": int(doc_id),
+                "score": float(scores[doc_id]),
+                "coverage": matched / total_idf if total_idf > 0 else 0.0,
+            })
+        return results
+
+
+class Retriever:
+    """Per-subject BM25 search over a built index directory (subjects open lazily)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.meta: Dict[str, Any] = {}
+        self._subjects: Dict[str, SubjectIndex] = {}
+        self._lock = threading.Lock()
+
+        if not path or not os.path.exists(os.path.join(path, "meta.json")):
+            logger.info("No retrieval index found")
+            return
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("schema_version") != SCHEMA_VERSION:
+            logger.warning(f"Ignoring retrieval index {path}: schema {meta.get('schema_version')} != {SCHEMA_VERSION}")
+            return
+        self.meta = meta
+        logger.info(f"Loaded retrieval index {path} ({len(meta['subjects'])} subjects)")
+
+    @property
+    def available(self) -> bool:
+        return RETRIEVAL_ENABLED and bool(self.meta)
+
+    def _subject(self, dirname: str) -> SubjectIndex:
+        with self._lock:
+            index = self._subjects.get(dirname)
+            if index is None:
+                index = SubjectIndex(os.path.join(self.path, dirname), self.meta["subjects"][dirname])
+                self._subjects[dirname] = index
+            return index
+
+    def search(self, query: str, subject: Optional[str] = None, top_k: int = RETRIEVAL_TOP_K) -> List[Dict[str, Any]]:
+        """
+        Find the passages that best match `query`.
+
+        Args:
+            query: Question or search text
+            subject: Subject to search; all subjects when None or not indexed
+            top_k: Number of passages to return
+
+        Returns:
+            {subject, title, text, score, coverage} dictionaries, best first
+        """
+        if not self.available:
+            return []
+        dirnames = list(self.meta["subjects"])
+        if subject and _subject_dirname(subject) in self.meta["subjects"]:
+            dirnames = [_subject_dirname(subject)]
+        terms = list(dict.fromkeys(tokenize(query)))
+
+        hits = []
+        for dirname in dirnames:
+            index = self._subject(dirname)
+            for hit in index.search(terms, top_k):
+                hits.append({
+                    "subject": self.meta["subjects"][dirname]["name"],
+                    "title": index.titles[hit["doc_id"]],
+                    "text": index.text(hit["doc_id"]),
+                    "score": round(hit["score"], 4),
+                    "coverage": round(hit["coverage"], 4),
+                })
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:top_k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "available": self.available,
+            "open_subjects": len(self._subjects),
+            "build_version": self.meta.get("build_version"),
+            "subjects": {d: s["num_docs"] for d, s in self.meta.get("subjects", {}).items()},
+        }
+
+
+class IndexWriter:
+    """Builds a new index version; it only becomes visible on commit()."""
+
+    def __init__(self, index_dir: str, version: str, source: str = ""):
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_dir = index_dir
+        self.version = version
+        self.source = source
+        self.dirname = f"index-{version}"
+        self._tmp_path = os.path.join(index_dir, f".{self.dirname}.tmp")
+        # subject dirname -> (subject name, [(title, passage)])
+        self._passages: Dict[str, tuple] = {}
+
+    def add(self, subject: str, title: str, text: str, passage_tokens: int = PASSAGE_TOKENS) -> int:
+        """Split a document into passages and queue them; returns the passage count."""
+        _, passages = self._passages.setdefault(_subject_dirname(subject), (subject, []))
+        chunks = [chunk for chunk in split_into_chunks(text, passage_tokens) if tokenize(chunk)]
+        passages.extend((title, chunk) for chunk in chunks)
+        return len(chunks)
+
+    @staticmethod
+    def _write_subject(path: str, passages: List[tuple]) -> Dict[str, Any]:
+        os.makedirs(path)
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        doc_lens = np.zeros(len(passages), dtype=np.int32)
+        for doc_id, (title, text) in enumerate(passages):
+            tokens = tokenize(f"{title}\n{text}")
+            doc_lens[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        # Postings sorted by term, then by document (search relies on both)
+        term_array = np.asarray(term_ids, dtype=np.int32)
+        doc_array = np.asarray(doc_ids, dtype=np.int32)
+        order = np.lexsort((doc_array, term_array))
+        df = np.bincount(term_array, minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+        num_docs = len(passages)
+        idf = np.log(1 + (num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        encoded = [text.encode("utf-8") for _, text in passages]
+        text_offsets = np.zeros(num_docs + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "doc_ids.npy"), doc_array[order])
+        np.save(os.path.join(path, "tfs.npy"), np.minimum(np.asarray(tfs)[order], 65535).astype(np.uint16))
+        np.save(os.path.join(path, "doc_lens.npy"), doc_lens)
+        np.save(os.path.join(path, "idf.npy"), idf)
+        np.save(os.path.join(path, "text_offsets.npy"), text_offsets)
+        with open(os.path.join(path, "texts.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False, separators=(",", ":"))
+        with open(os.path.join(path, "titles.json"), "w", encoding="utf-8") as f:
+            json.dump([title for title, _ in passages], f, ensure_ascii=False)
+        return {
+            "num_docs": num_docs,
+            "num_terms": len(vocab),
+            "avgdl": float(doc_lens.mean()) if num_docs else 0.0,
+        }
+
+    def commit(self, make_current: bool = True) -> str:
+        """Write every subject index, move the version into place and optionally point CURRENT at it."""
+        if os.path.exists(self._tmp_path):
+            shutil.rmtree(self._tmp_path)
+        os.makedirs(self._tmp_path)
+        subjects = {}
+        for dirname, (name, passages) in self._passages.items():
+            subjects[dirname] = {"name": name, **self._write_subject(os.path.join(self._tmp_path, dirname), passages)}
+        with open(os.path.join(self._tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "schema_version": SCHEMA_VERSION,
+                "build_version": self.version,
+                "built_at": int(time.time()),
+                "source": self.source,
+                "subjects": subjects,
+            }, f, ensure_ascii=False, indent=1)
+
+        path = os.path.join(self.index_dir, self.dirname)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(self._tmp_path, path)
+        if make_current:
+            pointer_tmp = os.path.join(self.index_dir, ".CURRENT.tmp")
+            with open(pointer_tmp, "w") as f:
+                f.write(self.dirname + "\n")
+            os.replace(pointer_tmp, os.path.join(self.index_dir, "CURRENT"))
+        return path
+
+
+# "What is X?", "Define X", "What do you mean by X?", "Meaning of X"
+_DEFINITION_QUESTION_RE = re.compile(
+    r"^\s*(?:what\s+(?:is|are)\s+(?:meant\s+by\s+)?|what\s+do\s+you\s+mean\s+by\s+|define\s+|"
+    r"definition\s+of\s+|meaning\s+of\s+|explain\s+the\s+term\s+)"
+    r"(?:(?:a|an|the)\s+)?(?P<term>.+?)\s*[?.!]*\s*$",
+    re.IGNORECASE,
+)
+# Sentence ends, and line breaks (headings stay out of the first sentence)
+_SENTENCE_RE = re.compile(r"(?<=[.!?।])\s+|\n+")
+_CONTINUATION_RE = re.compile(r"^(?:it|they|this|these)\b", re.IGNORECASE)
+
+
+def definition_term(question: str) -> Optional[str]:
+    """The term a definition question asks about, or None for other phrasings."""
+    match = _DEFINITION_QUESTION_RE.match(question)
+    if not match:
+        return None
+    term = match.group("term").strip()
+    return term if 0 < len(term.split()) <= 6 else None
+
+
+def _defines(sentence: str, term: str) -> bool:
+    sentence = " ".join(sentence.lower().split())
+    term = re.escape(term.lower())
+    return bool(
+        re.match(rf"^(?:(?:a|an|the)\s+)?{term}s?\s*(?:,[^,]*,\s*)?(?:is|are|refers?\s+to|means?|represents?|is\s+defined\s+as)\b", sentence)
+        or re.search(rf"\b(?:is|are)\s+(?:called|known\s+as|termed)\s+(?:an?\s+|the\s+)?{term}s?\b", sentence)
+    )
+
+
+def extract_definition(question: str, passages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Answer a definition question from a retrieved passage.
+
+    Only passages at RETRIEVAL_EXTRACTIVE_MIN_COVERAGE are considered, and
+    only a sentence that defines the asked term ("X is ...", "... is called
+    X") is returned, followed by the next sentence when it continues the
+    definition ("It ...", "They ...").
+
+    Returns:
+        {text, score, subject, title} or None without a confident match
+    """
+    term = definition_term(question)
+    if term is None:
+        return None
+    for passage in passages:
+        if passage["coverage"] < RETRIEVAL_EXTRACTIVE_MIN_COVERAGE:
+            continue
+        sentences = [s.strip() for s in _SENTENCE_RE.split(passage["text"]) if s.strip()]
+        for i, sentence in enumerate(sentences):
+            if not _defines(sentence, term):
+                continue
+            text = sentence
+            # "X is Y. It ..." - the next sentence continues the definition
+            if i + 1 < len(sentences) and _CONTINUATION_RE.match(sentences[i + 1]):
+                text = f"{sentence} {sentences[i + 1]}"
+            return {
+                "text": text,
+                "score": round(min(0.99, passage["coverage"]), 3),
+                "subject": passage["subject"],
+                "title": passage["title"],
+            }
+    return None
+
+
+def grounding_context(passages: List[Dict[str, Any]], max_tokens: int = RETRIEVAL_CONTEXT_TOKENS) -> str:
+    """Numbered excerpts of the passages above RETRIEVAL_MIN_COVERAGE, within a token budget."""
+    budget_words = int(max_tokens / TOKENS_PER_WORD)
+    excerpts = []
+    for passage in passages:
+        if passage["coverage"] < RETRIEVAL_MIN_COVERAGE or budget_words <= 0:
+            continue
+        words = passage["text"].split()[:budget_words]
+        budget_words -= len(words)
+        excerpts.append(f"[{len(excerpts) + 1}] {' '.join(words)}")
+    return "\n".join(excerpts)
+
+
+retriever = Retriever(resolve_index_path())
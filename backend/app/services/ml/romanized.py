@@ -0,0 +1,230 @@
+"""
+Romanized Indian-language input
+Students often type Hindi, Telugu, Tamil or Kannada in Latin script
+("photosynthesis kya hai"), which langdetect reads as some European
+language. This module spots such text with a small lexicon of frequent
+romanized words, matched exactly or by character trigrams to catch
+spelling variants ("kyaa", "bataye"), and converts the Indian-language
+words to the native script so the translation model is only needed when
+the text has to change language, not just script.
+"""
+
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from indic_transliteration import sanscript
+from indic_transliteration.sanscript import transliterate
+
+ROMANIZED_DETECTION = os.getenv("ROMANIZED_DETECTION", "1") == "1"
+# Minimum character-trigram similarity (Dice) for a spelling variant to count
+ROMANIZED_FUZZY_MIN_SIMILARITY = float(os.getenv("ROMANIZED_FUZZY_MIN_SIMILARITY", "0.6"))
+# Share of letters that must be Latin for the text to be treated as romanized
+LATIN_MIN_RATIO = 0.9
+FUZZY_MIN_LENGTH = 4
+# A spelling variant is weaker evidence than an exact lexicon word
+FUZZY_WEIGHT = 0.5
+# Inputs of at most this many words need two lexicon words, so one
+# coincidental match ("Ela Fitzgerald") does not decide the language
+SHORT_INPUT_WORDS = 4
+
+# language code -> indic_transliteration target scheme
+SCHEMES = {
+    "hi": sanscript.DEVANAGARI,
+    "te": sanscript.TELUGU,
+    "ta": sanscript.TAMIL,
+    "kn": sanscript.KANNADA,
+}
+
+# Frequent romanized words (question words, particles, verbs used in
+# questions) with their native spelling. Words that are also English words
+# or common in English text ("main", "do", "to", "me", "ki", "ide", "ela")
+# are left out.
+LEXICON: Dict[str, Dict[str, str]] = {
+    "hi": {
+        "kya": "क्या", "hai": "है", "hain": "हैं", "ke": "के",
+        "ko": "को", "mein": "में", "aur": "और", "kaise": "कैसे",
+        "kaisa": "कैसा", "kyun": "क्यों", "kyon": "क्यों", "kab": "कब", "kahan": "कहाँ",
+        "kaun": "कौन", "kitna": "कितना", "kitne": "कितने", "batao": "बताओ",
+        "bataiye": "बताइए", "samjhao": "समझाओ", "samjhaiye": "समझाइए", "matlab": "मतलब",
+        "nahi": "नहीं", "nahin": "नहीं", "hota": "होता", "hoti": "होती", "hote": "होते",
+        "karta": "करता", "karte": "करते", "kare": "करे", "kijiye": "कीजिए", "yeh": "यह",
+        "woh": "वह", "wo": "वो", "kuch": "कुछ", "bhi": "भी", "tha": "था",
+        "thi": "थी", "liye": "लिए", "saath": "साथ", "chahiye": "चाहिए", "jab": "जब",
+        "iska": "इसका", "uska": "उसका", "aap": "आप", "kehte": "कहते",
+        "kahte": "कहते", "kise": "किसे", "kisko": "किसको", "wala": "वाला", "wale": "वाले",
+    },
+    "te": {
+        "enti": "ఏంటి", "emiti": "ఏమిటి", "emi": "ఏమి", "enduku": "ఎందుకు",
+        "endhuku": "ఎందుకు", "cheppu": "చెప్పు", "cheppandi": "చెప్పండి", "evaru": "ఎవరు",
+        "ekkada": "ఎక్కడ", "eppudu": "ఎప్పుడు", "entha": "ఎంత", "undi": "ఉంది",
+        "unnayi": "ఉన్నాయి", "ledu": "లేదు", "kaadu": "కాదు", "avunu": "అవును",
+        "nenu": "నేను", "meeru": "మీరు", "nuvvu": "నువ్వు", "idi": "ఇది",
+        "mariyu": "మరియు", "gurinchi": "గురించి", "vivarinchandi": "వివరించండి",
+        "ante": "అంటే", "ayithe": "అయితే", "kuda": "కూడా", "kavali": "కావాలి",
+        "yokka": "యొక్క", "chala": "చాలా",
+    },
+    "ta": {
+        "enna": "என்ன", "eppadi": "எப்படி", "yen": "ஏன்", "enge": "எங்கே", "eppo": "எப்போ",
+        "yaar": "யார்", "evvalavu": "எவ்வளவு", "sollu": "சொல்லு", "sollunga": "சொல்லுங்க",
+        "vilakkam": "விளக்கம்", "irukku": "இருக்கு", "illai": "இல்லை", "naan": "நான்",
+        "neenga": "நீங்க", "nee": "நீ", "idhu": "இது", "adhu": "அது", "oru": "ஒரு",
+        "matrum": "மற்றும்", "pathi": "பத்தி", "patri": "பற்றி", "endral": "என்றால்",
+        "enral": "என்றால்", "venum": "வேணும்", "theriyuma": "தெரியுமா", "ethu": "எது",
+        "edhu": "எது",
+    },
+    "kn": {
+        "enu": "ಏನು", "yenu": "ಏನು", "hege": "ಹೇಗೆ", "yake": "ಯಾಕೆ", "yaake": "ಯಾಕೆ",
+        "elli": "ಎಲ್ಲಿ", "yaavaga": "ಯಾವಾಗ", "yaaru": "ಯಾರು", "eshtu": "ಎಷ್ಟು",
+        "heli": "ಹೇಳಿ", "tilisi": "ತಿಳಿಸಿ", "illa": "ಇಲ್ಲ", "alla": "ಅಲ್ಲ",
+        "houdu": "ಹೌದು", "naanu": "ನಾನು", "neevu": "ನೀವು", "idu": "ಇದು", "adu": "ಅದು",
+        "ondu": "ಒಂದು", "mattu": "ಮತ್ತು", "bagge": "ಬಗ್ಗೆ", "andare": "ಅಂದರೆ",
+        "maadi": "ಮಾಡಿ", "beku": "ಬೇಕು",
+    },
+}
+
+# English function words; they outvote stray lexicon matches in English text
+ENGLISH_WORDS = {
+    "the", "is", "are", "was", "were", "what", "how", "why", "when", "where", "who",
+    "which", "of", "and", "or", "in", "on", "to", "a", "an", "for", "with", "by",
+    "from", "does", "do", "did", "can", "explain", "define", "describe", "difference",
+    "between", "meaning", "please", "this", "that", "these", "those", "give", "example",
+    "examples", "write", "about", "it", "its", "be", "has", "have", "not", "tell",
+    "me", "my",
+}
+
+_WORD_RE = re.compile(r"[A-Za-z]+")
+_REPEAT_RE = re.compile(r"(.)\1+")
+_VIRAMA = "्"
+
+
+def _normalize(word: str) -> str:
+    """Lowercase and collapse repeated letters ("kyaa" -> "kya", "cheppandi" -> "chepandi")."""
+    return _REPEAT_RE.sub(r"\1", word.lower())
+
+
+def _trigrams(word: str) -> Set[str]:
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _build_index() -> Tuple[Dict[str, List[Tuple[str, str]]], Dict[str, Set[str]], Dict[str, List[str]]]:
+    exact: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    grams: Dict[str, Set[str]] = {}
+    postings: Dict[str, List[str]] = defaultdict(list)
+    for language, words in LEXICON.items():
+        for word, native in words.items():
+            key = _normalize(word)
+            exact[key].append((language, native))
+            if key not in grams:
+                grams[key] = _trigrams(key)
+                for gram in grams[key]:
+                    postings[gram].append(key)
+    return exact, grams, postings
+
+
+_EXACT, _GRAMS, _POSTINGS = _build_index()
+_ENGLISH = {_normalize(word) for word in ENGLISH_WORDS}
+
+
+def is_latin_script(text: str) -> bool:
+    """True if (nearly) all letters in `text` are ASCII."""
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        return False
+    return sum(1 for ch in letters if ch.isascii()) / len(letters) >= LATIN_MIN_RATIO
+
+
+def _fuzzy_match(key: str) -> Optional[str]:
+    """Lexicon word closest to `key` by trigram Dice similarity, if similar enough."""
+    if len(key) < FUZZY_MIN_LENGTH:
+        return None
+    grams = _trigrams(key)
+    shared: Dict[str, int] = defaultdict(int)
+    for gram in grams:
+        for candidate in _POSTINGS.get(gram, ()):
+            shared[candidate] += 1
+    best, best_score = None, ROMANIZED_FUZZY_MIN_SIMILARITY
+    for candidate, count in shared.items():
+        score = 2 * count / (len(grams) + len(_GRAMS[candidate]))
+        if score >= best_score:
+            best, best_score = candidate, score
+    return best
+
+
+def _word_languages(word: str) -> Tuple[Dict[str, str], bool]:
+    """
+    Languages a word belongs to.
+
+    Returns:
+        ({language: native spelling or "" for a spelling variant}, exact)
+    """
+    key = _normalize(word)
+    if key in _EXACT:
+        return dict(_EXACT[key]), True
+    if key in _ENGLISH:
+        return {}, True
+    match = _fuzzy_match(key)
+    if match is None:
+        return {}, False
+    return {language: "" for language, _ in _EXACT[match]}, False
+
+
+def detect_romanized(text: str) -> Optional[Dict[str, float]]:
+    """
+    Detect Indian-language text written in Latin script.
+
+    Returns:
+        {"language": "hi", "confidence": 0.8}, or None if the text is not
+        romanized Hindi, Telugu, Tamil or Kannada
+    """
+    if not ROMANIZED_DETECTION or not is_latin_script(text):
+        return None
+    words = _WORD_RE.findall(text)
+    votes: Dict[str, float] = defaultdict(float)
+    hits: Dict[str, int] = defaultdict(int)
+    english = 0
+    for word in words:
+        if _normalize(word) in _ENGLISH:
+            english += 1
+            continue
+        languages, exact = _word_languages(word)
+        for language in languages:
+            votes[language] += 1.0 if exact else FUZZY_WEIGHT
+            hits[language] += 1
+    if not votes:
+        return None
+    language, best = max(votes.items(), key=lambda item: item[1])
+    # Code-mixed questions ("photosynthesis ka matlab kya hai") need more
+    # Indian-language words than English ones; a tie stays English
+    if best < 1.0 or best <= english:
+        return None
+    if len(words) <= SHORT_INPUT_WORDS and hits[language] < 2:
+        return None
+    confidence = best / (sum(votes.values()) + english)
+    return {"language": language, "confidence": round(min(max(confidence, 0.5), 0.99), 4)}
+
+
+def to_native_script(text: str, language: str) -> str:
+    """
+    Write the Indian-language words of romanized `text` in the language's
+    script. English words (often technical terms) are kept in Latin script.
+    """
+    scheme = SCHEMES.get(language)
+    if scheme is None:
+        return text
+
+    def convert(match: re.Match) -> str:
+        word = match.group()
+        languages, _ = _word_languages(word)
+        if language not in languages:
+            return word
+        native = languages[language]
+        if native:
+            return native
+        native = transliterate(word.lower(), sanscript.ITRANS, scheme)
+        # Hindi drops the final inherent vowel, so no trailing virama
+        return native[:-1] if language == "hi" and native.endswith(_VIRAMA) else native
+
+    return _WORD_RE.sub(convert, text)
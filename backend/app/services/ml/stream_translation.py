@@ -0,0 +1,169 @@
+"""
+Incremental translation of streamed answers
+Cuts the streamed English answer into sentences as they close and
+translates them in a background worker, so the local-language answer
+follows the English one sentence by sentence instead of starting after it
+ends. Sentences that close while a translation is running are batched
+into the next translate_batch call.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import re
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .deadlines import GenerationAborted
+from .translator import translate_batch
+
+logger = logging.getLogger(__name__)
+
+STREAM_TRANSLATION = os.getenv("STREAM_TRANSLATION", "1") == "1"
+STREAM_TRANSLATION_BATCH = int(os.getenv("STREAM_TRANSLATION_BATCH", "8"))
+# Shorter pieces ("1.", "e.g.") are joined with the following sentence
+STREAM_SENTENCE_MIN_CHARS = int(os.getenv("STREAM_SENTENCE_MIN_CHARS", "20"))
+# Text without a sentence end is cut at a space beyond this length
+STREAM_SENTENCE_MAX_CHARS = int(os.getenv("STREAM_SENTENCE_MAX_CHARS", "400"))
+
+# Whitespace after sentence-ending punctuation, or a line break
+BOUNDARY_RE = re.compile(r"(?<=[.!?।])[ \t]+|[ \t]*\n\s*")
+
+# index, translated sentence (ending with its separator)
+SentenceCallback = Callable[[int, str], Awaitable[None]]
+
+
+def _separator(whitespace: str) -> str:
+    """Line breaks are kept (at most a blank line); other whitespace becomes a space."""
+    newlines = whitespace.count("\n")
+    return "\n" * min(newlines, 2) if newlines else " "
+
+
+class SentenceSplitter:
+    """Cuts a stream of text deltas into complete sentences."""
+
+    def __init__(self, min_chars: int = STREAM_SENTENCE_MIN_CHARS, max_chars: int = STREAM_SENTENCE_MAX_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, delta: str) -> List[Tuple[str, str]]:
+        """
+        Add a text delta.
+
+        Returns:
+            The sentences it completed as (sentence, separator) pairs
+        """
+        self.buffer += delta
+        sentences = []
+        start = 0
+        for match in BOUNDARY_RE.finditer(self.buffer):
+            # A boundary is final only once text follows it
+            if match.end() == len(self.buffer):
+                break
+            sentence = self.buffer[start:match.start()].strip()
+            line_break = "\n" in match.group()
+            if not sentence:
+                start = match.end()
+                continue
+            if len(sentence) < self.min_chars and not line_break:
+                continue
+            sentences.append((sentence, _separator(match.group())))
+            start = match.end()
+        self.buffer = self.buffer[start:]
+
+        while len(self.buffer) > self.max_chars:
+            cut = self.buffer.rfind(" ", 0, self.max_chars)
+            if cut <= 0:
+                break
+            sentences.append((self.buffer[:cut].strip(), " "))
+            self.buffer = self.buffer[cut + 1:]
+        return sentences
+
+    def flush(self) -> Optional[Tuple[str, str]]:
+        """The unfinished last sentence, if any."""
+        sentence, self.buffer = self.buffer.strip(), ""
+        return (sentence, "") if sentence else None
+
+
+class IncrementalTranslator:
+    """
+    Translates an answer while it streams.
+
+    Must be created inside a running event loop (and inside the request's
+    deadline context, which the worker inherits). feed() each English
+    delta; on_sentence(index, text) is awaited for every translated
+    sentence, in order. If the translation model fails, the remaining
+    sentences are passed through in English and `failed` is set.
+    """
+
+    def __init__(self, language: str, on_sentence: SentenceCallback, source_lang: str = "en"):
+        self.language = language
+        self.source_lang = source_lang
+        self.on_sentence = on_sentence
+        self.splitter = SentenceSplitter()
+        self.pending: List[Tuple[str, str]] = []
+        self.translated: List[str] = []
+        self.failed = False
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+
+    def feed(self, delta: str):
+        sentences = self.splitter.feed(delta)
+        if sentences:
+            self.pending.extend(sentences)
+            self._wakeup.set()
+
+    async def finish(self) -> str:
+        """
+        Translate what is left and wait for every sentence.
+
+        Returns:
+            The full translation
+
+        Raises:
+            DeadlineExceeded, RequestCancelled: From the translation model
+        """
+        rest = self.splitter.flush()
+        if rest:
+            self.pending.append(rest)
+        self._closed = True
+        self._wakeup.set()
+        await self._worker
+        return "".join(self.translated).strip()
+
+    async def aclose(self):
+        """Stop translating (the stream was cancelled or failed)."""
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Everything that closed during the previous call goes in one batch
+            while self.pending:
+                batch = self.pending[:STREAM_TRANSLATION_BATCH]
+                del self.pending[:len(batch)]
+                texts = await self._translate([sentence for sentence, _ in batch])
+                for (_, separator), text in zip(batch, texts):
+                    self.translated.append(text + separator)
+                    await self.on_sentence(len(self.translated) - 1, text + separator)
+            if self._closed:
+                return
+
+    async def _translate(self, sentences: List[str]) -> List[str]:
+        if self.failed:
+            return sentences
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                None, contextvars.copy_context().run, translate_batch, sentences, self.language, self.source_lang
+            )
+        except GenerationAborted:
+            raise
+        except Exception as e:
+            logger.warning(f"Sentence translation failed, passing English through: {e}")
+            self.failed = True
+            return sentences
@@ -0,0 +1,95 @@
+"""
+Token-budgeted text chunking
+Splits long source documents on section and paragraph boundaries so each
+chunk fits a model's context budget.
+"""
+
+import re
+from typing import List
+
+# Rough English average for BPE/SentencePiece tokenizers; good enough for
+# budgeting without loading a tokenizer.
+TOKENS_PER_WORD = 1.33
+
+HEADING_RE = re.compile(r"^(#{1,6}\s+\S.*|[A-Z][A-Za-z0-9 ,:&()-]{2,80}:?|\d+(\.\d+)*\s+\S.*)$")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?।])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of `text`."""
+    return int(len(text.split()) * TOKENS_PER_WORD) + 1
+
+
+def _split_sections(text: str) -> List[str]:
+    """Split into paragraphs, keeping a heading attached to the paragraph after it."""
+    blocks = [b.strip() for b in re.split(r"\n\s*\n", text) if b.strip()]
+    sections: List[str] = []
+    heading = ""
+    for block in blocks:
+        if "\n" not in block and HEADING_RE.match(block) and len(block.split()) <= 12:
+            heading = f"{heading}\n{block}" if heading else block
+            continue
+        sections.append(f"{heading}\n{block}" if heading else block)
+        heading = ""
+    if heading:
+        sections.append(heading)
+    return sections
+
+
+def _split_oversized(block: str, max_tokens: int) -> List[str]:
+    """Split a block that exceeds the budget on sentences, then on words."""
+    pieces: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for sentence in SENTENCE_END_RE.split(block):
+        sentence_tokens = estimate_tokens(sentence)
+        if sentence_tokens > max_tokens:
+            words = sentence.split()
+            step = max(1, int(max_tokens / TOKENS_PER_WORD))
+            units = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            units = [sentence]
+        for unit in units:
+            unit_tokens = estimate_tokens(unit)
+            if current and current_tokens + unit_tokens > max_tokens:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most roughly `max_tokens` tokens.
+
+    Section and paragraph boundaries are preferred; paragraphs that are too
+    long on their own are split on sentence boundaries.
+
+    Args:
+        text: Source document
+        max_tokens: Token budget per chunk
+
+    Returns:
+        List of chunks in document order
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for section in _split_sections(text):
+        section_tokens = estimate_tokens(section)
+        parts = [section] if section_tokens <= max_tokens else _split_oversized(section, max_tokens)
+        for part in parts:
+            part_tokens = estimate_tokens(part)
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
@@ -1,11 +1,26 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, StoppingCriteria, StoppingCriteriaList
 import torch
 from typing import Dict, List, Optional, Union
 import os
+import re
+
+from .model_registry import registry
+from .model_artifacts import load_artifact, register_artifact
+from .deadlines import Deadline, check_deadline, current_deadline
+from .romanized import SCHEMES, is_latin_script, to_native_script
+from .text_chunker import SENTENCE_END_RE
 
 # Model configuration
 MODEL_NAME = "ai4bharat/indictrans2-en-indic"
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "../../models")
+REGISTRY_NAME = "translation"
+# Texts per padded generate call
+TRANSLATE_BATCH_SIZE = int(os.getenv("TRANSLATE_BATCH_SIZE", "16"))
+# Output budget (tokens) per sentence of a document translation
+TRANSLATE_SENTENCE_MAX_LENGTH = int(os.getenv("TRANSLATE_SENTENCE_MAX_LENGTH", "256"))
+
+# Markdown heading, bullet or numbering at the start of a line
+_LINE_PREFIX_RE = re.compile(r"\s*(?:#+\s+|[-*•]\s+|\d+[.)]\s+)?")
 
 # Supported languages with their codes
 SUPPORTED_LANGUAGES = {
@@ -25,44 +40,52 @@ LANG_CODE_MAP = {
     "en": "eng_Latn"
 }
 
-# Initialize model and tokenizer
-tokenizer = None
-model = None
-
-def load_model():
-    """Load the translation model."""
-    global tokenizer, model
+def _load_translation_model(model_name: str, src_lang: str):
+    """Load a translation model and its tokenizer."""
+    tokenizer = AutoTokenizer.from_pretrained(
+        model_name,
+        cache_dir=CACHE_DIR,
+        src_lang=src_lang
+    )
     
-    if tokenizer is None:
-        tokenizer = AutoTokenizer.from_pretrained(
-            MODEL_NAME,
+    try:
+        # Try to load with 8-bit quantization if available
+        from transformers import BitsAndBytesConfig
+        quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            model_name,
             cache_dir=CACHE_DIR,
-            src_lang="eng_Latn"
+            device_map="auto",
+            quantization_config=quantization_config
+        )
+    except (ImportError, AttributeError):
+        # Fallback to FP16 if 8-bit not available
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            model_name,
+            cache_dir=CACHE_DIR,
+            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
         )
     
-    if model is None:
-        try:
-            # Try to load with 8-bit quantization if available
-            from transformers import BitsAndBytesConfig
-            quantization_config = BitsAndBytesConfig(load_in_8bit=True)
-            model = AutoModelForSeq2SeqLM.from_pretrained(
-                MODEL_NAME,
-                cache_dir=CACHE_DIR,
-                device_map="auto",
-                quantization_config=quantization_config
-            )
-        except (ImportError, AttributeError):
-            # Fallback to FP16 if 8-bit not available
-            model = AutoModelForSeq2SeqLM.from_pretrained(
-                MODEL_NAME,
-                cache_dir=CACHE_DIR,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-            )
-        
-        model.eval()  # Set to evaluation mode
-    
+    model.eval()  # Set to evaluation mode
     return model, tokenizer
 
+class _DeadlineCriteria(StoppingCriteria):
+    """Stops translation once the request deadline passes or the request is cancelled."""
+
+    def __init__(self, deadline: Deadline):
+        self.deadline = deadline
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.deadline.is_set()
+
+register_artifact(REGISTRY_NAME, MODEL_NAME, AutoModelForSeq2SeqLM, CACHE_DIR, tokenizer_kwargs={"src_lang": "eng_Latn"})
+# Prepared artifacts (python -m app.prepare_models) load offline; otherwise from the hub
+registry.register(REGISTRY_NAME, lambda: load_artifact(REGISTRY_NAME) or _load_translation_model(MODEL_NAME, "eng_Latn"))
+
+def load_model():
+    """Load the translation model (once, via the model registry)."""
+    return registry.get(REGISTRY_NAME)
+
 def translate_text(
     text: str,
     target_lang: str,
@@ -81,10 +104,40 @@ def translate_text(
         
     Returns:
         Translated text
+        
+    Raises:
+        DeadlineExceeded, RequestCancelled: The request's deadline passed
+            or it was cancelled (checked before and during generation)
     """
     if not text.strip():
         return ""
     
+    return translate_batch([text], target_lang, source_lang, max_length, **kwargs)[0]
+
+def translate_batch(
+    texts: List[str],
+    target_lang: str,
+    source_lang: str = "en",
+    max_length: int = 200,
+    **kwargs
+) -> List[str]:
+    """
+    Translate several texts (e.g. sentences) in padded generate calls of
+    up to TRANSLATE_BATCH_SIZE texts.
+    
+    Args:
+        texts: Texts to translate; empty ones come back empty
+        target_lang: Target language code (e.g., 'hi', 'te', 'ta', 'kn', 'en')
+        source_lang: Source language code (default: 'en')
+        max_length: Maximum length of each generated translation
+        
+    Returns:
+        Translations in the order of `texts`
+        
+    Raises:
+        DeadlineExceeded, RequestCancelled: The request's deadline passed
+            or it was cancelled (checked before and during generation)
+    """
     # Normalize language codes
     source_lang = source_lang.lower()
     target_lang = target_lang.lower()
@@ -96,38 +149,88 @@ def translate_text(
     if not src_lang_code or not tgt_lang_code:
         raise ValueError(f"Unsupported language pair: {source_lang} -> {target_lang}")
     
-    # If source and target languages are the same, return the original text
+    # Romanized Indian-language input ("photosynthesis kya hai") only needs
+    # a script change, which is all there is to do for a same-language pair
+    if source_lang in SCHEMES:
+        texts = [to_native_script(text, source_lang) if is_latin_script(text) else text for text in texts]
+    
+    # If source and target languages are the same, return the original texts
     if source_lang == target_lang:
-        return text
+        return list(texts)
     
-    model, tokenizer = load_model()
+    results = [""] * len(texts)
+    pending = [i for i, text in enumerate(texts) if text.strip()]
+    if not pending:
+        return results
     
-    # Prepare input
-    inputs = tokenizer(
-        text,
-        return_tensors="pt",
-        padding=True,
-        truncation=True,
-        max_length=512
-    )
+    check_deadline()
+    model, tokenizer = load_model()
     
     # Move to device (GPU if available)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    
-    # Generate translation
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            forced_bos_token_id=tokenizer.lang_code_to_id[tgt_lang_code],
-            max_length=max_length,
-            **kwargs
+    
+    # Stop between tokens when the request runs out of time
+    deadline = current_deadline()
+    if deadline is not None and "stopping_criteria" not in kwargs:
+        kwargs["stopping_criteria"] = StoppingCriteriaList([_DeadlineCriteria(deadline)])
+    
+    for start in range(0, len(pending), TRANSLATE_BATCH_SIZE):
+        batch = pending[start:start + TRANSLATE_BATCH_SIZE]
+        
+        # Prepare input
+        inputs = tokenizer(
+            [texts[i] for i in batch],
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=512
         )
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        
+        # Generate translation
+        with torch.no_grad():
+            outputs = model.generate(
+                **inputs,
+                forced_bos_token_id=tokenizer.lang_code_to_id[tgt_lang_code],
+                max_length=max_length,
+                **kwargs
+            )
+        # A translation cut short by the deadline is not returned
+        check_deadline()
+        
+        # Decode and clean up the output
+        for i, translated_text in zip(batch, tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+            results[i] = translated_text
     
-    # Decode and clean up the output
-    translated_text = tokenizer.batch_decode(outputs, skip_special_tokens=True)[0]
+    return results
+
+def translate_document(text: str, target_lang: str, source_lang: str = "en") -> str:
+    """
+    Translate multi-line text such as study notes without truncating it.
+    
+    The model truncates its input at 512 tokens and stops at `max_length`
+    output tokens, so each line is translated sentence by sentence (in
+    batches) and put back together. Markdown heading, bullet and numbering
+    prefixes are kept as they are.
+    
+    Args:
+        text: Text to translate
+        target_lang: Target language code (e.g., 'hi', 'te', 'ta', 'kn', 'en')
+        source_lang: Source language code (default: 'en')
+        
+    Returns:
+        Translated text with the line structure of `text`
+    """
+    sentences: List[str] = []
+    lines = []
+    for line in text.split("\n"):
+        prefix = _LINE_PREFIX_RE.match(line).group()
+        first = len(sentences)
+        sentences.extend(s.strip() for s in SENTENCE_END_RE.split(line[len(prefix):]) if s.strip())
+        lines.append((prefix, first, len(sentences)))
     
-    return translated_text
+    translated = translate_batch(sentences, target_lang, source_lang, max_length=TRANSLATE_SENTENCE_MAX_LENGTH)
+    return "\n".join(prefix + " ".join(translated[first:end]) for prefix, first, end in lines)
 
 def translate_to_local(text: str, target_lang: str, source_lang: str = "en") -> str:
     """
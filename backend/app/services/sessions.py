@@ -0,0 +1,336 @@
+"""
+Server-side chat sessions with rolling summarization
+Keeps the last few turns of a tutoring session verbatim and folds older
+turns into a rolling summary, generated in the background off the request
+path, so the context sent with each question stays within a fixed token
+budget however long the conversation gets.
+
+Session ids are issued by the server (unguessable tokens) and each session
+belongs to the client that created it; other clients see it as missing.
+Sessions live in SQLite so that every worker of the multi-process launcher
+sees the same conversations.
+"""
+
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .admission import client_identity
+from .ml.answer_generator import generate_answer
+from .ml.text_chunker import estimate_tokens
+from .ml.priority import use_priority
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_DB_PATH = os.getenv(
+    "SESSIONS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "../../data/sessions.sqlite3"),
+)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+# Turns kept word for word; older turns are folded into the summary
+SESSION_VERBATIM_TURNS = int(os.getenv("SESSION_VERBATIM_TURNS", "3"))
+# Token budget of the context added to each prompt
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "600"))
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "150"))
+# Turn texts longer than this are stored zlib-compressed
+COMPRESS_THRESHOLD = 256
+# A worker summarizing a session holds it this long (seconds) per summary
+SESSION_SUMMARY_LEASE = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    -- Client identity (admission.client_identity) of the creator
+    owner TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    turn_count INTEGER NOT NULL DEFAULT 0,
+    summarizing_until REAL NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+-- Turns not yet folded into the summary; the newest SESSION_VERBATIM_TURNS
+-- are kept word for word, older ones wait for the summarizer
+CREATE TABLE IF NOT EXISTS session_turns (
+    session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    question BLOB NOT NULL,
+    answer BLOB NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+"""
+
+# Summaries run one at a time in the background
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-summary")
+
+
+def _pack(text: str) -> bytes:
+    data = text.encode("utf-8")
+    if len(data) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(data)
+    return b"r" + data
+
+
+def _unpack(blob: bytes) -> str:
+    if blob[:1] == b"z":
+        return zlib.decompress(blob[1:]).decode("utf-8")
+    return blob[1:].decode("utf-8")
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    words = text.split()
+    keep = max(1, int(max_tokens / 1.33))
+    return text if len(words) <= keep else " ".join(words[:keep]) + " ..."
+
+
+def _format_turns(turns: List[Tuple[bytes, bytes]]) -> List[str]:
+    return [f"Student: {_unpack(q)}\nTutor: {_unpack(a)}" for q, a in turns]
+
+
+def session_owner(connection) -> str:
+    """Owner identity of an HTTP request or WebSocket: its API key, else its address."""
+    client = connection.client
+    return client_identity(connection.headers, client.host if client else None)[0]
+
+
+def summarize_turns(previous_summary: str, turns: List[str]) -> str:
+    """Fold turns into the running summary with the answer model."""
+    prompt = (
+        "Update the summary of a tutoring conversation. Keep the topics covered, "
+        "what the student found difficult and any facts the tutor established. "
+        "Write at most five short sentences.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        "New exchanges:\n" + "\n\n".join(turns)
+    )
+    result = generate_answer(prompt, max_length=SESSION_SUMMARY_TOKENS, temperature=0.2)
+    text = result[0]["text"].strip() if result else ""
+    if not text or text == "Error generating answer":
+        raise RuntimeError("Summary generation failed")
+    return text
+
+
+class SessionStore:
+    """
+    Session store in SQLite with TTL and LRU eviction. The database is
+    shared by every worker process, so a follow-up question reaches its
+    session whichever worker serves it.
+    """
+
+    def __init__(
+        self,
+        db_path: str = SESSIONS_DB_PATH,
+        ttl: int = SESSION_TTL_SECONDS,
+        max_sessions: int = SESSION_MAX_COUNT,
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection must not cross fork(); each worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _get(self, conn: sqlite3.Connection, session_id: str, owner: str) -> Optional[sqlite3.Row]:
+        """The session if it exists, has not expired and belongs to `owner`; marks it used."""
+        now = time.time()
+        row = conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or now - row["last_access"] > self.ttl or not secrets.compare_digest(row["owner"], owner):
+            return None
+        conn.execute("UPDATE sessions SET last_access = ? WHERE id = ?", (now, session_id))
+        return row
+
+    @staticmethod
+    def _turns(conn: sqlite3.Connection, session_id: str) -> Tuple[List[Tuple[bytes, bytes]], List[Tuple[bytes, bytes]]]:
+        """(turns waiting to be summarized, verbatim turns), oldest first."""
+        rows = conn.execute(
+            "SELECT question, answer FROM session_turns WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        turns = [(row["question"], row["answer"]) for row in rows]
+        split = max(0, len(turns) - SESSION_VERBATIM_TURNS)
+        return turns[:split], turns[split:]
+
+    def create(self, owner: str) -> str:
+        """Start a session for `owner`; returns its id."""
+        session_id = secrets.token_urlsafe(18)
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired sessions go first, then the least recently used over the limit
+            conn.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM sessions WHERE id IN "
+                "(SELECT id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (max(0, self.max_sessions - 1),),
+            )
+            conn.execute(
+                "INSERT INTO sessions (id, owner, last_access) VALUES (?, ?, ?)", (session_id, owner, now)
+            )
+        return session_id
+
+    def build_context(self, session_id: str, owner: str, max_tokens: int = SESSION_CONTEXT_TOKENS) -> Optional[str]:
+        """
+        Build the conversation context for the next question.
+
+        The most recent turns are kept first; the summary and turns still
+        waiting to be summarized fill the remaining budget, so the context
+        never exceeds `max_tokens` (estimated). Returns None when the
+        session does not exist (or expired) or belongs to another client.
+        """
+        with self._transaction() as conn:
+            session = self._get(conn, session_id, owner)
+            if session is None:
+                return None
+            pending_turns, recent_turns = self._turns(conn, session_id)
+            summary = session["summary"]
+        recent = _format_turns(recent_turns)
+        pending = _format_turns(pending_turns)
+
+        parts: List[str] = []
+        remaining = max_tokens
+        for turn in reversed(recent):
+            tokens = estimate_tokens(turn)
+            if tokens > remaining:
+                if not parts:
+                    parts.append(_truncate_to_tokens(turn, remaining))
+                remaining = 0
+                break
+            parts.append(turn)
+            remaining -= tokens
+
+        # Turns not yet summarized come before the verbatim ones, newest first
+        for turn in reversed(pending):
+            if remaining <= 0:
+                break
+            clipped = _truncate_to_tokens(turn, min(remaining, 60))
+            parts.append(clipped)
+            remaining -= estimate_tokens(clipped)
+
+        if summary and remaining > 0:
+            parts.append("Summary of earlier conversation: " + _truncate_to_tokens(summary, remaining))
+
+        return "\n\n".join(reversed(parts))
+
+    def add_turn(self, session_id: str, owner: str, question: str, answer: str):
+        """Record a turn; older turns are summarized asynchronously."""
+        now = time.time()
+        with self._transaction() as conn:
+            session = self._get(conn, session_id, owner)
+            if session is None:
+                # Expired or evicted while the answer was generated
+                return
+            conn.execute(
+                "INSERT INTO session_turns (session_id, seq, question, answer) VALUES (?, ?, ?, ?)",
+                (session_id, session["turn_count"], _pack(question), _pack(answer)),
+            )
+            conn.execute("UPDATE sessions SET turn_count = turn_count + 1 WHERE id = ?", (session_id,))
+            pending, _ = self._turns(conn, session_id)
+            # One worker at a time folds a session's turns; the lease outlives a crashed one
+            schedule = bool(pending) and conn.execute(
+                "UPDATE sessions SET summarizing_until = ? WHERE id = ? AND summarizing_until < ?",
+                (now + SESSION_SUMMARY_LEASE, session_id, now),
+            ).rowcount == 1
+
+        if schedule:
+            _summary_executor.submit(self._summarize, session_id)
+
+    def _summarize(self, session_id: str):
+        while True:
+            with self._transaction() as conn:
+                row = conn.execute("SELECT summary, turn_count FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                batch = self._turns(conn, session_id)[0] if row is not None else []
+                if not batch:
+                    # Released in the same transaction that found nothing left, so
+                    # a turn added concurrently either is seen here or schedules anew
+                    conn.execute("UPDATE sessions SET summarizing_until = 0 WHERE id = ?", (session_id,))
+                    return
+                previous = row["summary"]
+                # Sequence number of the newest turn in the batch
+                last_seq = row["turn_count"] - SESSION_VERBATIM_TURNS - 1
+            try:
+                with use_priority("bulk"):
+                    summary = summarize_turns(previous, _format_turns(batch))
+            except Exception as e:
+                # Without a model, keep the question of each folded turn
+                logger.warning(f"Session summary failed for {session_id}: {e}")
+                questions = "; ".join(_unpack(q) for q, _ in batch)
+                summary = _truncate_to_tokens(f"{previous} Earlier questions: {questions}".strip(), SESSION_SUMMARY_TOKENS)
+            with self._transaction() as conn:
+                conn.execute(
+                    "UPDATE sessions SET summary = ?, summarizing_until = ? WHERE id = ?",
+                    (summary, time.time() + SESSION_SUMMARY_LEASE, session_id),
+                )
+                conn.execute("DELETE FROM session_turns WHERE session_id = ? AND seq <= ?", (session_id, last_seq))
+
+    def get(self, session_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            session = self._get(conn, session_id, owner)
+            if session is None:
+                return None
+            pending, recent = self._turns(conn, session_id)
+        return {
+            "session_id": session_id,
+            "turns": session["turn_count"],
+            "summary": session["summary"],
+            "recent_turns": [{"question": _unpack(q), "answer": _unpack(a)} for q, a in recent],
+            "pending_summary_turns": len(pending),
+        }
+
+    def delete(self, session_id: str, owner: str) -> bool:
+        with self._transaction() as conn:
+            if self._get(conn, session_id, owner) is None:
+                return False
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            sessions = conn.execute(
+                "SELECT COUNT(*) AS n, COALESCE(SUM(LENGTH(summary)), 0) AS bytes FROM sessions WHERE last_access >= ?",
+                (time.time() - self.ttl,),
+            ).fetchone()
+            turns = conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(question) + LENGTH(answer)), 0) AS bytes FROM session_turns"
+            ).fetchone()
+        return {"sessions": sessions["n"], "stored_bytes": sessions["bytes"] + turns["bytes"]}
+
+    def close(self):
+        """Close the SQLite connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+session_store = SessionStore()
@@ -0,0 +1,220 @@
+"""
+Non-blocking structured logging
+Request handlers and generation threads only put log records on an
+in-memory queue; a background listener thread formats them (JSON lines by
+default) and writes them to stdout. A full queue drops records instead of
+blocking the request. Each record carries the id of the request it was
+logged for (RequestIdMiddleware), so the lines of one request can be found
+across the event loop and worker threads.
+
+Levels and sampling are set per category, i.e. logger name prefix:
+
+    LOG_LEVELS=app.services.ml.groq_service=DEBUG,uvicorn.access=WARNING
+    LOG_SAMPLING=uvicorn.access=0.05,app.services.ml=0.5
+
+Sampling only thins out records below WARNING; warnings and errors are
+always written.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# uvicorn installs its own stream handlers; its records go through the queue too
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s [%(request_id)s]: %(message)s"
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes of every LogRecord; anything else was passed in `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def use_request_id(request_id: str) -> Iterator[str]:
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+def _parse_categories(raw: str, convert) -> List[Tuple[str, object]]:
+    """"name=value,..." pairs, most specific (longest) name first."""
+    pairs = []
+    for item in raw.split(","):
+        name, _, value = item.strip().partition("=")
+        if name and value:
+            pairs.append((name.strip(), convert(value.strip())))
+    return sorted(pairs, key=lambda pair: -len(pair[0]))
+
+
+def _category_value(name: str, categories: List[Tuple[str, object]]):
+    for prefix, value in categories:
+        if name == prefix or name.startswith(prefix + "."):
+            return value
+    return None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, request_id, msg, exc and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "request_id": getattr(record, "request_id", None),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Per-category sampling; stamps the request id of the logging thread's context."""
+
+    def __init__(self, sampling: List[Tuple[str, float]]):
+        super().__init__()
+        self.sampling = sampling
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.sampling:
+            rate = _category_value(record.name, self.sampling)
+            if rate is not None and random.random() >= rate:
+                self.sampled_out += 1
+                return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only resolve what cannot cross threads (arguments, exception
+        # objects); formatting happens on the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _LoggingState:
+    def __init__(self):
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.output: Optional[logging.Handler] = None
+        self.filter: Optional[ContextFilter] = None
+        self.fork_hook = False
+
+
+_state = _LoggingState()
+
+
+def _start_listener():
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _state.handler.queue = log_queue
+    _state.listener = logging.handlers.QueueListener(log_queue, _state.output, respect_handler_level=False)
+    _state.listener.start()
+
+
+def _restart_after_fork():
+    # Threads do not survive fork, and the parent's queue lock may have been
+    # held at that moment: forked workers get a fresh queue and listener
+    if _state.handler is not None:
+        _start_listener()
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Route all logging (including uvicorn's) through the background queue.
+    Safe to call more than once; later calls only update levels.
+    """
+    root = logging.getLogger()
+    root.setLevel(level)
+    for name, category_level in _parse_categories(LOG_LEVELS, str.upper):
+        logging.getLogger(name).setLevel(category_level)
+    for name in UVICORN_LOGGERS:
+        logging.getLogger(name).handlers.clear()
+        logging.getLogger(name).propagate = True
+    if _state.handler is not None:
+        return
+
+    _state.output = logging.StreamHandler(sys.stdout)
+    _state.output.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    _state.filter = ContextFilter(_parse_categories(LOG_SAMPLING, float))
+    _state.handler = NonBlockingQueueHandler(queue.Queue())
+    _state.handler.addFilter(_state.filter)
+    _start_listener()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_state.handler)
+    if not _state.fork_hook:
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        atexit.register(shutdown_logging)
+        _state.fork_hook = True
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread."""
+    if _state.listener is not None:
+        _state.listener.stop()
+        _state.listener = None
+
+
+def logging_stats() -> Dict[str, int]:
+    if _state.handler is None:
+        return {"configured": 0}
+    return {
+        "configured": 1,
+        "queued": _state.handler.queue.qsize(),
+        "dropped": _state.handler.dropped,
+        "sampled_out": _state.filter.sampled_out,
+    }
@@ -0,0 +1,197 @@
+"""
+Production traffic capture
+TrafficCaptureMiddleware samples HTTP requests (TRAFFIC_CAPTURE_RATE) and
+hands them to the recorder here: endpoint, sanitized request body, status,
+timings and the generation backends used. Records are flushed in the
+background to gzip-compressed JSONL files, one per hour and worker
+process, which `python -m benchmarks.replay_traffic` re-issues against a
+test deployment to size instances.
+
+Sanitizing: session ids and client identities become stable pseudonyms (so
+replayed sessions and per-client limits behave as captured), credentials
+are dropped, and with TRAFFIC_MASK_TEXT student text is replaced word by
+word with pseudo-words of the same length, so prompt sizes and repeated
+questions (cache hits) survive but the content does not.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Share of requests captured; 0 disables capture
+TRAFFIC_CAPTURE_RATE = float(os.getenv("TRAFFIC_CAPTURE_RATE", "0"))
+TRAFFIC_CAPTURE_DIR = os.getenv(
+    "TRAFFIC_CAPTURE_DIR",
+    os.path.join(os.path.dirname(__file__), "../../data/traffic"),
+)
+# Larger request bodies (bulk uploads) are recorded without the body
+TRAFFIC_CAPTURE_MAX_BODY = int(os.getenv("TRAFFIC_CAPTURE_MAX_BODY", str(256 * 1024)))
+TRAFFIC_FLUSH_INTERVAL = float(os.getenv("TRAFFIC_FLUSH_INTERVAL", "10"))
+# 0 keeps student text verbatim (only for captures that stay on trusted hosts)
+TRAFFIC_MASK_TEXT = os.getenv("TRAFFIC_MASK_TEXT", "1") == "1"
+# Not worth replaying: docs, admin and diagnostics endpoints, health checks
+TRAFFIC_SKIP_PATHS = {"/", "/docs", "/openapi.json", "/redoc", "/usage", "/admission"}
+TRAFFIC_SKIP_PREFIXES = ("/debug/",)
+
+# Request headers that change how the server handles a request
+CAPTURED_HEADERS = ("accept", "accept-encoding", "content-type", "x-priority", "x-request-timeout", "x-include-usage")
+# Body fields holding student text
+TEXT_FIELDS = {"text", "prompt"}
+# Body fields identifying a user's state
+PSEUDONYM_FIELDS = {"session_id"}
+# Body fields never written to disk
+SECRET_FIELDS = {"api_key", "token", "password", "authorization"}
+
+_ALPHABET = "etaoinshrdlucmfwypvbgk"
+
+
+def should_capture(path: str) -> bool:
+    """Sample a request to `path` at TRAFFIC_CAPTURE_RATE."""
+    if TRAFFIC_CAPTURE_RATE <= 0 or path in TRAFFIC_SKIP_PATHS or path.startswith(TRAFFIC_SKIP_PREFIXES):
+        return False
+    return TRAFFIC_CAPTURE_RATE >= 1 or random.random() < TRAFFIC_CAPTURE_RATE
+
+
+def pseudonym(value: str, prefix: str = "") -> str:
+    return prefix + hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+def _mask_word(word: str) -> str:
+    digest = hashlib.sha256(word.encode("utf-8")).digest()
+    return "".join(_ALPHABET[digest[i % len(digest)] % len(_ALPHABET)] for i in range(len(word)))
+
+
+def mask_text(text: str) -> str:
+    """Replace every word with a pseudo-word of the same length (the same word maps to the same pseudo-word)."""
+    return " ".join(_mask_word(word) for word in text.split(" "))
+
+
+def sanitize(value: Any, mask: bool = TRAFFIC_MASK_TEXT, field: Optional[str] = None) -> Any:
+    """Sanitized copy of a decoded JSON request body (see the module docstring)."""
+    if isinstance(value, dict):
+        return {
+            key: sanitize(item, mask, key)
+            for key, item in value.items()
+            if key.lower() not in SECRET_FIELDS
+        }
+    if isinstance(value, list):
+        return [sanitize(item, mask, field) for item in value]
+    if isinstance(value, str):
+        if field in PSEUDONYM_FIELDS:
+            return pseudonym(value, "s-")
+        if mask and field in TEXT_FIELDS:
+            return mask_text(value)
+    return value
+
+
+def sanitize_path(path: str) -> str:
+    """Pseudonymize session ids in /sessions/{session_id} paths."""
+    prefix = "/sessions/"
+    if path.startswith(prefix) and len(path) > len(prefix):
+        return prefix + pseudonym(path[len(prefix):], "s-")
+    return path
+
+
+def decode_body(body: bytes, content_type: str) -> Any:
+    """Sanitized JSON body, or None for empty or non-JSON bodies."""
+    if not body or "json" not in content_type:
+        return None
+    try:
+        return sanitize(json.loads(body))
+    except ValueError:
+        return None
+
+
+def summarize_usage(records: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Generation backends, calls and tokens of a request's usage records."""
+    if not records:
+        return None
+    return {
+        "calls": len(records),
+        "backends": sorted({r["backend"] for r in records}),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+        "completion_tokens": sum(r["completion_tokens"] for r in records),
+        "latency_s": round(sum(r["latency_s"] for r in records), 3),
+        "errors": sum(1 for r in records if r["error"]),
+    }
+
+
+def read_captures(paths: List[str]) -> List[Dict[str, Any]]:
+    """Records from capture files (gzip or plain JSONL), oldest first."""
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+class TrafficRecorder:
+    """Buffers captured requests and appends them to hourly .jsonl.gz files from a background thread."""
+
+    def __init__(self, capture_dir: str = TRAFFIC_CAPTURE_DIR, flush_interval: float = TRAFFIC_FLUSH_INTERVAL):
+        self.capture_dir = os.path.abspath(capture_dir)
+        self.flush_interval = flush_interval
+        self.captured = 0
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def record(self, record: Dict[str, Any]):
+        with self._lock:
+            self._pending.append(record)
+            self.captured += 1
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flusher is None and self.flush_interval > 0:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="traffic-flush", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def current_path(self) -> str:
+        # One file per worker process: concurrent appends to one gzip file would interleave
+        return os.path.join(self.capture_dir, f"traffic-{time.strftime('%Y%m%d%H')}-{os.getpid()}.jsonl.gz")
+
+    def flush(self) -> int:
+        """Append pending records to the current capture file; returns the number written."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        path = self.current_path()
+        try:
+            os.makedirs(self.capture_dir, exist_ok=True)
+            # Each flush adds a gzip member; readers see one continuous stream
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in pending))
+        except OSError as e:
+            logger.warning(f"Could not write traffic capture {path}: {e}")
+            with self._lock:
+                self._pending[:0] = pending
+            return 0
+        return len(pending)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+traffic_recorder = TrafficRecorder()
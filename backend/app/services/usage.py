@@ -0,0 +1,208 @@
+"""
+Token usage and cost accounting
+Every generation reports its usage (backend, prompt and completion
+tokens, latency). Usage is aggregated in memory per endpoint, intent,
+client and backend, and the raw records are flushed periodically to an
+append-only JSONL log for offline analysis.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+USAGE_LOG_PATH = os.getenv(
+    "USAGE_LOG_PATH",
+    os.path.join(os.path.dirname(__file__), "../../data/usage.jsonl"),
+)
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+# Distinct clients tracked in memory; the rest are folded into "other"
+USAGE_MAX_CLIENTS = int(os.getenv("USAGE_MAX_CLIENTS", "5000"))
+# "backend:input_usd_per_million:output_usd_per_million,..."
+USAGE_PRICES = os.getenv("USAGE_PRICES", "groq:0.05:0.08,openai_compat:0:0,local:0:0")
+
+DIMENSIONS = ("endpoint", "intent", "client", "backend")
+
+
+def _parse_prices(raw: str) -> Dict[str, tuple]:
+    prices = {}
+    for item in raw.split(","):
+        parts = item.strip().split(":")
+        if len(parts) == 3:
+            prices[parts[0]] = (float(parts[1]), float(parts[2]))
+    return prices
+
+
+_prices = _parse_prices(USAGE_PRICES)
+
+# Who the current generation is for; set per request by UsageMiddleware
+_request_tags: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar(
+    "usage_tags", default={"endpoint": "background", "client": "internal"}
+)
+# Usage records of the current request, when the client asked for them
+_request_records: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar(
+    "usage_records", default=None
+)
+
+
+@contextmanager
+def tag_usage(endpoint: str, client: Optional[str] = None, collect: bool = False) -> Iterator[Optional[List[Dict[str, Any]]]]:
+    """
+    Attribute generations in the enclosed block to `endpoint` and `client`.
+
+    Yields the list the block's usage records are appended to when
+    `collect` is set (else None).
+    """
+    records: Optional[List[Dict[str, Any]]] = [] if collect else None
+    tags_token = _request_tags.set({"endpoint": endpoint, "client": client or "internal"})
+    records_token = _request_records.set(records)
+    try:
+        yield records
+    finally:
+        _request_tags.reset(tags_token)
+        _request_records.reset(records_token)
+
+
+def estimate_cost(backend: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = _prices.get(backend, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def _empty_bucket() -> Dict[str, float]:
+    return {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_s": 0.0, "cost_usd": 0.0}
+
+
+class UsageAccountant:
+    """Thread-safe in-memory usage aggregates with a periodic JSONL flush."""
+
+    def __init__(self, log_path: str = USAGE_LOG_PATH, flush_interval: float = USAGE_FLUSH_INTERVAL):
+        self.log_path = os.path.abspath(log_path)
+        self.flush_interval = flush_interval
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._totals = _empty_bucket()
+        self._by: Dict[str, Dict[str, Dict[str, float]]] = {dimension: {} for dimension in DIMENSIONS}
+        self._pending: List[Dict[str, Any]] = []
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def record(self, usage: Dict[str, Any]):
+        """Account one generation; `usage` is the dictionary filled by a backend."""
+        tags = _request_tags.get()
+        backend = usage.get("backend", "unknown")
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        latency = float(usage.get("latency_s") or 0.0)
+        record = {
+            "ts": round(time.time(), 3),
+            "endpoint": tags["endpoint"],
+            "client": tags["client"],
+            "intent": usage.get("intent") or "none",
+            "backend": backend,
+            "model": usage.get("model"),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_s": round(latency, 4),
+            "tokens_per_s": round(completion_tokens / latency, 1) if latency > 0 else None,
+            "finish_reason": usage.get("finish_reason"),
+            "error": bool(usage.get("error")),
+            "cost_usd": estimate_cost(backend, prompt_tokens, completion_tokens),
+        }
+
+        records = _request_records.get()
+        if records is not None:
+            records.append(record)
+
+        with self._lock:
+            for dimension in DIMENSIONS:
+                groups = self._by[dimension]
+                key = record[dimension]
+                if dimension == "client" and key not in groups and len(groups) >= USAGE_MAX_CLIENTS:
+                    key = "other"
+                self._add(groups.setdefault(key, _empty_bucket()), record)
+            self._add(self._totals, record)
+            self._pending.append(record)
+        self._ensure_flusher()
+
+    @staticmethod
+    def _add(bucket: Dict[str, float], record: Dict[str, Any]):
+        bucket["calls"] += 1
+        bucket["errors"] += int(record["error"])
+        bucket["prompt_tokens"] += record["prompt_tokens"]
+        bucket["completion_tokens"] += record["completion_tokens"]
+        bucket["latency_s"] += record["latency_s"]
+        bucket["cost_usd"] += record["cost_usd"]
+
+    def _ensure_flusher(self):
+        if self._flusher is None and self.flush_interval > 0:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="usage-flush", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """Append pending records to the usage log; returns the number written."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in pending))
+        except OSError as e:
+            logger.warning(f"Could not write usage log {self.log_path}: {e}")
+            with self._lock:
+                self._pending[:0] = pending
+            return 0
+        return len(pending)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    @staticmethod
+    def _summarize(bucket: Dict[str, float]) -> Dict[str, Any]:
+        summary = dict(bucket)
+        summary["latency_s"] = round(bucket["latency_s"], 3)
+        summary["cost_usd"] = round(bucket["cost_usd"], 6)
+        summary["avg_latency_s"] = round(bucket["latency_s"] / bucket["calls"], 3) if bucket["calls"] else None
+        summary["tokens_per_s"] = (
+            round(bucket["completion_tokens"] / bucket["latency_s"], 1) if bucket["latency_s"] > 0 else None
+        )
+        return summary
+
+    def summary(self, by: str = "endpoint", top: int = 20, sort: str = "cost_usd") -> Dict[str, Any]:
+        """
+        Aggregated usage grouped by one dimension, most expensive first.
+
+        Args:
+            by: "endpoint", "intent", "client" or "backend"
+            top: Number of groups to return
+            sort: Field to sort the groups by (e.g. "cost_usd", "completion_tokens", "calls")
+        """
+        if by not in DIMENSIONS:
+            raise ValueError(f"'by' must be one of {', '.join(DIMENSIONS)}")
+        with self._lock:
+            groups = {key: self._summarize(bucket) for key, bucket in self._by[by].items()}
+            totals = self._summarize(self._totals)
+        ranked = sorted(groups.items(), key=lambda item: item[1].get(sort) or 0, reverse=True)[:top]
+        return {
+            "since": self.started_at,
+            "totals": totals,
+            "by": by,
+            "groups": [{by: key, **values} for key, values in ranked],
+        }
+
+
+usage_accountant = UsageAccountant()
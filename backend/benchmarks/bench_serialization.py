@@ -0,0 +1,112 @@
+"""
+Serialization and transfer benchmark for quiz/notes payloads
+
+Compares stdlib json, orjson and MessagePack encode time and payload size,
+then the size of each after gzip and brotli, for a realistic 20-question
+bilingual quiz response. Optional libraries that are not installed are
+skipped.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_serialization [--questions 20] [--iterations 2000]
+"""
+
+import argparse
+import gzip
+import json
+import time
+
+from app.middleware import BROTLI_QUALITY, GZIP_LEVEL
+from app.services.ml.quiz_parser import format_quiz_text
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Typical slow rural mobile link (bytes per second)
+LINK_BYTES_PER_SEC = 256 * 1024 / 8
+
+
+def quiz_payload(num_questions: int):
+    questions = []
+    local_questions = []
+    for i in range(num_questions):
+        questions.append({
+            "question": f"Which of the following best describes stage {i + 1} of photosynthesis in green plants?",
+            "options": [
+                "Light energy is absorbed by chlorophyll in the thylakoid membranes",
+                "Glucose is broken down to release energy in the mitochondria",
+                "Carbon dioxide is released into the atmosphere through the stomata",
+                "Water is transported from the roots to the leaves through the xylem",
+            ],
+            "correct_index": i % 4,
+            "explanation": "Chlorophyll captures light energy, which drives the splitting of water and the production of ATP and NADPH used in the Calvin cycle.",
+        })
+        local_questions.append({
+            "question": f"हरे पौधों में प्रकाश संश्लेषण के चरण {i + 1} का सबसे अच्छा वर्णन निम्नलिखित में से कौन सा है?",
+            "options": [
+                "थायलाकोइड झिल्लियों में क्लोरोफिल द्वारा प्रकाश ऊर्जा अवशोषित की जाती है",
+                "माइटोकॉन्ड्रिया में ऊर्जा मुक्त करने के लिए ग्लूकोज को तोड़ा जाता है",
+                "रंध्रों के माध्यम से कार्बन डाइऑक्साइड वायुमंडल में छोड़ी जाती है",
+                "जाइलम के माध्यम से जड़ों से पत्तियों तक पानी पहुँचाया जाता है",
+            ],
+            "correct_index": i % 4,
+            "explanation": "क्लोरोफिल प्रकाश ऊर्जा को ग्रहण करता है, जो पानी के विभाजन और केल्विन चक्र में उपयोग होने वाले एटीपी और एनएडीपीएच के उत्पादन को संचालित करती है।",
+        })
+    return {
+        "answers": [{"text": format_quiz_text(questions), "score": 0.95}],
+        "questions": questions,
+        "local_questions": local_questions,
+    }
+
+
+def time_encoder(encode, payload, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(payload)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    payload = quiz_payload(args.questions)
+    encoders = {"json (stdlib)": lambda p: json.dumps(p).encode("utf-8")}
+    if orjson is not None:
+        encoders["orjson"] = orjson.dumps
+    if msgpack is not None:
+        encoders["msgpack"] = lambda p: msgpack.packb(p, use_bin_type=True)
+
+    print(f"Quiz payload: {args.questions} questions, {args.iterations} iterations\n")
+    print(f"{'encoder':<16}{'encode µs':>11}{'raw B':>9}{'gzip B':>9}{'br B':>9}{'transfer ms':>13}")
+    for name, encode in encoders.items():
+        encode_us = time_encoder(encode, payload, args.iterations)
+        raw = encode(payload)
+        gzipped = gzip.compress(raw, compresslevel=GZIP_LEVEL)
+        brotlied = brotli.compress(raw, quality=BROTLI_QUALITY) if brotli is not None else None
+        best = len(brotlied) if brotlied is not None else len(gzipped)
+        transfer_ms = best / LINK_BYTES_PER_SEC * 1000
+        print(
+            f"{name:<16}{encode_us:>11.1f}{len(raw):>9}{len(gzipped):>9}"
+            f"{(len(brotlied) if brotlied is not None else '-'):>9}{transfer_ms:>13.1f}"
+        )
+
+    baseline = json.dumps(payload).encode("utf-8")
+    print(f"\nUncompressed stdlib JSON transfer: {len(baseline) / LINK_BYTES_PER_SEC * 1000:.1f} ms at 256 kbit/s")
+
+
+if __name__ == "__main__":
+    main()
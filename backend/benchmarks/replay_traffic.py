@@ -0,0 +1,281 @@
+"""
+Replay captured production traffic against a deployment
+
+Re-issues requests recorded by the traffic capture middleware
+(TRAFFIC_CAPTURE_RATE, see app/services/traffic.py) at their original
+spacing, or compressed by --speed, and compares throughput and per-endpoint
+latency with what was captured. Use it to size instances before exam
+season: replay a busy evening at 2-3x against a candidate configuration
+and see where the p95 goes.
+
+The replay is open-loop: each request is sent at its scheduled time
+whether or not earlier ones finished, and its latency counts from that
+time, so a saturated server shows up as latency instead of a slower
+request rate. Captured clients are replayed with distinct API keys, so
+per-client admission limits apply as in production. Captured chat sessions
+are recreated (POST /sessions) under the replayed client on first use.
+
+With --fake-llm a local server is started with the simulated LLM backend
+(GENERATION_BACKENDS=fake), so a replay measures the API tier without
+provider cost or provider latency variance; the local models (intent,
+translation) still run.
+
+Usage (from the backend directory):
+    python -m benchmarks.replay_traffic data/traffic [--target http://staging:8000] [--speed 2]
+    python -m benchmarks.replay_traffic data/traffic --fake-llm --workers 4 --report replay.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.services.traffic import read_captures
+
+# Worker startup (model preloading) can take a while
+SERVER_START_TIMEOUT = 300
+
+
+def capture_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "traffic-*.jsonl*")))
+        else:
+            files.append(path)
+    return files
+
+
+def replayable(record: Dict[str, Any]) -> bool:
+    # Requests whose body was too large or not JSON cannot be rebuilt
+    if record.get("body_truncated"):
+        return False
+    return record["method"] in ("GET", "DELETE") or record.get("body") is not None
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+async def _create_session(client: httpx.AsyncClient, api_key: str, captured_id: str) -> str:
+    try:
+        response = await client.post("/sessions", headers={"x-api-key": api_key})
+        response.raise_for_status()
+        return response.json()["session_id"]
+    except (httpx.HTTPError, ValueError, KeyError):
+        return captured_id
+
+
+def replay_session(client: httpx.AsyncClient, api_key: str, captured_id: str, sessions: Dict[str, asyncio.Future]) -> asyncio.Future:
+    """Server-issued id standing in for a captured (pseudonymized) session id."""
+    if captured_id not in sessions:
+        sessions[captured_id] = asyncio.ensure_future(_create_session(client, api_key, captured_id))
+    return sessions[captured_id]
+
+
+async def replay_one(
+    client: httpx.AsyncClient, record: Dict[str, Any], scheduled: float, sessions: Dict[str, asyncio.Future]
+) -> Dict[str, Any]:
+    headers = dict(record.get("headers") or {})
+    headers["x-api-key"] = f"replay-{record['client']}"
+    path = record["path"]
+    body = record.get("body") if record["method"] not in ("GET", "DELETE") else None
+    if path.startswith("/sessions/"):
+        path = "/sessions/" + await replay_session(client, headers["x-api-key"], path[len("/sessions/"):], sessions)
+    if isinstance(body, dict) and body.get("session_id"):
+        body = {**body, "session_id": await replay_session(client, headers["x-api-key"], body["session_id"], sessions)}
+    url = path + (f"?{record['query']}" if record.get("query") else "")
+    result = {"path": record["path"], "captured": record, "status": None, "ttfb_s": None}
+    try:
+        async with client.stream(record["method"], url, headers=headers, json=body) as response:
+            result["status"] = response.status_code
+            async for _ in response.aiter_raw():
+                if result["ttfb_s"] is None:
+                    result["ttfb_s"] = time.perf_counter() - scheduled
+    except httpx.HTTPError as e:
+        result["error"] = type(e).__name__
+    result["latency_s"] = time.perf_counter() - scheduled
+    return result
+
+
+async def replay(records: List[Dict[str, Any]], target: str, speed: float, timeout: float, max_connections: int) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+        first_ts = records[0]["ts"]
+        start = time.perf_counter()
+        tasks = []
+        sessions: Dict[str, asyncio.Future] = {}
+        lag = 0.0
+        for record in records:
+            scheduled = start + (record["ts"] - first_ts) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lag = max(lag, -delay)
+            tasks.append(asyncio.create_task(replay_one(client, record, scheduled, sessions)))
+        results = await asyncio.gather(*tasks)
+        return {"results": results, "duration_s": time.perf_counter() - start, "max_schedule_lag_s": lag}
+
+
+def _stats(values: List[float]) -> Dict[str, Optional[float]]:
+    return {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+
+
+def build_report(records: List[Dict[str, Any]], run: Dict[str, Any], speed: float) -> Dict[str, Any]:
+    captured_span = max(records[-1]["ts"] - records[0]["ts"], 1e-9)
+    endpoints: Dict[str, Dict[str, List]] = defaultdict(lambda: defaultdict(list))
+    statuses: Counter = Counter()
+    counts: Counter = Counter()
+    for result in run["results"]:
+        captured = result["captured"]
+        group = endpoints[result["path"]]
+        counts[result["path"]] += 1
+        if captured.get("status") is not None:
+            group["captured"].append(captured["latency_s"])
+        if captured.get("ttfb_s") is not None:
+            group["captured_ttfb"].append(captured["ttfb_s"])
+        status = result["status"] or result.get("error", "error")
+        statuses[str(status)] += 1
+        if result["status"] is not None and result["status"] < 500:
+            group["replay"].append(result["latency_s"])
+            if result["ttfb_s"] is not None:
+                group["replay_ttfb"].append(result["ttfb_s"])
+        if result["status"] != captured.get("status"):
+            group["status_changed"].append(status)
+
+    per_endpoint = {}
+    for path, group in sorted(endpoints.items()):
+        captured_stats = _stats(group["captured"])
+        replay_stats = _stats(group["replay"])
+        per_endpoint[path] = {
+            "requests": counts[path],
+            "replayed_ok": len(group["replay"]),
+            "status_changed": len(group["status_changed"]),
+            "captured": captured_stats,
+            "replay": replay_stats,
+            "captured_ttfb_p50": percentile(group["captured_ttfb"], 50),
+            "replay_ttfb_p50": percentile(group["replay_ttfb"], 50),
+            "p95_change": (
+                replay_stats["p95"] / captured_stats["p95"] - 1
+                if replay_stats["p95"] is not None and captured_stats["p95"]
+                else None
+            ),
+        }
+    completed = sum(1 for result in run["results"] if result["status"] is not None)
+    return {
+        "requests": len(records),
+        "speed": speed,
+        "captured_span_s": captured_span,
+        "captured_rps": len(records) / captured_span,
+        "target_rps": len(records) / captured_span * speed,
+        "replay_duration_s": run["duration_s"],
+        "replay_rps": completed / max(run["duration_s"], 1e-9),
+        "max_schedule_lag_s": run["max_schedule_lag_s"],
+        "statuses": dict(statuses),
+        "endpoints": per_endpoint,
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"{report['requests']} requests captured over {report['captured_span_s']:.0f}s "
+        f"({report['captured_rps']:.2f} req/s), replayed at {report['speed']}x"
+    )
+    print(
+        f"Throughput: {report['replay_rps']:.2f} req/s achieved, {report['target_rps']:.2f} req/s scheduled "
+        f"(max client lag {report['max_schedule_lag_s'] * 1000:.0f} ms)"
+    )
+    print(f"Statuses: {', '.join(f'{k}: {v}' for k, v in sorted(report['statuses'].items()))}\n")
+    print(
+        f"{'endpoint':<26}{'n':>6}{'cap p50':>9}{'rep p50':>9}{'cap p95':>9}{'rep p95':>9}"
+        f"{'rep p99':>9}{'Δp95':>8}{'ttfb':>7}{'status≠':>9}"
+    )
+    for path, stats in report["endpoints"].items():
+        change = f"{stats['p95_change'] * 100:+.0f}%" if stats["p95_change"] is not None else "-"
+        print(
+            f"{path[:25]:<26}{stats['requests']:>6}{_ms(stats['captured']['p50']):>9}{_ms(stats['replay']['p50']):>9}"
+            f"{_ms(stats['captured']['p95']):>9}{_ms(stats['replay']['p95']):>9}{_ms(stats['replay']['p99']):>9}"
+            f"{change:>8}{_ms(stats['replay_ttfb_p50']):>7}{stats['status_changed']:>9}"
+        )
+    print("\nLatencies in ms (cap = captured, rep = replay; ttfb = replay p50 time to first byte)")
+
+
+def start_fake_llm_server(port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, "GENERATION_BACKENDS": "fake", "TRAFFIC_CAPTURE_RATE": "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--port", str(port), "--workers", str(workers)],
+        env=env,
+    )
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"Server did not start within {SERVER_START_TIMEOUT}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("captures", nargs="+", help="Capture files or directories")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="Base URL of the deployment to replay against")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay rate multiplier (2 = twice as fast)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--endpoint", action="append", help="Only replay these paths (repeatable)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--max-connections", type=int, default=512)
+    parser.add_argument("--fake-llm", action="store_true", help="Start a local server with the simulated LLM backend as the target")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the --fake-llm server")
+    parser.add_argument("--workers", type=int, default=2, help="Workers of the --fake-llm server")
+    parser.add_argument("--report", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    records = [r for r in read_captures(capture_files(args.captures)) if replayable(r)]
+    if args.endpoint:
+        records = [r for r in records if r["path"] in args.endpoint]
+    records = records[:args.limit] if args.limit else records
+    if not records:
+        sys.exit("No replayable requests in the captures")
+
+    server = None
+    target = args.target
+    if args.fake_llm:
+        server = start_fake_llm_server(args.port, args.workers)
+        target = f"http://127.0.0.1:{args.port}"
+    try:
+        run = asyncio.run(replay(records, target, args.speed, args.timeout, args.max_connections))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = build_report(records, run, args.speed)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
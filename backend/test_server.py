@@ -305,6 +305,43 @@ def test_translate():
     return all(results)
 
 
+def test_jobs():
+    """Test background job submission and polling"""
+    print_header("Testing Background Jobs")
+    
+    try:
+        payload = {
+            "tasks": [
+                {"kind": "notes", "params": {"text": "Photosynthesis", "max_length": 300}},
+                {"kind": "quiz", "params": {"text": "Photosynthesis", "num_questions": 3}},
+            ]
+        }
+        
+        response = requests.post(f"{BASE_URL}/jobs", json=payload, timeout=TIMEOUT)
+        if response.status_code != 202:
+            print_error(f"Job submission failed: {response.status_code}")
+            return False
+        
+        job_id = response.json()['job_id']
+        print_info(f"Submitted job {job_id}, polling for completion...")
+        
+        deadline = time.time() + TIMEOUT * 4
+        while time.time() < deadline:
+            job = requests.get(f"{BASE_URL}/jobs/{job_id}", timeout=TIMEOUT).json()
+            if job['status'] in ("completed", "failed"):
+                break
+            time.sleep(2)
+        
+        if job['status'] == "completed":
+            print_success(f"Job completed: {job['completed']}/{job['total']} tasks")
+            return True
+        print_error(f"Job did not complete: {job['status']}")
+        return False
+    except Exception as e:
+        print_error(f"Background job error: {str(e)}")
+        return False
+
+
 def run_all_tests():
     """Run all tests"""
     print(f"\n{Colors.BOLD}{Colors.BLUE}")
@@ -324,6 +361,7 @@ def run_all_tests():
         ("Notes Generation", test_generate_notes),
         ("Quiz Generation", test_generate_quiz),
         ("Translation", test_translate),
+        ("Background Jobs", test_jobs),
     ]
     
     results = {}
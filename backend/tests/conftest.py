@@ -0,0 +1,11 @@
+"""
+Unit tests for the pure backend modules (no server or model downloads).
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from app.services import admission
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def queue_up(controller, requests, grants):
+    """Queue (client, weight, cost) requests in order; grants records who got a slot."""
+
+    async def one(name, client, weight, cost):
+        await controller.acquire(client, weight, cost)
+        grants.append(name)
+
+    tasks = []
+    for name, client, weight, cost in requests:
+        tasks.append(asyncio.ensure_future(one(name, client, weight, cost)))
+        # Let each request reach the queue before the next one
+        await asyncio.sleep(0)
+    return tasks
+
+
+async def drain(controller, tasks, grants):
+    while len(grants) < len(tasks):
+        controller.release(0.0)
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+def test_admits_immediately_below_capacity():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=2)
+        await controller.acquire("a", 1.0, 1.0)
+        await controller.acquire("b", 1.0, 1.0)
+        assert controller.stats()["running"] == 2
+        controller.release(0.0)
+        assert controller.stats()["running"] == 1
+
+    run(scenario())
+
+
+def test_empty_bucket_is_rate_limited():
+    controller = AdmissionController()
+    cost = admission.ADMISSION_BURST / 4
+    for _ in range(4):
+        controller.check_rate("a", 1.0, cost)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check_rate("a", 1.0, cost)
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after > 0
+    # Other clients have their own bucket
+    controller.check_rate("b", 1.0, cost)
+
+
+def test_client_arriving_late_is_not_queued_behind_a_burst():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        await controller.acquire("holder", 1.0, 1.0)
+        grants = []
+        requests = [("a1", "a", 1.0, 1.0), ("a2", "a", 1.0, 1.0), ("a3", "a", 1.0, 1.0), ("b1", "b", 1.0, 1.0)]
+        tasks = await queue_up(controller, requests, grants)
+        await drain(controller, tasks, grants)
+        return grants
+
+    assert run(scenario()) == ["a1", "b1", "a2", "a3"]
+
+
+def test_weighted_client_gets_a_larger_share():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        await controller.acquire("holder", 1.0, 1.0)
+        grants = []
+        requests = [(f"a{i}", "a", 1.0, 1.0) for i in range(3)] + [(f"k{i}", "key", 2.0, 1.0) for i in range(3)]
+        tasks = await queue_up(controller, requests, grants)
+        await drain(controller, tasks, grants)
+        return grants
+
+    # Finish times: a 1, 2, 3; key 0.5, 1, 1.5
+    assert run(scenario()) == ["k0", "a0", "k1", "k2", "a1", "a2"]
+
+
+def test_expensive_requests_yield_to_cheap_ones():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        await controller.acquire("holder", 1.0, 1.0)
+        grants = []
+        requests = [("quiz1", "bulk", 1.0, 5.0), ("quiz2", "bulk", 1.0, 5.0), ("answer", "student", 1.0, 1.0)]
+        tasks = await queue_up(controller, requests, grants)
+        await drain(controller, tasks, grants)
+        return grants
+
+    assert run(scenario()) == ["answer", "quiz1", "quiz2"]
+
+
+def test_cancelled_waiter_is_skipped():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        await controller.acquire("holder", 1.0, 1.0)
+        grants = []
+        tasks = await queue_up(controller, [("a", "a", 1.0, 1.0), ("b", "b", 1.0, 1.0)], grants)
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        controller.release(0.0)
+        await tasks[1]
+        assert grants == ["b"]
+        assert controller.stats()["running"] == 1
+
+    run(scenario())
+
+
+def test_queue_wait_is_shed(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE_WAIT", 0.05)
+
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        await controller.acquire("holder", 1.0, 1.0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("a", 1.0, 1.0)
+        assert rejected.value.status_code == 503
+        assert controller.stats()["shed_queue"] == 1
+        # The slot stays with its holder and is freed normally
+        controller.release(0.0)
+        assert controller.stats()["running"] == 0
+
+    run(scenario())
@@ -0,0 +1,65 @@
+import pytest
+
+from app.services.ml.bilingual import (
+    BILINGUAL_MAX_TOKENS,
+    BILINGUAL_TOKEN_FACTOR,
+    bilingual_max_tokens,
+    is_valid_local_text,
+    parse_bilingual,
+    script_ratio,
+)
+
+
+def test_parse_plain_json():
+    raw = '{"english": " Water boils at 100 °C. ", "local": " पानी 100 °C पर उबलता है। "}'
+    assert parse_bilingual(raw) == ("Water boils at 100 °C.", "पानी 100 °C पर उबलता है।")
+
+
+def test_parse_fenced_json_with_surrounding_text():
+    raw = 'Here you go:\n```json\n{"english": "Hello", "local": "నమస్కారం"}\n```'
+    assert parse_bilingual(raw) == ("Hello", "నమస్కారం")
+
+
+def test_parse_missing_or_non_string_local():
+    assert parse_bilingual('{"english": "Hello"}') == ("Hello", None)
+    assert parse_bilingual('{"english": "Hello", "local": null}') == ("Hello", None)
+
+
+@pytest.mark.parametrize("raw", [
+    "Just an English answer.",
+    '{"english": "unterminated',
+    '{"local": "नमस्ते"}',
+    '{"english": "   "}',
+    '["english", "local"]',
+])
+def test_parse_rejects_unusable_responses(raw):
+    with pytest.raises(ValueError):
+        parse_bilingual(raw)
+
+
+def test_script_ratio():
+    assert script_ratio("नमस्ते", "hi") == 1.0
+    assert script_ratio("Hello", "hi") == 0.0
+    # Numbers, spaces and punctuation are not letters
+    assert script_ratio("नमस्ते 123!", "hi") == 1.0
+    assert script_ratio("", "hi") == 0.0
+    # Half the letters are Devanagari: "ab" + two Devanagari code points
+    assert script_ratio("ab पा", "hi") == 0.5
+
+
+def test_script_ratio_is_per_language():
+    tamil = "வணக்கம்"
+    assert script_ratio(tamil, "ta") == 1.0
+    assert script_ratio(tamil, "hi") == 0.0
+
+
+def test_is_valid_local_text():
+    assert is_valid_local_text("प्रकाश संश्लेषण (photosynthesis) पौधों में होता है", "hi")
+    assert not is_valid_local_text("Photosynthesis happens in plants", "hi")
+    assert not is_valid_local_text("   ", "hi")
+    assert not is_valid_local_text(None, "hi")
+
+
+def test_bilingual_max_tokens_is_capped():
+    assert bilingual_max_tokens(100) == int(100 * BILINGUAL_TOKEN_FACTOR)
+    assert bilingual_max_tokens(10 ** 6) == BILINGUAL_MAX_TOKENS
@@ -0,0 +1,99 @@
+import pytest
+
+# build_content imports the answer generator and translator model modules
+pytest.importorskip("torch")
+
+from app import build_content  # noqa: E402
+from app.services.ml import translator  # noqa: E402
+
+NOTES = "# Photosynthesis\n\n- Plants make food. They need light.\n1. Leaves are green"
+QUESTION = {"question": "What do plants make?", "options": ["Food", "Rocks", "Air", "Salt"],
+            "correct_index": 0, "explanation": "Plants make food."}
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.puts = []
+
+    def put(self, kind, subject, topic, language, payload):
+        self.puts.append((kind, language, payload))
+
+
+@pytest.fixture
+def fake_batch(monkeypatch):
+    """translate_batch stand-in that tags each text with the target language."""
+    calls = []
+
+    def translate_batch(texts, target_lang, source_lang="en", max_length=200, **kwargs):
+        calls.append((list(texts), max_length))
+        return [f"<{target_lang}>{text}" if text else "" for text in texts]
+
+    monkeypatch.setattr(translator, "translate_batch", translate_batch)
+    monkeypatch.setattr(build_content, "translate_batch", translate_batch)
+    return calls
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    monkeypatch.setattr(build_content, "generate_notes", lambda *args, **kwargs: [{"text": NOTES, "score": 0.95}])
+    monkeypatch.setattr(
+        build_content,
+        "generate_quiz_structured",
+        lambda *args, **kwargs: {"answers": [{"text": "Q: ...", "score": 0.95}], "questions": [QUESTION]},
+    )
+
+
+def test_translate_document_keeps_lines_and_markers(fake_batch):
+    translated = translator.translate_document(NOTES, "hi")
+    assert translated == (
+        "# <hi>Photosynthesis\n\n- <hi>Plants make food. <hi>They need light.\n1. <hi>Leaves are green"
+    )
+    # One batched call over every sentence, each with a full sentence budget
+    assert fake_batch == [(
+        ["Photosynthesis", "Plants make food.", "They need light.", "Leaves are green"],
+        translator.TRANSLATE_SENTENCE_MAX_LENGTH,
+    )]
+
+
+def test_quiz_is_translated_in_one_batch(fake_batch):
+    [local] = build_content.translate_questions([QUESTION], "te")
+    assert local == {
+        "question": "<te>What do plants make?",
+        "options": ["<te>Food", "<te>Rocks", "<te>Air", "<te>Salt"],
+        "correct_index": 0,
+        "explanation": "<te>Plants make food.",
+    }
+    assert len(fake_batch) == 1
+
+
+def test_build_topic_stores_every_language(generated, fake_batch):
+    writer = RecordingWriter()
+    build_content.build_topic(writer, "Science", "Photosynthesis", ["en", "hi"], 1)
+    assert [(kind, language) for kind, language, _ in writer.puts] == [
+        ("notes", "en"), ("quiz", "en"), ("notes", "hi"), ("quiz", "hi"),
+    ]
+    hindi_notes = writer.puts[2][2]["answers"][0]
+    assert hindi_notes["text"] == NOTES
+    assert hindi_notes["local_text"].startswith("# <hi>Photosynthesis")
+
+
+def test_failed_translation_stores_nothing(generated, monkeypatch):
+    def translate_document(text, language):
+        if language == "ta":
+            raise RuntimeError("translation model unavailable")
+        return text
+
+    monkeypatch.setattr(build_content, "translate_document", translate_document)
+    monkeypatch.setattr(build_content, "translate_questions", lambda questions, language: questions)
+    writer = RecordingWriter()
+    with pytest.raises(RuntimeError):
+        build_content.build_topic(writer, "Science", "Photosynthesis", ["en", "hi", "ta"], 1)
+    assert writer.puts == []
+
+
+def test_failed_notes_store_nothing(monkeypatch):
+    monkeypatch.setattr(build_content, "generate_notes", lambda *args, **kwargs: [{"text": "Error", "score": 0.0}])
+    writer = RecordingWriter()
+    with pytest.raises(ValueError):
+        build_content.build_topic(writer, "Science", "Photosynthesis", ["en"], 1)
+    assert writer.puts == []
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from app.middleware import DeadlineMiddleware
+from app.services.ml import deadlines
+from app.services.ml.deadlines import (
+    Deadline,
+    DeadlineExceeded,
+    RequestCancelled,
+    check_deadline,
+    current_deadline,
+    parse_timeout,
+    time_left,
+    use_deadline,
+)
+
+
+def test_deadline_without_limit():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.is_set()
+    deadline.check()
+
+
+def test_deadline_expires():
+    deadline = Deadline(0.01)
+    assert 0 < deadline.remaining() <= 0.01
+    time.sleep(0.02)
+    assert deadline.remaining() == 0.0
+    assert deadline.is_set()
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+
+def test_cancel_wins_over_time_left():
+    deadline = Deadline(60)
+    deadline.cancel()
+    assert deadline.is_set()
+    with pytest.raises(RequestCancelled):
+        deadline.check()
+
+
+def test_use_deadline_sets_and_restores_the_current_deadline():
+    assert current_deadline() is None
+    assert time_left(5) == 5
+    deadline = Deadline(60)
+    with use_deadline(deadline):
+        assert current_deadline() is deadline
+        assert time_left(5) == 5
+        assert 59 < time_left() <= 60
+        deadline.cancel()
+        with pytest.raises(RequestCancelled):
+            check_deadline()
+    assert current_deadline() is None
+    check_deadline()
+
+    with use_deadline(Deadline(0.001)):
+        time.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            time_left(5)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("abc", None),
+    ("0", None),
+    ("-3", None),
+    ("2.5", 2.5),
+    ("100000", deadlines.MAX_REQUEST_TIMEOUT),
+])
+def test_parse_timeout(value, expected):
+    assert parse_timeout(value) == expected
+
+
+def http_scope(path, headers=()):
+    return {"type": "http", "method": "POST", "path": path, "headers": [(k.encode(), v.encode()) for k, v in headers]}
+
+
+def run_middleware(scope, messages, app):
+    """Drive DeadlineMiddleware with the given receive messages; returns the Deadline the app saw."""
+    seen = {}
+
+    async def receive():
+        message = messages.pop(0) if messages else None
+        if message is None:
+            await asyncio.sleep(3600)  # the client neither sends nor leaves
+        await asyncio.sleep(0.01)
+        return message
+
+    async def send(message):
+        pass
+
+    async def wrapped(scope, receive, send):
+        seen["deadline"] = current_deadline()
+        await app(scope, receive, send)
+
+    asyncio.run(asyncio.wait_for(DeadlineMiddleware(wrapped)(scope, receive, send), timeout=5))
+    return seen["deadline"]
+
+
+async def read_body(receive):
+    while (await receive()).get("more_body", False):
+        pass
+
+
+def test_disconnect_after_the_body_cancels_the_deadline():
+    async def app(scope, receive, send):
+        await read_body(receive)
+        # A long generation that polls the deadline, as the backends do
+        while not current_deadline().is_set():
+            await asyncio.sleep(0.01)
+
+    deadline = run_middleware(
+        http_scope("/generate-answer"),
+        [{"type": "http.request", "body": b"{}", "more_body": False}, {"type": "http.disconnect"}],
+        app,
+    )
+    with pytest.raises(RequestCancelled):
+        deadline.check()
+
+
+def test_connected_client_keeps_its_deadline():
+    async def app(scope, receive, send):
+        await read_body(receive)
+        await asyncio.sleep(0.05)
+
+    deadline = run_middleware(
+        http_scope("/generate-answer"),
+        [{"type": "http.request", "body": b"{", "more_body": True}, {"type": "http.request", "body": b"}"}],
+        app,
+    )
+    assert not deadline.cancelled.is_set()
+    assert deadline.remaining() > 29
+
+
+def test_header_overrides_the_endpoint_default():
+    async def app(scope, receive, send):
+        await read_body(receive)
+
+    body = [{"type": "http.request", "body": b"{}"}]
+    assert run_middleware(http_scope("/generate-quiz", [("x-request-timeout", "5")]), list(body), app).remaining() <= 5
+    assert run_middleware(http_scope("/health"), list(body), app).remaining() is None
@@ -0,0 +1,70 @@
+import numpy as np
+
+from app.services.ml.extractive_notes import compress_text, extract_notes, key_terms, rank_sentences, split_sentences
+from app.services.ml.text_chunker import estimate_tokens
+
+CHAPTER = """Photosynthesis
+
+Photosynthesis is the process by which green plants make glucose from sunlight.
+Chlorophyll in the leaves absorbs sunlight for photosynthesis.
+The glucose made in photosynthesis gives plants energy to grow.
+Oxygen is released into the air as a product of photosynthesis.
+
+Respiration
+
+Plants also break down glucose during respiration to release energy.
+Respiration in plants takes place in every living cell all the time.
+My uncle visited the old museum last winter."""
+
+
+def test_split_sentences_tracks_headings_and_bullets():
+    text = "Cells\nThe cell is the unit of life. It was seen by Hooke.\n- Plant cells have walls\n- Tiny\n"
+    assert split_sentences(text) == [
+        ("Cells", "The cell is the unit of life."),
+        ("Cells", "It was seen by Hooke."),
+        ("Cells", "Plant cells have walls"),
+    ]
+
+
+def test_rank_sentences_scores_every_sentence():
+    sentences = [sentence for _, sentence in split_sentences(CHAPTER)]
+    scores, _ = rank_sentences(sentences)
+    assert len(scores) == len(sentences)
+    assert np.all(scores > 0)
+
+
+def test_central_sentences_outrank_unrelated_ones():
+    sentences = [sentence for _, sentence in split_sentences(CHAPTER)]
+    scores, term_weights = rank_sentences(sentences)
+    unrelated = sentences.index("My uncle visited the old museum last winter.")
+    assert scores.argmin() == unrelated
+    assert key_terms(term_weights)[0] == "photosynthesi"
+    # Terms that occur in one sentence only carry no weight
+    assert "museum" not in term_weights
+
+
+def test_rank_sentences_without_shared_terms_is_uniform():
+    scores, term_weights = rank_sentences(["Alpha beta gamma delta.", "Epsilon zeta theta iota."])
+    assert np.isclose(scores[0], scores[1])
+    assert term_weights == {}
+
+
+def test_extract_notes_keeps_bullets_under_headings():
+    notes = extract_notes(CHAPTER)
+    lines = notes.splitlines()
+    assert lines[0].startswith("Key terms: ")
+    assert "## Photosynthesis" in lines
+    bullets = [line for line in lines if line.startswith("- ")]
+    assert 3 <= len(bullets) < len(split_sentences(CHAPTER))
+    assert "- My uncle visited the old museum last winter." not in lines
+
+
+def test_extract_notes_needs_a_document():
+    assert extract_notes("Photosynthesis") is None
+
+
+def test_compress_text():
+    assert compress_text(CHAPTER, 10_000) == CHAPTER
+    compressed = compress_text(CHAPTER, 40)
+    assert estimate_tokens(compressed) <= 45
+    assert compressed.startswith("Photosynthesis\n")
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.ml import generation_backends
+from app.services.ml.generation_backends import iterate_in_thread
+
+
+@pytest.fixture
+def one_generation_thread(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generation")
+    monkeypatch.setattr(generation_backends, "generation_executor", executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_stream_runs_on_the_generation_pool(one_generation_thread):
+    def tokens():
+        yield threading.current_thread().name
+        yield "done"
+
+    async def run():
+        return [item async for item in iterate_in_thread(tokens)]
+
+    thread_name, last = asyncio.run(run())
+    assert thread_name.startswith("generation")
+    assert last == "done"
+
+
+def test_open_streams_leave_the_default_executor_free(one_generation_thread):
+    release = threading.Event()
+
+    def slow_tokens():
+        yield "first"
+        release.wait(5)
+        yield "last"
+
+    async def run():
+        # A small default executor, fully taken if streams still used it
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        stream = iterate_in_thread(slow_tokens)
+        assert await stream.__anext__() == "first"
+        # The stream holds its thread; other blocking work still gets one
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "ran"), timeout=2) == "ran"
+        release.set()
+        return [item async for item in stream]
+
+    assert asyncio.run(run()) == ["last"]
+
+
+def test_stream_errors_are_raised_in_the_caller(one_generation_thread):
+    def failing():
+        yield "partial"
+        raise RuntimeError("backend down")
+
+    async def run():
+        received = []
+        with pytest.raises(RuntimeError, match="backend down"):
+            async for item in iterate_in_thread(failing):
+                received.append(item)
+        return received
+
+    assert asyncio.run(run()) == ["partial"]
@@ -0,0 +1,61 @@
+import pytest
+
+from app.services.ml import generation_policy
+from app.services.ml.generation_policy import POLICIES, POLICY_MIN_SAMPLES, record_completion, resolve_policy
+
+
+@pytest.fixture(autouse=True)
+def fresh_policy_state():
+    generation_policy._observations.clear()
+    generation_policy._tuned_budgets.clear()
+    yield
+    generation_policy._observations.clear()
+    generation_policy._tuned_budgets.clear()
+
+
+def observe(intent, tokens, max_tokens, times=POLICY_MIN_SAMPLES):
+    for _ in range(times):
+        record_completion(intent, tokens, max_tokens)
+
+
+def test_no_retuning_before_min_samples():
+    observe("definition", 45, 80, times=POLICY_MIN_SAMPLES - 1)
+    assert resolve_policy("definition", "What is osmosis?")["max_tokens"] == POLICIES["definition"]["max_tokens"]
+
+
+def test_budget_follows_p95_with_headroom():
+    observe("concept", 100, 200)
+    assert resolve_policy("concept", "Explain inertia")["max_tokens"] == 120
+
+
+def test_budget_never_below_min_tokens():
+    observe("definition", 10, 80)
+    assert resolve_policy("definition", "What is osmosis?")["max_tokens"] == POLICIES["definition"]["min_tokens"]
+
+
+def test_truncated_completions_grow_the_budget():
+    # Every completion hits the limit: the budget grows past the observed lengths
+    observe("concept", 200, 200)
+    assert resolve_policy("concept", "Explain inertia")["max_tokens"] == 300
+
+
+def test_budget_capped_at_cap_tokens():
+    observe("concept", 1000, 1000)
+    assert resolve_policy("concept", "Explain inertia")["max_tokens"] == POLICIES["concept"]["cap_tokens"]
+
+
+def test_explicit_truncated_flag_overrides_length_check():
+    for _ in range(POLICY_MIN_SAMPLES):
+        record_completion("concept", 100, 100, truncated=False)
+    assert resolve_policy("concept", "Explain inertia")["max_tokens"] == 120
+
+
+def test_unknown_intent_is_recorded_as_other():
+    observe("gibberish", 100, 200)
+    assert generation_policy._tuned_budgets == {"other": 120}
+    assert resolve_policy(None, "Hello")["max_tokens"] == 120
+
+
+def test_caller_max_length_still_limits_tuned_budget():
+    observe("concept", 300, 400)
+    assert resolve_policy("concept", "Explain inertia", max_length=150)["max_tokens"] == 150
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+# jobs imports the answer generator and with it the local model modules
+pytest.importorskip("torch")
+
+from app.services import jobs  # noqa: E402
+from app.services.jobs import TASK_COMPLETED, TASK_FAILED, TASK_PENDING, JobQueue  # noqa: E402
+from app.services.ml.generation_backends import GenerationBackend  # noqa: E402
+
+
+class CountingBackend(GenerationBackend):
+    name = "counting"
+
+    def __init__(self):
+        self.prompts = []
+
+    def _generate(self, prompt, max_tokens, temperature, stop, usage, json_mode):
+        self.prompts.append(prompt)
+        return f"notes for {prompt}"
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Replace the task handlers with test doubles: handlers["notes"] = fn(params, progress)."""
+    registered = {}
+    monkeypatch.setattr(jobs, "TASK_HANDLERS", registered)
+    return registered
+
+
+@pytest.fixture
+def queue(tmp_path):
+    job_queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=1)
+    yield job_queue
+    job_queue.close()
+
+
+def run_until_done(queue, job_id, timeout=5.0):
+    """Start the workers, wait until the job is completed or failed, then stop them."""
+
+    async def run():
+        queue.start(recover=False)
+        give_up_at = time.monotonic() + timeout
+        while queue.get(job_id)["status"] not in (TASK_COMPLETED, TASK_FAILED):
+            assert time.monotonic() < give_up_at, "timed out"
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue.get(job_id)
+
+    return asyncio.run(run())
+
+
+def test_submit_validates_tasks(queue, handlers):
+    handlers["notes"] = lambda params, progress: {}
+    with pytest.raises(ValueError):
+        queue.submit([])
+    with pytest.raises(ValueError):
+        queue.submit([{"kind": "essay", "params": {"text": "Cells"}}])
+    with pytest.raises(ValueError):
+        queue.submit([{"kind": "notes", "params": {"text": "  "}}])
+
+
+def test_completed_task_is_not_run_again(queue, handlers):
+    calls = []
+
+    def notes(params, progress):
+        calls.append(params["text"])
+        progress("map", 1, 1)
+        return {"answers": [{"text": f"Notes on {params['text']}", "score": 0.9}]}
+
+    handlers["notes"] = notes
+    job = queue.submit([{"kind": "notes", "params": {"text": "Cells"}}])
+    assert job["status"] == TASK_PENDING
+    done = run_until_done(queue, job["job_id"])
+    assert done["tasks"][0]["result"]["answers"][0]["text"] == "Notes on Cells"
+    assert done["tasks"][0]["progress"] == {"stage": "map", "done": 1, "total": 1}
+
+    # Same kind and params: the same idempotency key, served from the first run
+    again = queue.submit([{"kind": "notes", "params": {"text": "Cells"}}])
+    assert again["job_id"] != job["job_id"]
+    assert again["status"] == TASK_COMPLETED
+    assert again["tasks"][0]["result"] == done["tasks"][0]["result"]
+    assert calls == ["Cells"]
+
+
+def test_failing_task_is_retried_until_attempts_run_out(queue, handlers, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    calls = []
+
+    def notes(params, progress):
+        calls.append(params["text"])
+        raise RuntimeError("backend down")
+
+    handlers["notes"] = notes
+    job = queue.submit([{"kind": "notes", "key": "cells", "params": {"text": "Cells"}}])
+    done = run_until_done(queue, job["job_id"])
+    assert done["status"] == TASK_FAILED
+    assert done["tasks"][0]["attempts"] == 2
+    assert done["tasks"][0]["error"] == "backend down"
+    assert len(calls) == 2
+
+    # Submitting a failed key again gives it a fresh set of attempts
+    again = queue.submit([{"kind": "notes", "key": "cells", "params": {"text": "Cells"}}])
+    assert again["tasks"][0]["status"] == TASK_PENDING
+    assert again["tasks"][0]["attempts"] == 0
+
+
+def test_retry_resumes_from_checkpointed_calls(queue, handlers):
+    backend = CountingBackend()
+    attempts = []
+
+    def notes(params, progress):
+        attempts.append(1)
+        first = backend.complete("part 1", 100, 0.3)
+        if len(attempts) == 1:
+            raise RuntimeError("connection reset")
+        return {"answers": [{"text": first + "\n" + backend.complete("part 2", 100, 0.3), "score": 0.9}]}
+
+    handlers["notes"] = notes
+    job = queue.submit([{"kind": "notes", "params": {"text": "Cells"}}])
+    done = run_until_done(queue, job["job_id"])
+    assert done["status"] == TASK_COMPLETED
+    assert done["tasks"][0]["result"]["answers"][0]["text"] == "notes for part 1\nnotes for part 2"
+    # Part 1 was paid for once; the retry replayed it from the checkpoint
+    assert backend.prompts == ["part 1", "part 2"]
+    # Checkpoints are dropped once the task completes
+    assert queue._execute("SELECT COUNT(*) AS n FROM task_checkpoints")[0]["n"] == 0
+
+
+def test_recover_requeues_running_tasks(tmp_path, handlers):
+    handlers["notes"] = lambda params, progress: {}
+    path = str(tmp_path / "jobs.sqlite3")
+    crashed = JobQueue(path, workers=1)
+    job = crashed.submit([{"kind": "notes", "params": {"text": "Cells"}}])
+    assert crashed._claim_next() is not None
+    crashed.close()
+
+    restarted = JobQueue(path, workers=1)
+    assert restarted.recover() == 1
+    task = restarted.get(job["job_id"])["tasks"][0]
+    assert task["status"] == TASK_PENDING
+    assert task["attempts"] == 1
+    assert restarted.recover() == 0
+    restarted.close()
+
+
+def test_unknown_job(queue):
+    assert queue.get("missing") is None
+
+
+def test_stop_requeues_a_task_still_running_after_the_grace_period(queue, handlers, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_SHUTDOWN_GRACE", 0.05)
+    release = threading.Event()
+    handlers["notes"] = lambda params, progress: release.wait(5) and {}
+    job = queue.submit([{"kind": "notes", "params": {"text": "Cells"}}])
+
+    async def run():
+        queue.start(recover=False)
+        while queue.get(job["job_id"])["tasks"][0]["status"] == TASK_PENDING:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(run())
+    release.set()
+    task = queue.get(job["job_id"])["tasks"][0]
+    assert task["status"] == TASK_PENDING
+    # The interrupted attempt does not count against JOB_MAX_ATTEMPTS
+    assert task["attempts"] == 0
+
+
+def test_submission_from_a_request_thread_wakes_the_workers(queue, handlers, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL", 30)
+    handlers["notes"] = lambda params, progress: {"answers": []}
+
+    async def run():
+        queue.start(recover=False)
+        await asyncio.sleep(0.05)  # the worker is idle, waiting for a wakeup
+        job = await asyncio.to_thread(queue.submit, [{"kind": "notes", "params": {"text": "Cells"}}])
+        give_up_at = time.monotonic() + 5
+        while queue.get(job["job_id"])["status"] != TASK_COMPLETED:
+            assert time.monotonic() < give_up_at, "timed out"
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+import pytest
+
+# answer_generator imports the local model modules
+pytest.importorskip("torch")
+
+from app.services.ml import answer_generator  # noqa: E402
+from app.services.ml.generation_backends import GenerationBackend  # noqa: E402
+from app.services.ml.text_chunker import estimate_tokens  # noqa: E402
+
+DOCUMENT = "\n\n".join(f"Section {i}\n\n" + "Plants make food from sunlight. " * 200 for i in range(12))
+
+
+class VerboseBackend(GenerationBackend):
+    """Remote backend that writes `words` words (default: the whole token budget) per call."""
+
+    name = "verbose"
+    max_input_tokens = 4096
+
+    def __init__(self, words=None):
+        self.words = words
+        self.calls = []
+
+    def _generate(self, prompt, max_tokens, temperature, stop, usage, json_mode):
+        self.calls.append(max_tokens)
+        return " ".join(["note"] * (self.words or max_tokens))
+
+
+@pytest.fixture
+def run_notes(monkeypatch):
+    monkeypatch.setattr(answer_generator, "NOTES_PRECOMPRESS_TOKENS", 0)
+
+    def run(backend, max_length):
+        monkeypatch.setattr(answer_generator, "backend_chain", lambda: [backend])
+        return answer_generator.generate_notes_map_reduce(DOCUMENT, max_length=max_length)
+
+    return run
+
+
+def test_reduce_rounds_shrink_with_a_large_max_length(run_notes):
+    backend = VerboseBackend()
+    notes = run_notes(backend, max_length=5000)
+    reduce_budget = min(answer_generator.NOTES_REDUCE_INPUT_TOKENS, backend.max_input_tokens // 2)
+    # Intermediate merges stay well under half the reduce budget
+    assert all(tokens <= reduce_budget // 3 for tokens in backend.calls[12:-1])
+    assert len(backend.calls) < 30
+    assert notes[0]["score"] == backend.score
+
+
+def test_reduce_stops_when_merges_do_not_condense(run_notes):
+    backend = VerboseBackend(words=1500)
+    notes = run_notes(backend, max_length=500)
+    # Partials over half the budget cannot be grouped: straight to the final merge
+    assert len(backend.calls) == 12 + 1
+    assert estimate_tokens(notes[0]["text"]) > 1500
@@ -0,0 +1,206 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import middleware
+from app.middleware import (
+    CompressionMiddleware,
+    HTTPCacheMiddleware,
+    PriorityMiddleware,
+    _choose_encoding,
+    etag_matches,
+)
+from app.responses import ContentNegotiationMiddleware, FastJSONResponse
+from app.services import admission
+from app.services.ml.priority import current_priority
+
+BIG = {"notes": "Photosynthesis makes glucose from sunlight. " * 100}
+
+
+async def big_json(request):
+    return FastJSONResponse(BIG)
+
+
+async def small_json(request):
+    return FastJSONResponse({"ok": True})
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(3):
+            yield (f"event {i} " * 200).encode()
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+async def image(request):
+    return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+
+async def precompressed(request):
+    return PlainTextResponse(gzip.compress(b"x" * 5000), headers={"content-encoding": "gzip"})
+
+
+def make_client(*middlewares):
+    app = Starlette(routes=[
+        Route("/big", big_json),
+        Route("/small", small_json),
+        Route("/stream", stream),
+        Route("/image", image),
+        Route("/precompressed", precompressed),
+    ])
+    for cls in middlewares:
+        app.add_middleware(cls)
+    return TestClient(app)
+
+
+@pytest.fixture
+def client():
+    return make_client(CompressionMiddleware, ContentNegotiationMiddleware)
+
+
+def test_choose_encoding():
+    assert _choose_encoding("gzip, deflate, br") == ("br" if middleware.brotli else "gzip")
+    assert _choose_encoding("br;q=0, gzip") == "gzip"
+    assert _choose_encoding("gzip;q=0") is None
+    assert _choose_encoding("identity") is None
+    assert _choose_encoding("") is None
+
+
+def test_large_json_is_compressed(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json() == BIG
+    assert [v.strip() for v in response.headers["vary"].split(",")] == ["Accept", "Accept-Encoding"]
+
+
+@pytest.mark.skipif(middleware.brotli is None, reason="brotli not installed")
+def test_brotli_is_preferred(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == BIG
+
+
+@pytest.mark.parametrize("path, accept_encoding", [
+    ("/big", "identity"),
+    ("/small", "gzip"),
+    ("/image", "gzip"),
+    ("/precompressed", "gzip"),
+])
+def test_responses_left_alone(client, path, accept_encoding):
+    response = client.get(path, headers={"Accept-Encoding": accept_encoding})
+    expected = "gzip" if path == "/precompressed" else None
+    assert response.headers.get("content-encoding") == expected
+    assert "Accept-Encoding" not in response.headers.get("vary", "")
+
+
+def test_streaming_responses_pass_through(client):
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        chunks = list(response.iter_raw())
+    assert "content-encoding" not in response.headers
+    assert b"".join(chunks) == b"".join((f"event {i} " * 200).encode() for i in range(3))
+
+
+def test_msgpack_negotiation(client):
+    msgpack = pytest.importorskip("msgpack")
+    response = client.get("/big", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == BIG
+    # Without the Accept header the same endpoint answers with JSON
+    assert client.get("/big").headers["content-type"] == "application/json"
+
+
+@pytest.fixture
+def cache_client():
+    async def notes(request):
+        if request.query_params.get("topic") == "missing":
+            return FastJSONResponse({"detail": "No precomputed notes"}, status_code=404)
+        return FastJSONResponse(BIG)
+
+    async def events(request):
+        async def chunks():
+            yield b"part one, "
+            yield b"part two"
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    app = Starlette(routes=[Route("/notes", notes, methods=["GET", "POST"]), Route("/quiz", events)])
+    # Compression outside the cache, as in main.py
+    app.add_middleware(HTTPCacheMiddleware, policies={"/notes": "public, max-age=60", "/quiz": "public, max-age=60"})
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def test_etag_and_not_modified(cache_client):
+    first = cache_client.get("/notes?topic=cells", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "public, max-age=60"
+    assert first.headers["content-encoding"] == "gzip"
+
+    # The same ETag whether or not the body was compressed on the wire
+    plain = cache_client.get("/notes?topic=cells", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["etag"] == etag
+
+    revalidated = cache_client.get("/notes?topic=cells", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+    assert "content-encoding" not in revalidated.headers
+
+    assert cache_client.get("/notes?topic=cells", headers={"If-None-Match": '"other", ' + etag[2:]}).status_code == 304
+    assert cache_client.get("/notes?topic=cells", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_errors_and_other_methods_are_not_cached(cache_client):
+    missing = cache_client.get("/notes?topic=missing")
+    assert missing.status_code == 404
+    assert "etag" not in missing.headers
+    assert "cache-control" not in missing.headers
+    assert "etag" not in cache_client.post("/notes").headers
+
+
+def test_streamed_body_is_buffered_for_the_etag(cache_client):
+    response = cache_client.get("/quiz")
+    assert response.text == "part one, part two"
+    assert "etag" in response.headers
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    ("*", True),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"x", W/"abc"', True),
+    ('"abcd"', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, 'W/"abc"') is expected
+
+
+@pytest.fixture
+def priority_client(monkeypatch):
+    monkeypatch.setattr(admission, "_weights", {"school-key": 4.0, "basic-key": 1.0})
+
+    async def report(request):
+        return PlainTextResponse(current_priority())
+
+    app = Starlette(routes=[Route("/generate-quiz", report, methods=["POST"]), Route("/jobs", report, methods=["POST"])])
+    app.add_middleware(PriorityMiddleware)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("path, headers, expected", [
+    ("/generate-quiz", {}, "standard"),
+    ("/generate-quiz", {"X-Priority": "bulk"}, "bulk"),
+    # Anonymous clients and unweighted keys cannot jump the queue
+    ("/generate-quiz", {"X-Priority": "interactive"}, "standard"),
+    ("/jobs", {"X-Priority": "interactive", "X-API-Key": "basic-key"}, "bulk"),
+    ("/jobs", {"X-Priority": "interactive", "X-API-Key": "school-key"}, "interactive"),
+])
+def test_priority_header(priority_client, path, headers, expected):
+    assert priority_client.post(path, headers=headers).text == expected
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from app.services.ml.model_registry import ModelRegistry, model_footprint
+
+
+class FakeParam:
+    dtype = "torch.float32"
+    device = "cpu"
+
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes // 4
+
+    def element_size(self):
+        return 4
+
+
+class FakeModel:
+    def __init__(self, kb):
+        self.params = [FakeParam(kb * 1024)]
+
+    def parameters(self):
+        return iter(self.params)
+
+    def buffers(self):
+        return iter([])
+
+
+def loader(kb=100, calls=None, delay=0.0):
+    def load():
+        if calls is not None:
+            calls.append(1)
+        time.sleep(delay)
+        return FakeModel(kb), "tokenizer"
+
+    return load
+
+
+def test_model_footprint():
+    footprint = model_footprint(FakeModel(8))
+    assert footprint["param_bytes"] == 8 * 1024
+    assert footprint["dtypes"] == {"float32": 8 * 1024}
+    assert footprint["device"] == "cpu"
+    # Objects without parameters (e.g. a tokenizer) have no footprint
+    assert model_footprint("tokenizer")["param_bytes"] == 0
+
+
+def test_unknown_model():
+    with pytest.raises(KeyError):
+        ModelRegistry().get("missing")
+
+
+def test_concurrent_first_calls_share_one_load():
+    registry = ModelRegistry()
+    calls = []
+    registry.register("answer", loader(calls=calls, delay=0.1))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("answer"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(result is results[0] for result in results)
+    assert registry.stats()["models"][0]["hits"] == 8
+
+
+def test_failed_load_is_retried():
+    registry = ModelRegistry()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("download failed")
+        return FakeModel(1), "tokenizer"
+
+    registry.register("translation", flaky)
+    with pytest.raises(OSError):
+        registry.get("translation")
+    assert not registry.is_loaded("translation")
+    assert registry.stats()["models"] == []
+    model, tokenizer = registry.get("translation")
+    assert tokenizer == "tokenizer"
+    assert len(attempts) == 2
+
+
+def test_least_recently_used_model_is_evicted():
+    registry = ModelRegistry(budget_mb=1)
+    for name in ("answer", "intent", "translation"):
+        registry.register(name, loader(kb=400))
+    registry.get("answer")
+    registry.get("intent")
+    # "answer" is now the most recently used, so "intent" goes first
+    registry.get("answer")
+    registry.get("translation")
+    assert registry.is_loaded("answer")
+    assert not registry.is_loaded("intent")
+    assert registry.is_loaded("translation")
+    assert registry.evictions == 1
+    assert registry.stats()["loaded_bytes"] <= registry.budget_bytes
+
+
+def test_model_over_budget_on_its_own_is_kept():
+    registry = ModelRegistry(budget_mb=1)
+    registry.register("answer", loader(kb=2048))
+    registry.get("answer")
+    assert registry.is_loaded("answer")
+    assert registry.evictions == 0
+
+
+def test_unload():
+    registry = ModelRegistry()
+    registry.register("answer", loader())
+    assert not registry.unload("answer")
+    registry.get("answer")
+    assert set(registry.loaded_models()) == {"answer"}
+    assert registry.unload("answer")
+    assert registry.loaded_models() == {}
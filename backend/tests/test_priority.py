@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pytest
+
+from app.services.ml import priority
+from app.services.ml.deadlines import Deadline, DeadlineExceeded, RequestCancelled, use_deadline
+from app.services.ml.priority import (
+    PriorityExecutor,
+    PriorityScheduler,
+    resolve_priority,
+    submit_with_context,
+    use_priority,
+)
+
+
+def wait_for(condition, timeout=2.0):
+    give_up_at = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < give_up_at, "timed out"
+        time.sleep(0.005)
+
+
+def queue_waiter(scheduler, priority_class, grants):
+    """Start a thread that takes a slot at `priority_class` and records the grant."""
+
+    def take():
+        scheduler.acquire(priority_class)
+        grants.append(priority_class)
+
+    waiting_before = sum(scheduler.stats()["waiting"].values())
+    thread = threading.Thread(target=take, daemon=True)
+    thread.start()
+    wait_for(lambda: sum(scheduler.stats()["waiting"].values()) > waiting_before)
+    return thread
+
+
+def test_acquires_immediately_while_slots_are_free():
+    scheduler = PriorityScheduler("test", 2, reserved=0)
+    with scheduler.slot("bulk"), scheduler.slot("bulk"):
+        assert scheduler.stats()["running"] == 2
+    assert scheduler.stats()["running"] == 0
+
+
+def test_reserved_slots_only_go_to_interactive():
+    scheduler = PriorityScheduler("test", 2, reserved=1)
+    scheduler.acquire("bulk")
+    grants = []
+    thread = queue_waiter(scheduler, "bulk", grants)
+    assert grants == []
+    scheduler.acquire("interactive")
+    assert scheduler.stats()["running"] == 2
+    scheduler.release()
+    scheduler.release()
+    thread.join(1)
+    assert grants == ["bulk"]
+
+
+def test_never_reserves_every_slot():
+    assert PriorityScheduler("test", 1, reserved=3).reserved == 0
+
+
+def test_waiters_are_served_by_class():
+    scheduler = PriorityScheduler("test", 1, reserved=0)
+    scheduler.acquire("standard")
+    grants = []
+    threads = [queue_waiter(scheduler, p, grants) for p in ("bulk", "standard", "interactive")]
+    for served in range(1, len(threads) + 1):
+        scheduler.release()
+        wait_for(lambda: len(grants) == served)
+    scheduler.release()
+    assert grants == ["interactive", "standard", "bulk"]
+
+
+def test_starved_class_gets_its_minimum_share(monkeypatch):
+    monkeypatch.setattr(priority, "PRIORITY_MIN_SHARES", {"standard": 0.5, "bulk": 0.5})
+    scheduler = PriorityScheduler("test", 1, reserved=0)
+    scheduler.acquire("interactive")
+    grants = []
+    queue_waiter(scheduler, "bulk", grants)
+    for _ in range(2):
+        queue_waiter(scheduler, "interactive", grants)
+    for served in range(1, 4):
+        scheduler.release()
+        wait_for(lambda: len(grants) == served)
+    # A share of 0.5 lets bulk go after one skipped grant
+    assert grants == ["interactive", "bulk", "interactive"]
+
+
+def test_queued_acquire_gives_up_after_timeout():
+    scheduler = PriorityScheduler("test", 1, reserved=0)
+    scheduler.acquire("bulk")
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire("bulk", timeout=0.05)
+    assert scheduler.stats()["waiting"]["bulk"] == 0
+    scheduler.release()
+    assert scheduler.stats()["running"] == 0
+
+
+def test_queued_acquire_leaves_on_cancellation():
+    scheduler = PriorityScheduler("test", 1, reserved=0)
+    scheduler.acquire("bulk")
+    deadline = Deadline()
+    deadline.cancel()
+    with use_deadline(deadline), pytest.raises(RequestCancelled):
+        scheduler.acquire("bulk")
+    assert scheduler.stats()["waiting"]["bulk"] == 0
+
+
+def test_executor_starts_queued_work_by_class():
+    executor = PriorityExecutor(1, "test", reserved=0)
+    gate = threading.Event()
+    order = []
+    blocker = executor.submit(gate.wait)
+    futures = []
+    for priority_class in ("bulk", "standard", "interactive", "bulk"):
+        with use_priority(priority_class):
+            futures.append(submit_with_context(executor, order.append, priority_class))
+    gate.set()
+    for future in [blocker] + futures:
+        future.result(timeout=2)
+    executor.shutdown()
+    assert order == ["interactive", "standard", "bulk", "bulk"]
+
+
+def test_executor_keeps_reserved_workers_for_interactive():
+    executor = PriorityExecutor(2, "test", reserved=1)
+    gate = threading.Event()
+    with use_priority("bulk"):
+        bulk = [submit_with_context(executor, gate.wait) for _ in range(3)]
+    with use_priority("interactive"):
+        interactive = submit_with_context(executor, lambda: "answered")
+    # Runs while every non-reserved worker is busy with bulk work
+    assert interactive.result(timeout=2) == "answered"
+    wait_for(lambda: executor.stats()["waiting"]["bulk"] == 2)
+    gate.set()
+    for future in bulk:
+        future.result(timeout=2)
+    executor.shutdown()
+
+
+def test_executor_relays_exceptions():
+    executor = PriorityExecutor(1, "test")
+    future = executor.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=2)
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("requested, default, may_raise, expected", [
+    (None, "standard", False, "standard"),
+    ("nonsense", "bulk", False, "bulk"),
+    ("bulk", "interactive", False, "bulk"),
+    ("Standard", "interactive", False, "standard"),
+    ("interactive", "standard", False, "standard"),
+    ("interactive", "bulk", False, "bulk"),
+    ("interactive", "bulk", True, "interactive"),
+])
+def test_resolve_priority(requested, default, may_raise, expected):
+    assert resolve_priority(requested, default, may_raise) == expected
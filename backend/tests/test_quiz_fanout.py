@@ -0,0 +1,62 @@
+import itertools
+import json
+import threading
+
+from app.services.ml.groq_service import QUIZ_AVOID_MAX, QUIZ_MAX_QUESTIONS, generate_quiz_questions_groq
+
+
+class FakeBackend:
+    """Completion function that answers every chunk with fresh questions."""
+
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.prompts = []
+        self._numbers = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, max_tokens, temperature, json_mode=False):
+        with self._lock:
+            self.prompts.append(prompt)
+            count = int(prompt.split()[1])
+            numbers = [next(self._numbers) for _ in range(count)]
+        if self.fail_part and self.fail_part in prompt and "Do not repeat" not in prompt:
+            raise ValueError("invalid JSON")
+        assert json_mode
+        questions = [
+            {"question": f"Question {n}?", "options": ["a", "b", "c", "d"], "correct_index": 0}
+            for n in numbers
+        ]
+        return json.dumps({"questions": questions})
+
+
+def test_fans_out_in_chunks():
+    complete = FakeBackend()
+    questions = generate_quiz_questions_groq("Photosynthesis", 7, chunk_size=3, complete=complete)
+    assert len(questions) == 7
+    assert len(complete.prompts) == 3
+    assert len({q["question"] for q in questions}) == 7
+
+
+def test_question_count_is_capped():
+    complete = FakeBackend()
+    questions = generate_quiz_questions_groq("Photosynthesis", 1000, chunk_size=3, complete=complete)
+    assert len(questions) == QUIZ_MAX_QUESTIONS
+    assert len(complete.prompts) == -(-QUIZ_MAX_QUESTIONS // 3)
+
+
+def test_retry_prompt_lists_only_recent_questions():
+    total = QUIZ_AVOID_MAX + 5
+    complete = FakeBackend(fail_part=f"question set {total} of {total}")
+    questions = generate_quiz_questions_groq("Photosynthesis", total, chunk_size=1, complete=complete)
+    assert len(questions) == total
+    retry = complete.prompts[-1]
+    assert "Do not repeat" in retry
+    listed = [line for line in retry.splitlines() if line.startswith("- Question ")]
+    assert len(listed) == QUIZ_AVOID_MAX
+    assert listed[-1] == f"- {questions[-2]['question']}"
+
+
+def test_empty_topic_makes_no_calls():
+    complete = FakeBackend()
+    assert generate_quiz_questions_groq("   ", 5, complete=complete) == []
+    assert complete.prompts == []
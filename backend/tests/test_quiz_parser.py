@@ -0,0 +1,93 @@
+import json
+
+from app.services.ml.quiz_parser import (
+    dedupe_questions,
+    format_quiz_text,
+    normalize_question,
+    parse_quiz_json,
+    parse_quiz_text,
+)
+
+
+def question(text, correct=0):
+    return {"question": text, "options": ["one", "two", "three", "four"], "correct_index": correct}
+
+
+def test_parse_json_object_and_fence():
+    raw = "```json\n" + json.dumps({"questions": [question("What is 2+2?", 3)]}) + "\n```"
+    parsed = parse_quiz_json(raw)
+    assert len(parsed) == 1
+    assert parsed[0]["correct_index"] == 3
+    assert parsed[0]["explanation"] == ""
+
+
+def test_parse_json_drops_invalid_questions():
+    raw = json.dumps([question("Valid?"), {"question": "Three options?", "options": ["a", "b", "c"], "correct_index": 0}])
+    assert [q["question"] for q in parse_quiz_json(raw)] == ["Valid?"]
+
+
+def test_parse_json_rejects_non_json():
+    try:
+        parse_quiz_json("not json")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_correct_answer_by_letter_and_text():
+    item = question("Pick one")
+    del item["correct_index"]
+    assert normalize_question({**item, "answer": "C"})["correct_index"] == 2
+    assert normalize_question({**item, "correct_answer": "B) two"})["correct_index"] == 1
+    assert normalize_question({**item, "answer": "five"}) is None
+
+
+def test_duplicate_options_rejected():
+    item = {"question": "Q?", "options": ["a", "A", "b", "c"], "correct_index": 0}
+    assert normalize_question(item) is None
+
+
+def test_clean_strips_only_surrounding_emphasis():
+    item = {"question": "**What is 2*3 when a*b = 6?**", "options": ["*6*", "5", "2*3", "9"], "correct_index": 0}
+    normalized = normalize_question(item)
+    assert normalized["question"] == "What is 2*3 when a*b = 6?"
+    assert normalized["options"] == ["6", "5", "2*3", "9"]
+
+
+def test_parse_text_format():
+    text = """Q1: What do plants make?
+A) Glucose [CORRECT]
+B) Salt
+C) Iron
+D) Sand
+Explanation: Photosynthesis produces glucose.
+
+Q2: Second?
+A) w
+B) x
+C) y
+D) z
+Answer: D"""
+    parsed = parse_quiz_text(text)
+    assert [q["correct_index"] for q in parsed] == [0, 3]
+    assert parsed[0]["explanation"] == "Photosynthesis produces glucose."
+
+
+def test_format_round_trip():
+    questions = [normalize_question(question("Round trip?", 2))]
+    assert parse_quiz_text(format_quiz_text(questions)) == questions
+
+
+def test_dedupe_ignores_case_and_punctuation():
+    seen = set()
+    unique = dedupe_questions([question("What is X?"), question("what is x")], seen)
+    assert len(unique) == 1 and len(seen) == 1
+
+
+def test_dedupe_limit_does_not_mark_extras_seen():
+    seen = set()
+    unique = dedupe_questions([question("First?"), question("Second?"), question("Third?")], seen, limit=2)
+    assert [q["question"] for q in unique] == ["First?", "Second?"]
+    # The dropped extra must still be usable by a later chunk
+    assert [q["question"] for q in dedupe_questions([question("Third?")], seen)] == ["Third?"]
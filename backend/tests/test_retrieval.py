@@ -0,0 +1,95 @@
+import pytest
+
+from app.services.ml.retrieval import IndexWriter, Retriever, definition_term, extract_definition, tokenize
+
+DOCUMENTS = {
+    "Science": [
+        ("Photosynthesis", "Photosynthesis is the process by which green plants make food from sunlight, water and "
+                           "carbon dioxide. It takes place in the chloroplasts of leaf cells."),
+        ("Osmosis", "Osmosis is the movement of water molecules through a semi-permeable membrane from a dilute "
+                    "solution to a concentrated one."),
+        ("Cells", "The cell is the basic unit of life. Plant cells have a cell wall and chloroplasts."),
+    ],
+    "History": [
+        ("Mauryan Empire", "The Mauryan Empire was founded by Chandragupta Maurya. Ashoka spread Buddhism across "
+                           "the empire after the Kalinga war."),
+    ],
+}
+
+
+@pytest.fixture
+def retriever(tmp_path):
+    writer = IndexWriter(str(tmp_path), "test")
+    for subject, documents in DOCUMENTS.items():
+        for title, text in documents:
+            writer.add(subject, title, text)
+    return Retriever(writer.commit())
+
+
+def passage(text, coverage=1.0):
+    return {"text": text, "coverage": coverage, "subject": "Science", "title": "Test"}
+
+
+def test_tokenize_drops_stopwords_and_plural_s():
+    assert tokenize("What are the Chloroplasts of plants?") == ["chloroplast", "plant"]
+    # Short words and -ss endings keep their s
+    assert tokenize("gas glass") == ["gas", "glass"]
+
+
+def test_search_ranks_the_matching_passage_first(retriever):
+    hits = retriever.search("Osmosis of water through a membrane", "Science")
+    assert hits[0]["title"] == "Osmosis"
+    assert hits[0]["coverage"] == 1.0
+    assert all(hits[i]["score"] >= hits[i + 1]["score"] for i in range(len(hits) - 1))
+
+
+def test_search_respects_top_k_and_subject(retriever):
+    assert len(retriever.search("chloroplasts cells plants", "Science", top_k=1)) == 1
+    assert retriever.search("Ashoka", "Science") == []
+    # Unknown subjects search everything
+    assert retriever.search("Ashoka", "Civics")[0]["subject"] == "History"
+
+
+def test_unknown_terms_lower_coverage(retriever):
+    hit = retriever.search("osmosis xylophone", "Science")[0]
+    assert hit["title"] == "Osmosis"
+    assert 0 < hit["coverage"] < 1
+
+
+def test_no_match_returns_nothing(retriever):
+    assert retriever.search("xylophone", "Science") == []
+    assert retriever.search("what is the", "Science") == []
+
+
+def test_missing_index_is_unavailable(tmp_path):
+    retriever = Retriever(str(tmp_path / "missing"))
+    assert not retriever.available
+    assert retriever.search("osmosis") == []
+
+
+def test_definition_term():
+    assert definition_term("What is osmosis?") == "osmosis"
+    assert definition_term("What do you mean by a semi-permeable membrane?") == "semi-permeable membrane"
+    assert definition_term("Define the cell") == "cell"
+    assert definition_term("Why do leaves fall in autumn?") is None
+
+
+def test_extract_definition_with_continuation():
+    text = "Chapter 1\nPhotosynthesis is how plants make food. It needs sunlight. Plants are green."
+    result = extract_definition("What is photosynthesis?", [passage(text)])
+    assert result["text"] == "Photosynthesis is how plants make food. It needs sunlight."
+    assert result["score"] == 0.99
+
+
+def test_extract_definition_called_form():
+    text = "The green pigment in leaves is called chlorophyll. Leaves are thin."
+    result = extract_definition("Define chlorophyll", [passage(text, 0.95)])
+    assert result["text"] == "The green pigment in leaves is called chlorophyll."
+    assert result["score"] == 0.95
+
+
+def test_extract_definition_needs_coverage_and_a_defining_sentence():
+    text = "Osmosis is the movement of water through a membrane."
+    assert extract_definition("What is osmosis?", [passage(text, 0.5)]) is None
+    assert extract_definition("What is osmosis?", [passage("Water moves by osmosis in roots.")]) is None
+    assert extract_definition("Why does osmosis happen?", [passage(text)]) is None
@@ -0,0 +1,51 @@
+import pytest
+
+from app.services.ml.romanized import detect_romanized, to_native_script
+
+
+@pytest.mark.parametrize("text", [
+    "Help me",
+    "Show me ohm law",
+    "Contact me",
+    "Illustrate me",
+    "Quiz me on algebra",
+    "notes for me",
+    "Tell me photosynthesis",
+    "Ki and Ka values",
+    "Ide integration",
+    "Ela Fitzgerald",
+    "Help me with my homework on cells",
+    "Japanese yen",
+])
+def test_english_is_not_romanized(text):
+    assert detect_romanized(text) is None
+
+
+@pytest.mark.parametrize("text, language", [
+    ("photosynthesis kya hai", "hi"),
+    ("kya hai", "hi"),
+    ("kyaa hai photosynthesis", "hi"),
+    ("photosynthesis ka matlab kya hai", "hi"),
+    ("gravity kaise kaam karta hai", "hi"),
+    ("photosynthesis ante enti", "te"),
+    ("photosynthesis endral enna", "ta"),
+    ("photosynthesis andare enu", "kn"),
+])
+def test_romanized_questions(text, language):
+    assert detect_romanized(text)["language"] == language
+
+
+def test_single_word_does_not_decide_a_short_input():
+    assert detect_romanized("photosynthesis enna") is None
+    assert detect_romanized("photosynthesis enna sollunga")["language"] == "ta"
+
+
+def test_english_words_outvote_a_code_mixed_tie():
+    # As many English function words as Hindi words: a tie stays English
+    assert detect_romanized("what is photosynthesis kaise hota") is None
+    assert detect_romanized("what is photosynthesis kaise hota hai")["language"] == "hi"
+
+
+def test_to_native_script_keeps_english_words():
+    assert to_native_script("photosynthesis kya hai", "hi") == "photosynthesis क्या है"
+    assert to_native_script("Quiz me on algebra", "hi") == "Quiz me on algebra"
@@ -0,0 +1,120 @@
+import pytest
+
+# sessions imports the answer generator and with it the local model modules
+pytest.importorskip("torch")
+
+from app.services import sessions  # noqa: E402
+from app.services.ml.text_chunker import estimate_tokens  # noqa: E402
+from app.services.sessions import SessionStore  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.sqlite3")
+
+
+@pytest.fixture
+def store(db_path):
+    session_store = SessionStore(db_path)
+    yield session_store
+    session_store.close()
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    """Summaries fold in the questions only; returns the list of batches summarized."""
+    batches = []
+
+    def summarize_turns(previous, turns):
+        batches.append(turns)
+        questions = [turn.splitlines()[0].replace("Student: ", "") for turn in turns]
+        return " ".join([previous] + questions).strip()
+
+    monkeypatch.setattr(sessions, "summarize_turns", summarize_turns)
+    return batches
+
+
+def wait_for_summaries():
+    sessions._summary_executor.submit(lambda: None).result(timeout=5)
+
+
+def test_sessions_belong_to_their_owner(store):
+    session_id = store.create("key:alice")
+    assert store.build_context(session_id, "key:alice") == ""
+    assert store.build_context(session_id, "key:mallory") is None
+    assert store.get(session_id, "key:mallory") is None
+    assert not store.delete(session_id, "key:mallory")
+    # Turns from another client are dropped, not added
+    store.add_turn(session_id, "key:mallory", "Injected?", "Yes")
+    assert store.get(session_id, "key:alice")["turns"] == 0
+    assert store.delete(session_id, "key:alice")
+    assert store.get(session_id, "key:alice") is None
+
+
+def test_unknown_session(store):
+    assert store.build_context("missing", "key:alice") is None
+    store.add_turn("missing", "key:alice", "What is osmosis?", "Movement of water.")
+    assert store.stats()["sessions"] == 0
+
+
+def test_sessions_are_shared_between_workers(db_path, store, summaries):
+    session_id = store.create("ip:10.0.0.1")
+    store.add_turn(session_id, "ip:10.0.0.1", "What is osmosis?", "Movement of water.")
+    other_worker = SessionStore(db_path)
+    assert "Student: What is osmosis?" in other_worker.build_context(session_id, "ip:10.0.0.1")
+    other_worker.close()
+
+
+def test_old_turns_are_summarized(store, summaries, monkeypatch):
+    monkeypatch.setattr(sessions, "SESSION_VERBATIM_TURNS", 2)
+    session_id = store.create("key:alice")
+    for i in range(5):
+        store.add_turn(session_id, "key:alice", f"Question {i}?", f"Answer {i}.")
+    wait_for_summaries()
+    session = store.get(session_id, "key:alice")
+    assert session["turns"] == 5
+    assert session["summary"] == "Question 0? Question 1? Question 2?"
+    assert [turn["question"] for turn in session["recent_turns"]] == ["Question 3?", "Question 4?"]
+    assert session["pending_summary_turns"] == 0
+    # Every folded turn was summarized exactly once
+    assert sum(len(batch) for batch in summaries) == 3
+    context = store.build_context(session_id, "key:alice")
+    assert context.startswith("Summary of earlier conversation: Question 0?")
+    assert context.endswith("Student: Question 4?\nTutor: Answer 4.")
+
+
+def test_context_stays_within_budget(store, summaries):
+    session_id = store.create("key:alice")
+    long_answer = "Photosynthesis turns light into chemical energy. " * 40
+    for i in range(3):
+        store.add_turn(session_id, "key:alice", f"Question {i}?", long_answer)
+    context = store.build_context(session_id, "key:alice", max_tokens=300)
+    assert estimate_tokens(context) <= 300 + 5
+    # The newest turn is kept first; older ones are dropped once the budget is used
+    assert "Question 2?" in context
+    assert "Question 0?" not in context
+
+
+def test_oversized_latest_turn_is_truncated(store, summaries):
+    session_id = store.create("key:alice")
+    store.add_turn(session_id, "key:alice", "Explain it all", "word " * 2000)
+    context = store.build_context(session_id, "key:alice", max_tokens=100)
+    assert context.startswith("Student: Explain it all")
+    assert context.endswith(" ...")
+    assert estimate_tokens(context) <= 100 + 5
+
+
+def test_expired_and_excess_sessions_are_evicted(db_path, summaries):
+    store = SessionStore(db_path, ttl=3600, max_sessions=2)
+    first = store.create("key:alice")
+    second = store.create("key:alice")
+    store.build_context(first, "key:alice")  # first is now the most recently used
+    store.create("key:alice")
+    assert store.get(second, "key:alice") is None
+    assert store.get(first, "key:alice") is not None
+    assert store.stats()["sessions"] == 2
+    store.close()
+
+    expired = SessionStore(db_path, ttl=-1)
+    assert expired.get(first, "key:alice") is None
+    expired.close()
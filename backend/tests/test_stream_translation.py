@@ -0,0 +1,62 @@
+import pytest
+
+# stream_translation imports the translation model module
+pytest.importorskip("torch")
+
+from app.services.ml.stream_translation import SentenceSplitter  # noqa: E402
+
+
+def feed_all(splitter, deltas):
+    sentences = []
+    for delta in deltas:
+        sentences.extend(splitter.feed(delta))
+    return sentences
+
+
+def test_sentence_is_final_once_text_follows_the_boundary():
+    splitter = SentenceSplitter(min_chars=5)
+    assert splitter.feed("Plants make food. ") == []
+    assert splitter.feed("They") == [("Plants make food.", " ")]
+    assert splitter.flush() == ("They", "")
+    assert splitter.flush() is None
+
+
+def test_sentences_split_across_deltas():
+    splitter = SentenceSplitter(min_chars=5)
+    deltas = ["Photo", "synthesis makes sugar", ". It needs light! Does it", " need water? Yes."]
+    assert feed_all(splitter, deltas) == [
+        ("Photosynthesis makes sugar.", " "),
+        ("It needs light!", " "),
+        ("Does it need water?", " "),
+    ]
+    assert splitter.flush() == ("Yes.", "")
+
+
+def test_short_pieces_join_the_next_sentence():
+    splitter = SentenceSplitter(min_chars=20)
+    assert feed_all(splitter, ["e.g. water. Plants need water to grow. Next"]) == [
+        ("e.g. water. Plants need water to grow.", " "),
+    ]
+
+
+def test_line_breaks_always_end_a_sentence():
+    splitter = SentenceSplitter(min_chars=20)
+    assert feed_all(splitter, ["Heading\n\n\n- point one\n- two"]) == [
+        ("Heading", "\n\n"),
+        ("- point one", "\n"),
+    ]
+    assert splitter.flush() == ("- two", "")
+
+
+def test_hindi_danda_ends_a_sentence():
+    splitter = SentenceSplitter(min_chars=5)
+    assert feed_all(splitter, ["पौधे भोजन बनाते हैं। वे"]) == [("पौधे भोजन बनाते हैं।", " ")]
+
+
+def test_long_text_without_boundary_is_cut_at_a_space():
+    splitter = SentenceSplitter(min_chars=5, max_chars=30)
+    sentences = feed_all(splitter, ["word " * 20])
+    assert sentences
+    assert all(len(sentence) <= 30 and separator == " " for sentence, separator in sentences)
+    rest = splitter.flush()
+    assert " ".join([s for s, _ in sentences] + [rest[0]]).split() == ["word"] * 20
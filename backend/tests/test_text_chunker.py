@@ -0,0 +1,41 @@
+from app.services.ml.text_chunker import estimate_tokens, split_into_chunks
+
+
+def paragraph(label, sentences=5):
+    return " ".join(f"{label} sentence number {i} has a few more words in it." for i in range(sentences))
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("Just one paragraph.", 100) == ["Just one paragraph."]
+
+
+def test_paragraphs_are_packed_within_budget_in_order():
+    paragraphs = [paragraph(f"P{i}") for i in range(6)]
+    chunks = split_into_chunks("\n\n".join(paragraphs), 160)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 160 for chunk in chunks)
+    # Nothing lost or reordered
+    assert "\n\n".join(chunks).split("\n\n") == paragraphs
+
+
+def test_heading_stays_with_its_paragraph():
+    text = "\n\n".join(["Introduction", paragraph("A", 8), "Light Reactions", paragraph("B", 8)])
+    chunks = split_into_chunks(text, 120)
+    assert any(chunk.startswith("Light Reactions\n") for chunk in chunks)
+    assert not any(chunk.rstrip().endswith("Light Reactions") for chunk in chunks)
+
+
+def test_oversized_paragraph_splits_on_sentences():
+    text = paragraph("Long", 30)
+    chunks = split_into_chunks(text, 60)
+    assert len(chunks) > 1
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_oversized_sentence_splits_on_words():
+    text = " ".join(f"w{i}" for i in range(500))
+    chunks = split_into_chunks(text, 50)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 52 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
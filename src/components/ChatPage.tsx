@@ -1,5 +1,5 @@
 import { useState, useRef, useEffect } from 'react';
-import { generateAnswer } from '../services/api';
+import { createSession, generateAnswer } from '../services/api';
 import { ArrowLeft, Send, Loader } from 'lucide-react';
 import { Button } from './ui/button';
 import { Input } from './ui/input';
@@ -43,6 +43,9 @@ export function ChatPage({
   const [isLoading, setIsLoading] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const processingRequestRef = useRef(false);
+  // Server-side chat session: earlier turns are kept (and summarized) by the backend
+  // (created on the first question; the id is issued by the server)
+  const sessionIdRef = useRef<string | null>(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -73,12 +76,32 @@ export function ChatPage({
       setMessages((prev) => [...prev, userMessage]);
       setInputValue('');
 
+      if (!sessionIdRef.current) {
+        sessionIdRef.current = (await createSession()).session_id;
+      }
+
       // Call backend API helper
-      const data = await generateAnswer({
-        prompt: inputValue,
-        max_length: 1024,
-        temperature: 0.7,
-      });
+      let data;
+      try {
+        data = await generateAnswer({
+          prompt: inputValue,
+          max_length: 1024,
+          temperature: 0.7,
+          session_id: sessionIdRef.current,
+        });
+      } catch (error) {
+        if (!(error instanceof Error) || error.message !== 'Session not found') {
+          throw error;
+        }
+        // Session expired: continue in a new one
+        sessionIdRef.current = (await createSession()).session_id;
+        data = await generateAnswer({
+          prompt: inputValue,
+          max_length: 1024,
+          temperature: 0.7,
+          session_id: sessionIdRef.current,
+        });
+      }
 
       const answer = data.answers && data.answers.length > 0
         ? (data.answers[0].text || (data.answers[0] as any))
@@ -15,6 +15,8 @@ export interface DetectLanguageRequest {
 export interface DetectLanguageResponse {
   language: string;
   confidence: number;
+  // Indian language typed in Latin script ("photosynthesis kya hai")
+  romanized?: boolean;
 }
 
 export interface ClassifyIntentRequest {
@@ -31,12 +33,19 @@ export interface GenerateAnswerRequest {
   prompt: string;
   max_length?: number;
   temperature?: number;
+  intent?: string;
+  subject?: string;
+  // From createSession(); a 404 "Session not found" means it expired
+  session_id?: string;
+  // Also return the answer in this language as answers[0].local_text
+  language?: string;
 }
 
 export interface GenerateAnswerResponse {
   answers: Array<{
     text: string;
     score: number;
+    local_text?: string;
   }>;
 }
 
@@ -56,6 +65,21 @@ export interface GenerateNotesRequest {
   text: string;
   max_length?: number;
   temperature?: number;
+  subject?: string;
+  topic?: string;
+  language?: string;
+}
+
+export interface GeneratedQuizQuestion {
+  question: string;
+  options: string[];
+  correct_index: number;
+  explanation: string;
+}
+
+export interface GenerateQuizResponse extends GenerateAnswerResponse {
+  questions?: GeneratedQuizQuestion[];
+  local_questions?: GeneratedQuizQuestion[];
 }
 
 export interface GenerateQuizRequest {
@@ -63,6 +87,9 @@ export interface GenerateQuizRequest {
   num_questions?: number;
   max_length?: number;
   temperature?: number;
+  subject?: string;
+  topic?: string;
+  language?: string;
 }
 
 // Helper function to make API calls
@@ -73,14 +100,11 @@ async function apiCall<T>(
 ): Promise<T> {
   const url = `${API_BASE_URL}${endpoint}`;
   
-  const options: RequestInit = {
-    method,
-    headers: {
-      'Content-Type': 'application/json',
-    },
-  };
+  const options: RequestInit = { method };
 
   if (body) {
+    // Only requests with a body need the header (it makes a GET non-simple for CORS)
+    options.headers = { 'Content-Type': 'application/json' };
     options.body = JSON.stringify(body);
   }
 
@@ -101,6 +125,25 @@ async function apiCall<T>(
   }
 }
 
+/**
+ * GET precomputed content; resolves to null when the topic is not precomputed.
+ * These responses carry ETags, so the browser revalidates instead of re-downloading.
+ */
+async function getPrecomputed<T>(
+  endpoint: string,
+  params: Record<string, string | number>
+): Promise<T | null> {
+  const query = new URLSearchParams(
+    Object.entries(params).map(([key, value]) => [key, String(value)])
+  );
+  try {
+    const response = await fetch(`${API_BASE_URL}${endpoint}?${query}`);
+    return response.ok ? await response.json() : null;
+  } catch {
+    return null;
+  }
+}
+
 // API Functions
 
 /**
@@ -130,6 +173,13 @@ export async function generateAnswer(
   return apiCall<GenerateAnswerResponse>('/generate-answer', 'POST', request);
 }
 
+/**
+ * Start a server-side chat session; only this client can use the returned id
+ */
+export async function createSession(): Promise<{ session_id: string }> {
+  return apiCall<{ session_id: string }>('/sessions', 'POST');
+}
+
 /**
  * Translate text to a target language
  */
@@ -145,6 +195,16 @@ export async function translateText(
 export async function generateNotes(
   request: GenerateNotesRequest
 ): Promise<GenerateAnswerResponse> {
+  if (request.subject && request.topic) {
+    const precomputed = await getPrecomputed<GenerateAnswerResponse>('/notes', {
+      subject: request.subject,
+      topic: request.topic,
+      language: request.language || 'en',
+    });
+    if (precomputed) {
+      return precomputed;
+    }
+  }
   return apiCall<GenerateAnswerResponse>('/generate-notes', 'POST', request);
 }
 
@@ -153,8 +213,19 @@ export async function generateNotes(
  */
 export async function generateQuiz(
   request: GenerateQuizRequest
-): Promise<GenerateAnswerResponse> {
-  return apiCall<GenerateAnswerResponse>('/generate-quiz', 'POST', request);
+): Promise<GenerateQuizResponse> {
+  if (request.subject && request.topic) {
+    const precomputed = await getPrecomputed<GenerateQuizResponse>('/quiz', {
+      subject: request.subject,
+      topic: request.topic,
+      language: request.language || 'en',
+      num_questions: request.num_questions ?? 5,
+    });
+    if (precomputed) {
+      return precomputed;
+    }
+  }
+  return apiCall<GenerateQuizResponse>('/generate-quiz', 'POST', request);
 }
 
 /**
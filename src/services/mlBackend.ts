@@ -102,21 +102,24 @@ export async function generateAnswer(request: MLRequest): Promise<BilingualAnswe
       }
     }
 
-    // Step 3: Create a prompt based on intent
-    const prompt = createPromptFromQuestion(request.question || '', intent, request.subject);
-
-    // Step 4: Generate answer in English
+    // Step 3: Generate answer in English; the backend picks the prompt
+    // template, token budget and temperature from the intent, and returns
+    // the local-language version too when it is asked for one
+    const isEnglish = detectedLang === 'en' || detectedLang === 'en_Latn';
     const answerResponse = await apiGenerateAnswer({
-      prompt,
+      prompt: request.question || '',
       max_length: 300,
       temperature: 0.7,
+      intent,
+      subject: request.subject,
+      language: isEnglish ? undefined : detectedLang,
     });
 
     const englishAnswer = answerResponse.answers[0]?.text || 'Unable to generate answer';
 
-    // Step 5: Translate to local language if needed
-    let localAnswer = englishAnswer;
-    if (detectedLang !== 'en' && detectedLang !== 'en_Latn') {
+    // Step 4: Translate to local language if the backend did not
+    let localAnswer = answerResponse.answers[0]?.local_text || englishAnswer;
+    if (!isEnglish && !answerResponse.answers[0]?.local_text) {
       try {
         const translation = await apiTranslateText({
           text: englishAnswer,
@@ -170,13 +173,16 @@ Format the notes clearly with sections.`;
       text: prompt,
       max_length: 500,
       temperature: 0.7,
+      subject: request.subject,
+      topic: request.topic,
+      language: request.language,
     });
 
     const englishNotes = notesResponse.answers[0]?.text || 'Unable to generate notes';
 
-    // Translate to local language if needed
-    let localNotes = englishNotes;
-    if (request.language !== 'en') {
+    // Precomputed topics already come with the translation
+    let localNotes = notesResponse.answers[0]?.local_text || englishNotes;
+    if (request.language !== 'en' && !notesResponse.answers[0]?.local_text) {
       try {
         const translation = await apiTranslateText({
           text: englishNotes,
@@ -233,8 +239,30 @@ Mark the correct answer with [CORRECT] tag.`;
       num_questions: numQuestions,
       max_length: 1000,
       temperature: 0.7,
+      subject: request.subject,
+      topic: request.topic,
+      language: request.language,
     });
 
+    // Prefer the questions the backend already parsed and validated
+    if (quizResponse.questions && quizResponse.questions.length > 0) {
+      const localQuestions = quizResponse.local_questions || [];
+      return {
+        questions: quizResponse.questions.map((q, index) => {
+          const local = localQuestions[index] || q;
+          return {
+            id: `q_${index + 1}`,
+            questionLocal: local.question,
+            questionEnglish: q.question,
+            options: q.options,
+            correctAnswer: q.correct_index,
+            explanationLocal: local.explanation || 'No explanation provided.',
+            explanationEnglish: q.explanation || 'No explanation provided.',
+          };
+        }),
+      };
+    }
+
     const quizText = quizResponse.answers[0]?.text || '';
 
     // Parse the quiz text into structured questions
@@ -249,42 +277,6 @@ Mark the correct answer with [CORRECT] tag.`;
   }
 }
 
-/**
- * Helper function to create a prompt from a question
- */
-function createPromptFromQuestion(question: string, intent: string, subject?: string): string {
-  let prompt = '';
-
-  switch (intent) {
-    case 'definition':
-      prompt = `Define and explain: ${question}`;
-      break;
-    case 'concept':
-      prompt = `Explain the concept of: ${question}`;
-      break;
-    case 'numerical':
-      prompt = `Solve this problem: ${question}`;
-      break;
-    case 'comparison':
-      prompt = `Compare and contrast: ${question}`;
-      break;
-    case 'explanation':
-      prompt = `Explain in detail: ${question}`;
-      break;
-    case 'example':
-      prompt = `Provide examples of: ${question}`;
-      break;
-    default:
-      prompt = `Answer this question: ${question}`;
-  }
-
-  if (subject) {
-    prompt += ` (Subject: ${subject})`;
-  }
-
-  return prompt;
-}
-
 /**
  * Helper function to parse quiz text into structured questions
  */